@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The cached index of the top level nodes of the AccLattice:
+#  name -> node, node -> (start, stop), type -> nodes,
+#  position -> node (the binary search in the sorted starts).
+# The lattice.getNodePositionsDict() and getNodeForName(...)
+# rebuild the dictionary or scan the nodes for each call,
+# so they are slow inside the loops over the nodes and turns.
+# The index is rebuilt automatically when the number of the
+# top level nodes or the lattice length are changed. Other
+# changes (renaming, replacing the nodes with the same
+# lengths) need the explicit invalidate() call.
+#--------------------------------------------------------
+
+import math
+import sys
+import bisect
+
+from orbit.lattice import AccLattice, AccNode
+
+import orbit_mpi
+
+class LatticeIndex:
+	"""
+	The cached lookup tables for the lattice nodes.
+	"""
+	def __init__(self, lattice):
+		self.lattice = lattice
+		self.invalidate()
+
+	def invalidate(self):
+		"""
+		Marks the index as outdated. It will be rebuilt at the next query.
+		"""
+		self.signature = None
+
+	def _getSignature(self):
+		return (len(self.lattice.getNodes()),self.lattice.getLength())
+
+	def _check(self):
+		signature = self._getSignature()
+		if(signature == self.signature): return
+		self.nodes = list(self.lattice.getNodes())
+		self.name_dict = {}
+		self.type_dict = {}
+		self.pos_dict = {}
+		self.starts = []
+		pos = 0.
+		for node in self.nodes:
+			length = node.getLength()
+			self.pos_dict[node] = (pos,pos + length)
+			self.starts.append(pos)
+			#---- the first node with the name as in lattice.getNodeForName(...)
+			if(not self.name_dict.has_key(node.getName())):
+				self.name_dict[node.getName()] = node
+			if(not self.type_dict.has_key(node.getType())):
+				self.type_dict[node.getType()] = []
+			self.type_dict[node.getType()].append(node)
+			pos += length
+		self.signature = signature
+
+	def getNodeForName(self, name):
+		"""
+		Returns the node with the name or None.
+		"""
+		self._check()
+		return self.name_dict.get(name)
+
+	def getNodePositions(self, node):
+		"""
+		Returns the (start, stop) positions of the top level node.
+		"""
+		self._check()
+		return self.pos_dict[node]
+
+	def getNodePositionsDict(self):
+		"""
+		Returns the cached {node:(start,stop)} dictionary. It should not be modified.
+		"""
+		self._check()
+		return self.pos_dict
+
+	def getNodesOfType(self, node_type):
+		"""
+		Returns the list of the nodes with the type.
+		"""
+		self._check()
+		return self.type_dict.get(node_type,[])
+
+	def getNodeIndexForPosition(self, pos):
+		"""
+		Returns the index of the top level node with start <= pos < stop.
+		The positions outside the lattice give the first or the last node.
+		"""
+		self._check()
+		if(len(self.nodes) == 0):
+			orbit_mpi.finalize("LatticeIndex: the lattice does not have nodes!")
+		ind = bisect.bisect_right(self.starts,pos) - 1
+		return min(max(ind,0),len(self.nodes) - 1)
+
+	def getNodeForPosition(self, pos):
+		"""
+		Returns the (node, start, stop) for the position.
+		"""
+		node = self.nodes[self.getNodeIndexForPosition(pos)]
+		(start,stop) = self.pos_dict[node]
+		return (node,start,stop)
+
+	def getNodePartForPosition(self, pos):
+		"""
+		Returns the (node, part index, part start position) for the position.
+		It is the place to insert the child node at this position.
+		"""
+		(node,start,stop) = self.getNodeForPosition(pos)
+		part_start = start
+		for part_index in range(node.getnParts()):
+			part_length = node.getLength(part_index)
+			if(pos < part_start + part_length or part_index == node.getnParts() - 1):
+				return (node,part_index,part_start)
+			part_start += part_length
+		return (node,0,start)
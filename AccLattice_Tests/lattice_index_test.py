@@ -0,0 +1,56 @@
+import sys
+import math
+import time
+import random
+
+from orbit.lattice import AccLattice, AccNode, AccActionsContainer
+
+from lattice_index import LatticeIndex
+
+#-----------------------------------------------------
+# Compares the LatticeIndex with the lattice methods
+# and the time of the lookups
+#-----------------------------------------------------
+
+lattice = AccLattice("test_lattice")
+for ind in range(1000):
+	elem = AccNode("el-"+str(ind))
+	elem.setLength(0.5 + 0.001*ind)
+	elem.setnParts(2)
+	lattice.addNode(elem)
+lattice.initialize()
+
+index = LatticeIndex(lattice)
+nodes = lattice.getNodes()
+
+n_errors = 0
+pos_dict = lattice.getNodePositionsDict()
+for node in nodes:
+	if(index.getNodeForName(node.getName()) != lattice.getNodeForName(node.getName())): n_errors += 1
+	if(index.getNodePositions(node) != pos_dict[node]): n_errors += 1
+	(start,stop) = pos_dict[node]
+	if(index.getNodeForPosition((start+stop)/2)[0] != node): n_errors += 1
+print "number of errors =",n_errors
+
+(node,part_index,part_start) = index.getNodePartForPosition(100.)
+print "position 100. is in node=",node.getName()," part=",part_index," part start= %8.4f "%part_start
+
+#---- the index is rebuilt after the lattice change
+elem = AccNode("el-new")
+elem.setLength(1.0)
+lattice.addNode(elem)
+lattice.initialize()
+print "new node found =",(index.getNodeForName("el-new") == elem)
+
+#---- speed
+time_start = time.time()
+for node in nodes:
+	pos = lattice.getNodePositionsDict()[node][0]
+time_lattice = time.time() - time_start
+time_start = time.time()
+for node in nodes:
+	pos = index.getNodePositions(node)[0]
+time_index = time.time() - time_start
+print "time of positions for all nodes: lattice= %9.6f index= %9.6f "%(time_lattice,time_index)
+
+print "====STOP==="
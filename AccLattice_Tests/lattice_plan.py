@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The flat execution plan of the AccLattice.
+# The AccLattice.trackBunch(...) walks the tree of the nodes
+# and calls the AccActionsContainer ENTRANCE, BODY, and EXIT
+# actions for every node and every part of the node.
+# The LatticePlan walks the tree once and keeps the flat list
+# of the (node, parent node, part index, length) steps in the
+# order of the tracking. The tracking by the plan calls only
+# the node.track(paramsDict) methods, and the user functions
+# are called only at the nodes where they were attached by
+# addAction(node, place, func).
+# The plan should be rebuilt by compile() after any change
+# of the lattice structure (add/remove nodes, child nodes,
+# number of parts).
+#--------------------------------------------------------
+
+import math
+import sys
+
+from orbit.lattice import AccLattice, AccNode, AccActionsContainer
+
+import orbit_mpi
+
+#---- the kinds of the plan steps
+STEP_TRACK = 0
+STEP_ACTION = 1
+
+class LatticePlan:
+	"""
+	The flat list of the tracking steps of the lattice.
+	"""
+	def __init__(self, lattice):
+		self.lattice = lattice
+		self.actions = {}
+		self.steps = []
+		self.n_top_nodes = 0
+
+	def addAction(self, node, place, func):
+		"""
+		Attaches the func(paramsDict) to the node at the place
+		AccActionsContainer.ENTRANCE, BODY (before each part), or EXIT.
+		The plan should be compiled after it.
+		"""
+		if(not self.actions.has_key((node,place))):
+			self.actions[(node,place)] = []
+		self.actions[(node,place)].append(func)
+
+	def removeActions(self):
+		self.actions = {}
+
+	def compile(self):
+		"""
+		Builds the flat list of the steps. The lattice should be initialized.
+		"""
+		self.steps = []
+		nodes = self.lattice.getNodes()
+		pos = 0.
+		for node in nodes:
+			pos = self._addNodeSteps(node,self.lattice,pos)
+		self.n_top_nodes = len(nodes)
+
+	def _addActionSteps(self, node, parentNode, place, pos):
+		for func in self.actions.get((node,place),[]):
+			self.steps.append((STEP_ACTION,node,parentNode,func,pos))
+
+	def _addNodeSteps(self, node, parentNode, pos):
+		"""
+		Adds the steps of the node and its children in the order of
+		AccNode.trackActions(...). Returns the position after the node.
+		"""
+		self._addActionSteps(node,parentNode,AccActionsContainer.ENTRANCE,pos)
+		for child in node.getChildNodes(AccNode.ENTRANCE):
+			pos = self._addNodeSteps(child,node,pos)
+		for part_index in range(node.getnParts()):
+			for child in node.getChildNodes(AccNode.BODY,part_index,AccNode.BEFORE):
+				pos = self._addNodeSteps(child,node,pos)
+			self._addActionSteps(node,parentNode,AccActionsContainer.BODY,pos)
+			length = node.getLength(part_index)
+			self.steps.append((STEP_TRACK,node,parentNode,part_index,length))
+			pos += length
+			for child in node.getChildNodes(AccNode.BODY,part_index,AccNode.AFTER):
+				pos = self._addNodeSteps(child,node,pos)
+		for child in node.getChildNodes(AccNode.EXIT):
+			pos = self._addNodeSteps(child,node,pos)
+		self._addActionSteps(node,parentNode,AccActionsContainer.EXIT,pos)
+		return pos
+
+	def getNumberOfSteps(self):
+		return len(self.steps)
+
+	def trackBunch(self, bunch, paramsDict = {}):
+		"""
+		Tracks the bunch through the lattice by the plan.
+		"""
+		if(len(self.steps) == 0 or self.n_top_nodes != len(self.lattice.getNodes())):
+			orbit_mpi.finalize("LatticePlan: the plan should be compiled after the lattice changes!")
+		paramsDict["bunch"] = bunch
+		paramsDict["lattice"] = self.lattice
+		pos_start = paramsDict.get("path_length",0.)
+		pos = pos_start
+		#---- the value is the length for the tracking step and the position for the action step
+		for (kind,node,parentNode,param,value) in self.steps:
+			paramsDict["node"] = node
+			paramsDict["parentNode"] = parentNode
+			if(kind == STEP_TRACK):
+				node.setActivePartIndex(param)
+				node.track(paramsDict)
+				pos += value
+			else:
+				paramsDict["path_length"] = pos_start + value
+				param(paramsDict)
+				if(paramsDict.get("stopTracking",False)): break
+		paramsDict["path_length"] = pos
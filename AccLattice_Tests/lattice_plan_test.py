@@ -0,0 +1,67 @@
+import sys
+import math
+import posix
+
+from orbit.lattice import AccLattice, AccNode, AccActionsContainer
+
+from lattice_plan import LatticePlan
+
+#-----------------------------------------------------
+# Compares the tracking order of the LatticePlan with
+# the AccLattice.trackBunch(...) and the speed of both
+#-----------------------------------------------------
+
+class RecordNode(AccNode):
+	def __init__(self, name, record_arr):
+		AccNode.__init__(self,name)
+		self.record_arr = record_arr
+
+	def track(self, paramsDict):
+		self.record_arr.append((self.getName(),self.getActivePartIndex()))
+
+record_arr = []
+
+lattice = AccLattice("test_lattice")
+for ind in range(100):
+	elem = RecordNode("el-"+str(ind),record_arr)
+	elem.setLength(1.0)
+	elem.setnParts(3)
+	lattice.addNode(elem)
+	if(ind % 10 == 0):
+		elem.addChildNode(RecordNode("el-"+str(ind)+"-entr",record_arr),AccNode.ENTRANCE)
+		elem.addChildNode(RecordNode("el-"+str(ind)+"-body-1",record_arr),AccNode.BODY,1)
+		elem.addChildNode(RecordNode("el-"+str(ind)+"-exit",record_arr),AccNode.EXIT)
+lattice.initialize()
+
+plan = LatticePlan(lattice)
+node_act = lattice.getNodes()[50]
+def funcEntrance(paramsDict):
+	print "action at node=",paramsDict["node"].getName()," pos= %6.3f "%paramsDict["path_length"]
+plan.addAction(node_act,AccActionsContainer.ENTRANCE,funcEntrance)
+plan.compile()
+print "plan steps=",plan.getNumberOfSteps()
+
+#---- the order of tracking should be the same
+lattice.trackBunch(None,{})
+record_lattice = record_arr[:]
+del record_arr[:]
+plan.trackBunch(None,{})
+print "the same order =",(record_lattice == record_arr)," n tracks=",len(record_arr)
+
+#---- speed test
+plan.removeActions()
+plan.compile()
+n_turns = 1000
+time_start = posix.times()[0]
+for i in xrange(n_turns):
+	del record_arr[:]
+	lattice.trackBunch(None,{})
+time_lattice = (posix.times()[0] - time_start)/n_turns
+time_start = posix.times()[0]
+for i in xrange(n_turns):
+	del record_arr[:]
+	plan.trackBunch(None,{})
+time_plan = (posix.times()[0] - time_start)/n_turns
+print "time per turn: lattice= %9.6f plan= %9.6f "%(time_lattice,time_plan)
+
+print "====STOP==="
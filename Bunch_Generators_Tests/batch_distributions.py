@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The distribution generators from orbit.bunch_generators
+# with the additional getCoordinatesBatch(n) method that
+# generates n particles at once as (n,2*dim) NumPy array.
+# The raw coordinates are generated in the normalized
+# phase space (uniform ball for Water Bag, sphere surface
+# for KV, normal distribution for Gauss) and transformed
+# with the Twiss parameters as in the original classes.
+# The NumPy random generator is used, so the batch and
+# the getCoordinates() sequences are different.
+# The getCoordinatesRange(ind_start,ind_stop,seed) method
+# generates the particles [ind_start:ind_stop] of the
+# global sequence. The sequence is split into streams of
+# PARTICLES_PER_STREAM particles, and each stream has its
+# own generator seeded by (seed, stream index), so each
+# CPU can generate its own part of the bunch without any
+# communication, and the whole bunch does not depend on
+# the number of CPUs.
+#--------------------------------------------------------
+
+import math
+import sys
+
+import numpy as np
+
+from orbit.bunch_generators import KVDist2D, KVDist3D
+from orbit.bunch_generators import GaussDist2D, GaussDist3D
+from orbit.bunch_generators import WaterBagDist2D, WaterBagDist3D
+
+PARTICLES_PER_STREAM = 1024
+
+def _getRawWaterBag(n, dim, rng = np.random):
+	"""
+	Uniform distribution inside the unit ball. The variance of each coordinate is 1/(dim+2).
+	"""
+	arr = rng.standard_normal((n,dim))
+	arr /= np.sqrt((arr**2).sum(axis = 1))[:,np.newaxis]
+	arr *= (rng.random_sample(n)**(1.0/dim))[:,np.newaxis]
+	return (arr,1.0/(dim+2))
+
+def _getRawKV(n, dim, rng = np.random):
+	"""
+	Uniform distribution on the unit sphere surface. The variance of each coordinate is 1/dim.
+	"""
+	arr = rng.standard_normal((n,dim))
+	arr /= np.sqrt((arr**2).sum(axis = 1))[:,np.newaxis]
+	return (arr,1.0/dim)
+
+def _getRawGauss(n, dim, cut_off = -1., rng = np.random):
+	"""
+	Normal distribution. If cut_off > 0 the (u,up) pairs with the amplitude
+	sqrt(u**2+up**2) > cut_off are regenerated plane by plane as GaussDist does.
+	As in GaussDist the emittance is the one of the not truncated
+	distribution, so the variance is 1 and there is no rescaling.
+	"""
+	arr = rng.standard_normal((n,dim))
+	if(cut_off > 0.):
+		for ind in range(dim/2):
+			while(True):
+				bad = (arr[:,2*ind]**2 + arr[:,2*ind+1]**2) > cut_off**2
+				n_bad = bad.sum()
+				if(n_bad == 0): break
+				arr[bad,2*ind:2*ind+2] = rng.standard_normal((n_bad,2))
+	return (arr,1.0)
+
+def _transform(raw, variance, twiss_arr):
+	"""
+	Transforms the normalized coordinates to (u,up) with the Twiss parameters.
+	"""
+	coords = np.empty(raw.shape,dtype = np.float64)
+	for ind in range(len(twiss_arr)):
+		(alpha,beta,gamma,emitt) = twiss_arr[ind].getAlphaBetaGammaEmitt()
+		u_raw = raw[:,2*ind]
+		up_raw = raw[:,2*ind+1]
+		coords[:,2*ind] = math.sqrt(beta*emitt/variance)*u_raw
+		coords[:,2*ind+1] = math.sqrt(emitt/(beta*variance))*(up_raw - alpha*u_raw)
+	return coords
+
+class BatchGeneration:
+	"""
+	The base class for the batch distributions. The subclasses should
+	define getCoordinatesBatch(n, rng) and the twiss_batch tuple.
+	"""
+	def getCoordinatesRange(self, ind_start, ind_stop, seed = 1):
+		"""
+		Returns the particles [ind_start:ind_stop] of the global sequence
+		generated by the streams with the (seed, stream index) seeds.
+		"""
+		stream_start = ind_start/PARTICLES_PER_STREAM
+		stream_stop = (ind_stop + PARTICLES_PER_STREAM - 1)/PARTICLES_PER_STREAM
+		arrs = []
+		for stream in xrange(stream_start,stream_stop):
+			rng = np.random.RandomState([seed,stream])
+			arr = self.getCoordinatesBatch(PARTICLES_PER_STREAM,rng)
+			ind0 = max(ind_start - stream*PARTICLES_PER_STREAM,0)
+			ind1 = min(ind_stop - stream*PARTICLES_PER_STREAM,PARTICLES_PER_STREAM)
+			arrs.append(arr[ind0:ind1])
+		if(len(arrs) == 0):
+			return np.zeros((0,2*len(self.twiss_batch)),dtype = np.float64)
+		return np.vstack(arrs)
+
+class WaterBagDist2DBatch(WaterBagDist2D,BatchGeneration):
+	"""
+	Water Bag 2D distribution with the batch generation.
+	"""
+	def __init__(self, twissX, twissY, *args):
+		WaterBagDist2D.__init__(self,twissX,twissY,*args)
+		self.twiss_batch = (twissX,twissY)
+
+	def getCoordinatesBatch(self, n, rng = np.random):
+		"""
+		Returns the (n,4) array with x,xp,y,yp.
+		"""
+		(raw,variance) = _getRawWaterBag(n,4,rng = rng)
+		return _transform(raw,variance,self.twiss_batch)
+
+class KVDist2DBatch(KVDist2D,BatchGeneration):
+	"""
+	KV 2D distribution with the batch generation.
+	"""
+	def __init__(self, twissX, twissY, *args):
+		KVDist2D.__init__(self,twissX,twissY,*args)
+		self.twiss_batch = (twissX,twissY)
+
+	def getCoordinatesBatch(self, n, rng = np.random):
+		"""
+		Returns the (n,4) array with x,xp,y,yp.
+		"""
+		(raw,variance) = _getRawKV(n,4,rng = rng)
+		return _transform(raw,variance,self.twiss_batch)
+
+class GaussDist2DBatch(GaussDist2D,BatchGeneration):
+	"""
+	Gauss 2D distribution with the batch generation.
+	"""
+	def __init__(self, twissX, twissY, cut_off = -1.):
+		GaussDist2D.__init__(self,twissX,twissY,cut_off)
+		self.twiss_batch = (twissX,twissY)
+		self.cut_off_batch = cut_off
+
+	def getCoordinatesBatch(self, n, rng = np.random):
+		"""
+		Returns the (n,4) array with x,xp,y,yp.
+		"""
+		(raw,variance) = _getRawGauss(n,4,self.cut_off_batch,rng = rng)
+		return _transform(raw,variance,self.twiss_batch)
+
+class WaterBagDist3DBatch(WaterBagDist3D,BatchGeneration):
+	"""
+	Water Bag 3D distribution with the batch generation.
+	"""
+	def __init__(self, twissX, twissY, twissZ, *args):
+		WaterBagDist3D.__init__(self,twissX,twissY,twissZ,*args)
+		self.twiss_batch = (twissX,twissY,twissZ)
+
+	def getCoordinatesBatch(self, n, rng = np.random):
+		"""
+		Returns the (n,6) array with x,xp,y,yp,z,zp.
+		"""
+		(raw,variance) = _getRawWaterBag(n,6,rng = rng)
+		return _transform(raw,variance,self.twiss_batch)
+
+class KVDist3DBatch(KVDist3D,BatchGeneration):
+	"""
+	KV 3D distribution with the batch generation.
+	"""
+	def __init__(self, twissX, twissY, twissZ, *args):
+		KVDist3D.__init__(self,twissX,twissY,twissZ,*args)
+		self.twiss_batch = (twissX,twissY,twissZ)
+
+	def getCoordinatesBatch(self, n, rng = np.random):
+		"""
+		Returns the (n,6) array with x,xp,y,yp,z,zp.
+		"""
+		(raw,variance) = _getRawKV(n,6,rng = rng)
+		return _transform(raw,variance,self.twiss_batch)
+
+class GaussDist3DBatch(GaussDist3D,BatchGeneration):
+	"""
+	Gauss 3D distribution with the batch generation.
+	"""
+	def __init__(self, twissX, twissY, twissZ, cut_off = -1.):
+		GaussDist3D.__init__(self,twissX,twissY,twissZ,cut_off)
+		self.twiss_batch = (twissX,twissY,twissZ)
+		self.cut_off_batch = cut_off
+
+	def getCoordinatesBatch(self, n, rng = np.random):
+		"""
+		Returns the (n,6) array with x,xp,y,yp,z,zp.
+		"""
+		(raw,variance) = _getRawGauss(n,6,self.cut_off_batch,rng = rng)
+		return _transform(raw,variance,self.twiss_batch)
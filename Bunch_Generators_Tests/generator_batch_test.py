@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The script will test the batch generation of particles
+# and the bulk insertion of them into the bunch
+#--------------------------------------------------------
+
+import math
+import sys
+import time
+
+import numpy as np
+
+from orbit.bunch_generators import TwissContainer, TwissAnalysis
+
+from bunch import Bunch
+
+from batch_distributions import WaterBagDist3DBatch, GaussDist3DBatch, KVDist3DBatch
+from batch_distributions import GaussDist2DBatch
+
+sys.path.append("../Bunch_Tests")
+from bunch_columns import addParticles
+
+n = 100000
+
+twissX = TwissContainer(alpha = 1., beta = 2., emittance = 3.)
+twissY = TwissContainer(alpha = 2., beta = 3., emittance = 4.)
+twissZ = TwissContainer(alpha = 3., beta = 4., emittance = 5.)
+
+for distClass in (KVDist3DBatch,WaterBagDist3DBatch,GaussDist3DBatch):
+	dist = distClass(twissX,twissY,twissZ)
+	time_start = time.time()
+	coords = dist.getCoordinatesBatch(n)
+	b = Bunch()
+	addParticles(b,coords)
+	tm = time.time() - time_start
+	twiss_analysis = TwissAnalysis(3)
+	for i in range(b.getSize()):
+		twiss_analysis.account((b.x(i),b.xp(i),b.y(i),b.yp(i),b.z(i),b.dE(i)))
+	print "================================================="
+	print distClass.__name__," n=",b.getSize()," time [sec] = %8.3f"%tm
+	print "                  alpha       beta [m/rad]    gamma     emitt[m*rad] "
+	print "Twiss     X  %12.5g  %12.5g   %12.5g    %12.5g "%twissX.getAlphaBetaGammaEmitt()
+	print "Generated X  %12.5g  %12.5g   %12.5g    %12.5g "%twiss_analysis.getTwiss(0)
+	print "......................................................................"
+	print "Twiss     Y  %12.5g  %12.5g   %12.5g    %12.5g "%twissY.getAlphaBetaGammaEmitt()
+	print "Generated Y  %12.5g  %12.5g   %12.5g    %12.5g "%twiss_analysis.getTwiss(1)
+	print "......................................................................"
+	print "Twiss     Z  %12.5g  %12.5g   %12.5g    %12.5g "%twissZ.getAlphaBetaGammaEmitt()
+	print "Generated Z  %12.5g  %12.5g   %12.5g    %12.5g "%twiss_analysis.getTwiss(2)
+	print "================================================="
+
+#---------------------------------------------
+# The truncated Gauss: no (u,up) amplitude is above the cut-off
+#---------------------------------------------
+cut_off = 2.5
+dist = GaussDist2DBatch(twissX,twissY,cut_off)
+coords = dist.getCoordinatesBatch(n,np.random.RandomState(3))
+for (ind,twiss) in ((0,twissX),(1,twissY)):
+	(alpha,beta,gamma,emitt) = twiss.getAlphaBetaGammaEmitt()
+	(u,up) = (coords[:,2*ind],coords[:,2*ind+1])
+	amp2 = (gamma*u*u + 2*alpha*u*up + beta*up*up)/emitt
+	print "GaussDist2DBatch cut_off =",cut_off," plane",ind," max amplitude =",math.sqrt(amp2.max())
+	if(amp2.max() > cut_off**2*(1.0 + 1.0e-9)):
+		print "The truncated Gauss particles are outside the cut-off!"
+		sys.exit(1)
+
+#---------------------------------------------
+# The global sequence does not depend on how it is split
+# between the CPUs (1 and n_parts CPUs give the same bunch)
+#---------------------------------------------
+dists = []
+dists.append(WaterBagDist3DBatch(twissX,twissY,twissZ))
+dists.append(GaussDist3DBatch(twissX,twissY,twissZ))
+dists.append(GaussDist3DBatch(twissX,twissY,twissZ,3.0))
+dists.append(GaussDist2DBatch(twissX,twissY,2.5))
+for dist in dists:
+	coords_all = dist.getCoordinatesRange(0,n,seed = 7)
+	for n_parts in (2,3,7):
+		coords_parts = []
+		for ind in range(n_parts):
+			coords_parts.append(dist.getCoordinatesRange((n*ind)/n_parts,(n*(ind+1))/n_parts,seed = 7))
+		max_diff = np.fabs(coords_all - np.vstack(coords_parts)).max()
+		print dist.__class__.__name__," split into",n_parts," parts max diff =",max_diff
+		if(max_diff != 0.):
+			print "The generated bunch depends on the number of CPUs!"
+			sys.exit(1)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The columnar storage of the particle attributes outside
+# the bunch. The attributes that are not used by the
+# tracking (e.g. "Amplitudes" with size 5) can be detached
+# from the bunch before the tracking and attached back
+# after it, so the bunch copy and compress operations move
+# only the coordinates and the "ParticleIdNumber" attribute.
+# Each attribute is kept as a separate contiguous NumPy
+# column, and the column of a new attribute is allocated
+# only when it is written for the first time.
+# The particles are matched by "ParticleIdNumber", so the
+# particles lost during the tracking are handled correctly.
+# The store is local: the columns are not moved with the
+# particles between CPUs, so the detach and attach should
+# be done on the same rank layout, i.e. there should be no
+# redistribution of the particles between CPUs (e.g. the
+# global id sort) between them. The particles that moved to
+# another CPU are reported as unknown ids by attach.
+# The repeated detach calls add the columns to the ones
+# already in the store.
+#--------------------------------------------------------
+
+import math
+import sys
+
+import numpy as np
+
+import orbit_mpi
+
+from bunch import Bunch
+from orbit.bunch_utils import ParticleIdNumber
+
+from bunch_columns import getPartAttr, setPartAttr
+
+ID_ATTR_NAME = "ParticleIdNumber"
+
+def _getIds(bunch):
+	if(not bunch.hasPartAttr(ID_ATTR_NAME)):
+		orbit_mpi.finalize("PartAttrStore: the bunch should have "+ID_ATTR_NAME+" attribute!")
+	return getPartAttr(bunch,ID_ATTR_NAME)[:,0].astype(np.int64)
+
+class PartAttrStore:
+	"""
+	Keeps the particle attributes as NumPy columns indexed by the particle id.
+	"""
+	def __init__(self):
+		self.ids = np.zeros(0,dtype = np.int64)
+		self.columns = {}
+		self.attr_dicts = {}
+
+	def getAttrNames(self):
+		"""
+		Returns the names of the attributes with allocated columns.
+		"""
+		return self.columns.keys()
+
+	def _addIds(self, ids):
+		"""
+		Adds the ids to the store and remaps the existing columns (the
+		rows of the new ids are zeros). Returns the rows of the ids.
+		"""
+		new_ids = np.union1d(self.ids,ids)
+		if(new_ids.shape[0] != self.ids.shape[0]):
+			old_rows = np.searchsorted(new_ids,self.ids)
+			for attr_name in self.columns.keys():
+				column = np.zeros((new_ids.shape[0],self.columns[attr_name].shape[1]),dtype = np.float64)
+				column[old_rows] = self.columns[attr_name]
+				self.columns[attr_name] = column
+			self.ids = new_ids
+		return np.searchsorted(self.ids,ids)
+
+	def _getRows(self, ids):
+		"""
+		Returns the rows of the columns for the particle ids.
+		"""
+		rows = np.searchsorted(self.ids,ids)
+		if(rows.shape[0] > 0 and (np.any(rows >= self.ids.shape[0]) or np.any(self.ids[np.minimum(rows,self.ids.shape[0]-1)] != ids))):
+			orbit_mpi.finalize("PartAttrStore: unknown particle ids! Were the particles moved between CPUs?")
+		return rows
+
+	def detach(self, bunch, attr_names):
+		"""
+		Moves the attributes from the bunch into the store. The columns
+		detached before are kept. The "ParticleIdNumber" attribute is added
+		to the bunch if necessary.
+		"""
+		if(not bunch.hasPartAttr(ID_ATTR_NAME)):
+			ParticleIdNumber.addParticleIdNumbers(bunch)
+		rows = self._addIds(_getIds(bunch))
+		for attr_name in attr_names:
+			if(not bunch.hasPartAttr(attr_name)): continue
+			values = getPartAttr(bunch,attr_name)
+			if(not self.columns.has_key(attr_name) or self.columns[attr_name].shape[1] != values.shape[1]):
+				self.columns[attr_name] = np.zeros((self.ids.shape[0],values.shape[1]),dtype = np.float64)
+			self.attr_dicts[attr_name] = bunch.getPartAttrDicts()[attr_name]
+			self.columns[attr_name][rows] = values
+			bunch.removePartAttr(attr_name)
+
+	def attach(self, bunch, lostbunch = None):
+		"""
+		Moves the attributes back into the bunch (and into the lost bunch
+		if it is not None and has the "ParticleIdNumber" attribute).
+		The particles should be on the same CPUs as at the detach.
+		"""
+		bunches = [bunch,]
+		if(lostbunch != None and lostbunch.hasPartAttr(ID_ATTR_NAME)):
+			bunches.append(lostbunch)
+		for b in bunches:
+			rows = self._getRows(_getIds(b))
+			for attr_name in self.columns.keys():
+				if(not b.hasPartAttr(attr_name)):
+					b.addPartAttr(attr_name,self.attr_dicts[attr_name])
+				setPartAttr(b,attr_name,self.columns[attr_name][rows])
+		self.columns = {}
+
+	def getValues(self, attr_name, ids):
+		"""
+		Returns the (n,attr_size) array of the attribute values for the particle ids.
+		"""
+		return self.columns[attr_name][self._getRows(ids)]
+
+	def setValues(self, attr_name, ids, values, attr_dict = None):
+		"""
+		Sets the attribute values for the particle ids. The column is
+		allocated (with zeros) at the first write of the attribute.
+		"""
+		values = np.asarray(values,dtype = np.float64)
+		if(len(values.shape) == 1): values = values[:,np.newaxis]
+		if(not self.columns.has_key(attr_name)):
+			self.columns[attr_name] = np.zeros((self.ids.shape[0],values.shape[1]),dtype = np.float64)
+			if(attr_dict == None): attr_dict = {"size":values.shape[1]}
+			self.attr_dicts[attr_name] = attr_dict
+		self.columns[attr_name][self._getRows(ids)] = values
@@ -0,0 +1,74 @@
+import sys
+import time
+
+import numpy as np
+
+from bunch import Bunch
+
+from bunch_attr_store import PartAttrStore
+from bunch_columns import getPartAttr
+
+#-----------------------------------------------------
+#Test of the particle attributes detached from the bunch
+#-----------------------------------------------------
+
+print "Start."
+
+b = Bunch()
+
+nParts = 10
+for i in xrange(nParts):
+	b.addParticle(0.1+i,0.2+i,0.3+i,0.4+i,0.5+i,0.6+i)
+b.compress()
+
+d = {"size":5}
+b.addPartAttr("Amplitudes",d)
+for i in xrange(nParts):
+	for j in xrange(5):
+		b.partAttrValue("Amplitudes",i,j,10.*i+j)
+
+store = PartAttrStore()
+store.detach(b,["Amplitudes",])
+print "bunch attributes after detach =",b.getPartAttrNames()
+print "store attributes =",store.getAttrNames()
+
+#---- the column of a new attribute is created only at the first write
+ids = np.arange(nParts)
+store.setValues("TurnOfBirth",ids,np.ones(nParts)*7.)
+
+#---- the second detach keeps the columns detached before
+b.addPartAttr("macrosize")
+for i in xrange(nParts):
+	b.partAttrValue("macrosize",i,0,1.0e+10*(i+1))
+store.detach(b,["macrosize",])
+print "store attributes after the second detach =",store.getAttrNames()
+if(sorted(store.getAttrNames()) != ["Amplitudes","TurnOfBirth","macrosize"]):
+	print "The second detach discarded the store columns!"
+	sys.exit(1)
+
+#---- emulate losses: the particles with odd indexes are moved to lostbunch
+lostbunch = Bunch()
+b.copyEmptyBunchTo(lostbunch)
+for i in xrange(nParts):
+	if(i % 2 == 1):
+		lostbunch.addParticle(b.x(i),b.xp(i),b.y(i),b.yp(i),b.z(i),b.dE(i))
+		lostbunch.compress()
+		lostbunch.partAttrValue("ParticleIdNumber",lostbunch.getSize()-1,0,b.partAttrValue("ParticleIdNumber",i,0))
+		b.flag(i,0)
+b.compress()
+
+store.attach(b,lostbunch)
+print "bunch attributes after attach =",b.getPartAttrNames()
+print "bunch Amplitudes =",getPartAttr(b,"Amplitudes")
+print "lost bunch Amplitudes =",getPartAttr(lostbunch,"Amplitudes")
+print "bunch TurnOfBirth =",getPartAttr(b,"TurnOfBirth")[:,0]
+
+#---- the even particles are in the bunch, the odd ones are in the lost bunch
+amps = np.vstack((getPartAttr(b,"Amplitudes"),getPartAttr(lostbunch,"Amplitudes")))
+macrosizes = np.concatenate((getPartAttr(b,"macrosize")[:,0],getPartAttr(lostbunch,"macrosize")[:,0]))
+inds = np.concatenate((np.arange(0,nParts,2),np.arange(1,nParts,2)))
+if(np.any(amps != 10.*inds[:,np.newaxis] + np.arange(5)) or np.any(macrosizes != 1.0e+10*(inds+1))):
+	print "The attached attributes are wrong!"
+	sys.exit(1)
+
+print "Stop."
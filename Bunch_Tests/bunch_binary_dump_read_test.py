@@ -0,0 +1,104 @@
+import sys
+import os
+import time
+
+import numpy as np
+
+from bunch import Bunch
+
+from bunch_binary_io import dumpBunchBinary, readBunchBinary, getColumn
+from bunch_binary_io import readPartAttrNamesBinary, readPartAttrDictsBinary
+
+#-----------------------------------------------------
+#Dump and read bunch to and from the binary file
+#-----------------------------------------------------
+
+print "Start."
+
+b = Bunch()
+
+nParts = 5
+for i in xrange(nParts):
+	b.addParticle(0.1+i,0.2+i,0.3+i,0.4+i,0.5+i,0.6+i)
+b.compress()
+
+# add particles attributes
+b.addPartAttr("macrosize")
+d = {"size":5}
+b.addPartAttr("Amplitudes",d)
+for i in xrange(nParts):
+	b.partAttrValue("macrosize",i,0,1.0e+10*(i+1))
+	for j in xrange(5):
+		b.partAttrValue("Amplitudes",i,j,10.*i+j)
+
+#add bunch attributes
+b.bunchAttrDouble("aaa",222)
+b.bunchAttrDouble("bbb",333)
+b.bunchAttrInt("aaa",111)
+b.bunchAttrInt("bbb",444)
+
+#---- the values with more than 6 significant digits of the dumpBunch header
+b.mass(0.93827231)
+b.macroSize(1.23456789012345e+10)
+b.classicalRadius(1.5346982671888944e-18)
+b.bunchAttrDouble("bbb",333.123456789)
+b.getSyncParticle().kinEnergy(1.0123456789)
+b.getSyncParticle().time(1.23456789012345e-3)
+
+time_start = time.time()
+dumpBunchBinary(b,"bunch_dump_test.bin")
+print "binary dump time [sec] =",(time.time() - time_start)
+
+b_new = Bunch()
+readBunchBinary(b_new,"bunch_dump_test.bin")
+b_new.dumpBunch()
+
+#---- the bunch attributes should be the same after the round trip
+for (name,val,val_new) in (("mass",b.mass(),b_new.mass()), \
+	("macroSize",b.macroSize(),b_new.macroSize()), \
+	("classicalRadius",b.classicalRadius(),b_new.classicalRadius()), \
+	("charge",b.charge(),b_new.charge()), \
+	("bunchAttrDouble bbb",b.bunchAttrDouble("bbb"),b_new.bunchAttrDouble("bbb")), \
+	("bunchAttrInt bbb",b.bunchAttrInt("bbb"),b_new.bunchAttrInt("bbb")), \
+	("sync. pz",b.getSyncParticle().pz(),b_new.getSyncParticle().pz()), \
+	("sync. time",b.getSyncParticle().time(),b_new.getSyncParticle().time())):
+	if(val != val_new):
+		print "bunch attribute",name,"is not the same after the round trip:",repr(val),repr(val_new)
+		sys.exit(1)
+print "bunch attributes round trip is exact."
+
+print "names of attr. =",readPartAttrNamesBinary("bunch_dump_test.bin")
+print "attr. dict =",readPartAttrDictsBinary("bunch_dump_test.bin")
+
+#---- one column without reading the whole file
+dE = getColumn("bunch_dump_test.bin","dE")
+print "dE column =",np.array(dE)
+
+#---- the timing of the text and binary dumps for the large bunch
+b = Bunch()
+for i in xrange(100000):
+	b.addParticle(0.1*i,0.2,0.3,0.4,0.5,0.6)
+b.compress()
+b.addPartAttr("macrosize")
+
+time_start = time.time()
+b.dumpBunch("bunch_dump_test_large.dat")
+time_text = time.time() - time_start
+time_start = time.time()
+dumpBunchBinary(b,"bunch_dump_test_large.bin")
+time_binary = time.time() - time_start
+print "n parts =",b.getSize()," dump time [sec] text = %8.4f binary = %8.4f "%(time_text,time_binary)
+
+time_start = time.time()
+b_text = Bunch()
+b_text.readBunch("bunch_dump_test_large.dat")
+time_text = time.time() - time_start
+time_start = time.time()
+b_binary = Bunch()
+readBunchBinary(b_binary,"bunch_dump_test_large.bin")
+time_binary = time.time() - time_start
+print "n parts =",b_binary.getSize()," read time [sec] text = %8.4f binary = %8.4f "%(time_text,time_binary)
+os.remove("bunch_dump_test_large.dat")
+os.remove("bunch_dump_test_large.bin")
+
+print "Stop."
@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The binary bunch file format. The file has the same
+# header as the text file of Bunch.dumpBunch (sync.
+# particle, bunch attributes, particle attributes
+# controllers), and after it the particle coordinates
+# and attributes as column-major float64 blocks.
+# The columns are written with one write per column and
+# can be memory-mapped and read one by one.
+# The dumpBunchBinary collects the columns on rank 0, each
+# CPU sends all its columns as one message with the raw bytes
+# (base64 encoded, because the MPI_CHAR messages of orbit_mpi
+# are C strings).
+# The version 2 files are written by all CPUs in parallel.
+# Each CPU writes its own slab of every column at the
+# precomputed offset, and the header keeps the index of
+# the particle counts per CPU.
+# The version 3 files also keep the bunch attributes and
+# the sync. particle coordinates, momentum, and time with
+# 17 significant digits, because the dumpBunch header text
+# keeps them with 6 digits only. The exact values are
+# applied after the header is read into the bunch.
+#
+# File structure:
+#   PYORBIT_BUNCH_BINARY <version>\n
+#   int64 n_parts, int64 header length, int64 columns line length
+#   header text (the same as in the dumpBunch text file)
+#   columns line: names of the columns separated by spaces
+#   (version 2 and 3) int64 n_ranks and n_ranks int64 particle counts
+#   (version 3 only) int64 length and the exact attributes text
+#   zero padding to the 8 bytes boundary
+#   n_cols blocks of n_parts float64 numbers
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+import struct
+import tempfile
+import base64
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+
+from bunch_columns import COORD_NAMES
+from bunch_columns import getCoordinates, getPartAttr, addParticles
+
+BINARY_MAGIC = "PYORBIT_BUNCH_BINARY"
+BINARY_VERSION = 3
+
+SYNC_PART_NAMES = ("x","y","z","px","py","pz","time")
+
+def _bcastText(text, comm):
+	"""
+	Returns the text of rank 0 on all CPUs. It is collective.
+	"""
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	#---- the text is broadcast as the char codes, because the lengths differ on CPUs
+	n_chars = orbit_mpi.MPI_Bcast(len(text),mpi_datatype.MPI_INT,0,comm)
+	if(n_chars == 0): return ""
+	codes = (0,)*n_chars
+	if(rank == 0): codes = tuple([ord(ch) for ch in text])
+	codes = orbit_mpi.MPI_Bcast(codes,mpi_datatype.MPI_INT,0,comm)
+	if(not isinstance(codes,tuple)): codes = (codes,)
+	return "".join([chr(code) for code in codes])
+
+def _getTempFileName(comm):
+	"""
+	Returns the name of the new temporary file created by rank 0. It is collective.
+	"""
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	tmp_file_name = ""
+	if(rank == 0):
+		(fd,tmp_file_name) = tempfile.mkstemp(suffix = ".hdr")
+		os.close(fd)
+	return _bcastText(tmp_file_name,comm)
+
+def _getColumnNames(bunch):
+	"""
+	Returns the list of the column names: 6 coordinates and the
+	particle attributes as <attr name>[<index>].
+	"""
+	names = list(COORD_NAMES)
+	for attr_name in bunch.getPartAttrNames():
+		for j in xrange(bunch.getPartAttrSize(attr_name)):
+			names.append(attr_name+"["+str(j)+"]")
+	return names
+
+def _getLocalColumns(bunch):
+	"""
+	Returns the (n_cols,nParts) array with all columns of the local particles.
+	"""
+	arrs = [getCoordinates(bunch).T,]
+	for attr_name in bunch.getPartAttrNames():
+		arrs.append(getPartAttr(bunch,attr_name).T)
+	return np.ascontiguousarray(np.vstack(arrs))
+
+def _getHeaderText(bunch):
+	"""
+	Returns the text header of the empty bunch copy. It is collective
+	as Bunch.dumpBunch. The header text is meaningful on rank 0 only.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	header_file_name = _getTempFileName(comm)
+	b_empty = Bunch()
+	bunch.copyEmptyBunchTo(b_empty)
+	b_empty.dumpBunch(header_file_name)
+	header_text = ""
+	if(rank == 0):
+		fl = open(header_file_name,"r")
+		header_text = fl.read()
+		fl.close()
+		os.remove(header_file_name)
+	return header_text
+
+def _getAttrsText(bunch, header_text):
+	"""
+	Returns the text with the bunch double and int attributes and the sync.
+	particle coordinates, momentum, and time with 17 significant digits.
+	One line per value: DOUBLE, INT, or SYNC, the name, and the value.
+	The names of the attributes are taken from the dumpBunch header text.
+	"""
+	lines = []
+	for line in header_text.split("\n"):
+		res_arr = line.split()
+		if(len(res_arr) < 3): continue
+		if(res_arr[1] == "BUNCH_ATTRIBUTE_DOUBLE"):
+			lines.append("DOUBLE %s %.17g"%(res_arr[2],bunch.bunchAttrDouble(res_arr[2])))
+		if(res_arr[1] == "BUNCH_ATTRIBUTE_INT"):
+			lines.append("INT %s %d"%(res_arr[2],bunch.bunchAttrInt(res_arr[2])))
+	sync_part = bunch.getSyncParticle()
+	for name in SYNC_PART_NAMES:
+		lines.append("SYNC %s %.17g"%(name,getattr(sync_part,name)()))
+	return "\n".join(lines)
+
+def getBunchAttrsText(bunch):
+	"""
+	Returns the exact bunch attributes text (see setBunchAttrsText).
+	It is collective, and the text is the same on all CPUs.
+	"""
+	header_text = _bcastText(_getHeaderText(bunch),bunch.getMPIComm())
+	return _getAttrsText(bunch,header_text)
+
+def setBunchAttrsText(bunch, attrs_text):
+	"""
+	Sets the bunch attributes and the sync. particle coordinates, momentum,
+	and time from the text of the getBunchAttrsText function.
+	"""
+	#---- the attributes with the separate Bunch setters
+	setters = {"mass":"mass","charge":"charge","classical_radius":"classicalRadius","macro_size":"macroSize"}
+	sync_part = bunch.getSyncParticle()
+	for line in attrs_text.split("\n"):
+		res_arr = line.split()
+		if(len(res_arr) != 3): continue
+		(kind,name,val) = res_arr
+		if(kind == "DOUBLE"):
+			if(setters.has_key(name)):
+				getattr(bunch,setters[name])(float(val))
+			else:
+				bunch.bunchAttrDouble(name,float(val))
+		if(kind == "INT"):
+			bunch.bunchAttrInt(name,int(val))
+		if(kind == "SYNC"):
+			getattr(sync_part,name)(float(val))
+
+def writeBinaryHeader(fl, n_parts, header_text, column_names, rank_counts = None, attrs_text = ""):
+	"""
+	Writes the version 3 binary file header and returns the offset of the
+	first column. The rank_counts (particles per CPU) is the index of the
+	slabs, it is None if the file is not written by slabs.
+	"""
+	columns_line = " ".join(column_names)
+	fl.write(BINARY_MAGIC+" "+str(BINARY_VERSION)+"\n")
+	fl.write(struct.pack("<qqq",n_parts,len(header_text),len(columns_line)))
+	fl.write(header_text)
+	fl.write(columns_line)
+	if(rank_counts == None): rank_counts = []
+	fl.write(struct.pack("<q",len(rank_counts)))
+	fl.write(struct.pack("<"+str(len(rank_counts))+"q",*rank_counts))
+	fl.write(struct.pack("<q",len(attrs_text)))
+	fl.write(attrs_text)
+	n_pad = (8 - fl.tell() % 8) % 8
+	fl.write("\0"*n_pad)
+	return fl.tell()
+
+def readBinaryHeader(fileName):
+	"""
+	Returns (n_parts, header_text, column_names, data_offset) without reading the particles data.
+	"""
+	(n_parts,header_text,column_names,rank_counts,attrs_text,data_offset) = _readBinaryHeader(fileName)
+	return (n_parts,header_text,column_names,data_offset)
+
+def readBinaryRankCounts(fileName):
+	"""
+	Returns the list of the particle counts per CPU or None if the file
+	was not written by slabs.
+	"""
+	(n_parts,header_text,column_names,rank_counts,attrs_text,data_offset) = _readBinaryHeader(fileName)
+	return rank_counts
+
+def _readBinaryHeader(fileName):
+	fl = open(fileName,"rb")
+	line = fl.readline()
+	res_arr = line.split()
+	if(len(res_arr) != 2 or res_arr[0] != BINARY_MAGIC):
+		fl.close()
+		orbit_mpi.finalize("bunch_binary_io: file is not a binary bunch file="+fileName)
+	if(int(res_arr[1]) > BINARY_VERSION):
+		fl.close()
+		orbit_mpi.finalize("bunch_binary_io: unknown version="+res_arr[1]+" file="+fileName)
+	(n_parts,header_len,columns_len) = struct.unpack("<qqq",fl.read(struct.calcsize("<qqq")))
+	header_text = fl.read(header_len)
+	column_names = fl.read(columns_len).split()
+	rank_counts = None
+	if(int(res_arr[1]) >= 2):
+		(n_ranks,) = struct.unpack("<q",fl.read(8))
+		rank_counts = list(struct.unpack("<"+str(n_ranks)+"q",fl.read(8*n_ranks)))
+		if(n_ranks == 0): rank_counts = None
+	#---- the version 1 and 2 files have the 6 digits header attributes only
+	attrs_text = ""
+	if(int(res_arr[1]) >= 3):
+		(attrs_len,) = struct.unpack("<q",fl.read(8))
+		attrs_text = fl.read(attrs_len)
+	data_offset = fl.tell()
+	data_offset += (8 - data_offset % 8) % 8
+	fl.close()
+	return (n_parts,header_text,column_names,rank_counts,attrs_text,data_offset)
+
+def dumpBunchBinary(bunch, fileName):
+	"""
+	Dumps the bunch into the binary file. It is collective as Bunch.dumpBunch:
+	the particles from all CPUs are collected by rank 0, one message per CPU.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	bunch.compress()
+	header_text = _getHeaderText(bunch)
+	attrs_text = _getAttrsText(bunch,header_text)
+	column_names = _getColumnNames(bunch)
+	columns = _getLocalColumns(bunch)
+	n_parts = bunch.getSizeGlobal()
+	tag = 4321
+	if(rank != 0):
+		orbit_mpi.MPI_Send(columns.shape[1],mpi_datatype.MPI_INT,0,tag,comm)
+		if(columns.shape[1] > 0):
+			orbit_mpi.MPI_Send(base64.b64encode(columns.astype("<f8").tostring()),mpi_datatype.MPI_CHAR,0,tag,comm)
+		return
+	counts = [columns.shape[1],]
+	remote_columns = [None,]
+	for rank_from in range(1,size):
+		n_remote = orbit_mpi.MPI_Recv(mpi_datatype.MPI_INT,rank_from,tag,comm)
+		counts.append(n_remote)
+		arr = None
+		if(n_remote > 0):
+			data = base64.b64decode(orbit_mpi.MPI_Recv(mpi_datatype.MPI_CHAR,rank_from,tag,comm))
+			arr = np.frombuffer(data,dtype = "<f8").reshape((len(column_names),n_remote))
+		remote_columns.append(arr)
+	fl = open(fileName,"wb")
+	writeBinaryHeader(fl,n_parts,header_text,column_names,attrs_text = attrs_text)
+	for ind in range(len(column_names)):
+		col = [columns[ind],]
+		for rank_from in range(1,size):
+			if(counts[rank_from] > 0):
+				col.append(remote_columns[rank_from][ind])
+		np.concatenate(col).astype("<f8").tofile(fl)
+	fl.close()
+
+def dumpBunchBinaryParallel(bunch, fileName):
+	"""
+	Dumps the bunch into the binary file in parallel. It is collective.
+	Rank 0 writes the header with the index of the particle counts per CPU
+	and allocates the file. Then each CPU writes its own contiguous slab
+	of every column at the precomputed offset. The file system should be
+	shared between CPUs.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	bunch.compress()
+	header_text = _getHeaderText(bunch)
+	attrs_text = _getAttrsText(bunch,header_text)
+	column_names = _getColumnNames(bunch)
+	columns = _getLocalColumns(bunch)
+	#---- the particle counts of all CPUs with one Allreduce
+	rank_counts = [0]*size
+	rank_counts[rank] = columns.shape[1]
+	rank_counts = list(orbit_mpi.MPI_Allreduce(tuple(rank_counts),mpi_datatype.MPI_INT,mpi_op.MPI_SUM,comm))
+	n_parts = sum(rank_counts)
+	data_offset = 0
+	if(rank == 0):
+		fl = open(fileName,"wb")
+		data_offset = writeBinaryHeader(fl,n_parts,header_text,column_names,rank_counts,attrs_text)
+		fl.truncate(data_offset + 8*n_parts*len(column_names))
+		fl.close()
+	data_offset = orbit_mpi.MPI_Bcast(data_offset,mpi_datatype.MPI_INT,0,comm)
+	orbit_mpi.MPI_Barrier(comm)
+	if(rank_counts[rank] > 0):
+		slab_start = sum(rank_counts[:rank])
+		fl = open(fileName,"r+b")
+		for ind in range(len(column_names)):
+			fl.seek(data_offset + 8*(n_parts*ind + slab_start))
+			columns[ind].astype("<f8").tofile(fl)
+		fl.close()
+	orbit_mpi.MPI_Barrier(comm)
+
+def getColumn(fileName, column_name):
+	"""
+	Returns the memory-mapped read only array of one column from the binary file.
+	"""
+	(n_parts,header_text,column_names,data_offset) = readBinaryHeader(fileName)
+	if(column_name not in column_names):
+		orbit_mpi.finalize("bunch_binary_io: there is no column="+column_name+" file="+fileName)
+	ind = column_names.index(column_name)
+	if(n_parts == 0): return np.zeros(0,dtype = np.float64)
+	return np.memmap(fileName,dtype = "<f8",mode = "r",offset = data_offset + 8*n_parts*ind,shape = (n_parts,))
+
+def getColumns(fileName):
+	"""
+	Returns the memory-mapped read only (n_cols,n_parts) array of all columns and the column names.
+	"""
+	(n_parts,header_text,column_names,data_offset) = readBinaryHeader(fileName)
+	if(n_parts == 0): return (np.zeros((len(column_names),0),dtype = np.float64),column_names)
+	arr = np.memmap(fileName,dtype = "<f8",mode = "r",offset = data_offset,shape = (len(column_names),n_parts))
+	return (arr,column_names)
+
+def _readHeaderIntoBunch(bunch, fileName, header_text):
+	"""
+	Reads the text header into the bunch with the standard Bunch.readBunch method.
+	The header_text should be defined on rank 0.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	header_file_name = _getTempFileName(comm)
+	if(rank == 0):
+		fl = open(header_file_name,"w")
+		fl.write(header_text)
+		fl.close()
+	orbit_mpi.MPI_Barrier(comm)
+	bunch.readBunch(header_file_name)
+	orbit_mpi.MPI_Barrier(comm)
+	if(rank == 0):
+		os.remove(header_file_name)
+
+def _getAttrSlices(column_names):
+	"""
+	Returns the list of (attr_name, ind_start, ind_stop) for the attribute columns.
+	"""
+	res_arr = []
+	for ind in range(len(COORD_NAMES),len(column_names)):
+		attr_name = column_names[ind][:column_names[ind].rfind("[")]
+		if(len(res_arr) > 0 and res_arr[-1][0] == attr_name):
+			res_arr[-1][2] = ind + 1
+		else:
+			res_arr.append([attr_name,ind,ind+1])
+	return res_arr
+
+def readBunchBinary(bunch, fileName, ind_start = None, ind_stop = None, keep_slabs = False):
+	"""
+	Reads the bunch from the binary file. It is collective. Every CPU
+	reads its own contiguous part of the particles [ind_start:ind_stop]
+	directly from the file. By default the particles are distributed
+	evenly between CPUs, so the file can be read by any number of CPUs.
+	If keep_slabs is True and the file was written by the same number
+	of CPUs, each CPU gets back the slab it has written.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	(n_parts,header_text,column_names,rank_counts,attrs_text,data_offset) = _readBinaryHeader(fileName)
+	_readHeaderIntoBunch(bunch,fileName,header_text)
+	setBunchAttrsText(bunch,attrs_text)
+	if(keep_slabs and rank_counts != None and len(rank_counts) == size):
+		ind_start = sum(rank_counts[:rank])
+		ind_stop = ind_start + rank_counts[rank]
+	if(ind_start == None): ind_start = (n_parts*rank)/size
+	if(ind_stop == None): ind_stop = (n_parts*(rank+1))/size
+	if(ind_stop <= ind_start):
+		return
+	(columns,column_names) = getColumns(fileName)
+	columns = columns[:,ind_start:ind_stop]
+	attrs = {}
+	for (attr_name,ind0,ind1) in _getAttrSlices(column_names):
+		attrs[attr_name] = np.array(columns[ind0:ind1].T)
+	addParticles(bunch,np.array(columns[0:6].T),attrs)
+
+def readPartAttrNamesBinary(fileName):
+	"""
+	Returns the particle attributes names from the binary file without reading the particles.
+	"""
+	(n_parts,header_text,column_names,data_offset) = readBinaryHeader(fileName)
+	names = []
+	for line in header_text.split("\n"):
+		res_arr = line.split()
+		if(len(res_arr) > 1 and res_arr[1] == "PARTICLE_ATTRIBUTES_CONTROLLERS_NAMES"):
+			names = res_arr[2:]
+	return names
+
+def readPartAttrDictsBinary(fileName):
+	"""
+	Returns the particle attributes dictionaries from the binary file
+	without reading the particles.
+	"""
+	(n_parts,header_text,column_names,data_offset) = readBinaryHeader(fileName)
+	(fd,header_file_name) = tempfile.mkstemp(suffix = ".hdr")
+	os.write(fd,header_text)
+	os.close(fd)
+	res_dict = Bunch().readPartAttrDicts(header_file_name)
+	os.remove(header_file_name)
+	return res_dict
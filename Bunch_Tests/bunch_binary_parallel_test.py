@@ -0,0 +1,49 @@
+import sys
+import time
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch
+from orbit.bunch_utils import ParticleIdNumber
+
+from bunch_binary_io import dumpBunchBinaryParallel, readBunchBinary, readBinaryRankCounts
+
+#-----------------------------------------------------
+#Parallel dump and read of the bunch with per-CPU slabs
+#Run it with different numbers of CPUs:
+#./START.sh bunch_binary_parallel_test.py 4
+#-----------------------------------------------------
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+size = orbit_mpi.MPI_Comm_size(comm)
+
+if(rank == 0): print "Start."
+
+b = Bunch()
+
+#---- different number of particles on each CPU
+nParts = 1000*(rank+1)
+for i in xrange(nParts):
+	b.addParticle(0.1+rank,0.2,0.3,0.4,0.5+i,0.6)
+b.compress()
+ParticleIdNumber.addParticleIdNumbers(b)
+
+time_start = orbit_mpi.MPI_Wtime()
+dumpBunchBinaryParallel(b,"bunch_parallel_test.bin")
+if(rank == 0):
+	print "parallel dump time [sec] =",(orbit_mpi.MPI_Wtime() - time_start)
+	print "particles per CPU in file =",readBinaryRankCounts("bunch_parallel_test.bin")
+
+#---- read back with even distribution between CPUs
+b_new = Bunch()
+readBunchBinary(b_new,"bunch_parallel_test.bin")
+print "rank=",rank," even read nParts=",b_new.getSize()," global=",b_new.getSizeGlobal()
+
+#---- read back the same slabs
+b_new = Bunch()
+readBunchBinary(b_new,"bunch_parallel_test.bin",keep_slabs = True)
+print "rank=",rank," slab read nParts=",b_new.getSize()," x(0)=",b_new.x(0)
+
+if(rank == 0): print "Stop."
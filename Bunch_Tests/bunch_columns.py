@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# Column (NumPy array) access to the bunch particles'
+# coordinates and particle attributes.
+# The bunch is walked once and every coordinate and
+# attribute becomes a contiguous NumPy array, so the
+# statistics over the bunch are vectorized reductions
+# instead of the per-particle loops in the scripts.
+# The Bunch class does not expose its memory, so the arrays
+# are COPIES, not views: they are filled by the per-particle
+# bunch getters and written back by the setters. The loops
+# over particles are driven by the C-level iterators
+# (np.fromiter and map over itertools), so there is no
+# Python bytecode per particle, but the cost is still one
+# Python->C call per particle and per column.
+# Use putBack() after the modifications to write the arrays
+# into the bunch.
+#--------------------------------------------------------
+
+import math
+import sys
+from itertools import imap, repeat
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+
+COORD_NAMES = ("x","xp","y","yp","z","dE")
+
+def getCoordinate(bunch, coord_name):
+	"""
+	Returns the NumPy array (a copy) of one coordinate of the local particles.
+	The coord_name is one of "x","xp","y","yp","z","dE".
+	"""
+	n_parts = bunch.getSize()
+	return np.fromiter(imap(getattr(bunch,coord_name),xrange(n_parts)),dtype = np.float64,count = n_parts)
+
+def setCoordinate(bunch, coord_name, arr):
+	"""
+	Writes the array of one coordinate back into the bunch.
+	"""
+	n_parts = bunch.getSize()
+	if(arr.shape != (n_parts,)):
+		orbit_mpi.finalize("bunch_columns.setCoordinate: wrong shape="+str(arr.shape)+" nParts="+str(n_parts))
+	map(getattr(bunch,coord_name),xrange(n_parts),arr.tolist())
+
+def getCoordinates(bunch):
+	"""
+	Returns the (nParts,6) NumPy array (a copy) with x,xp,y,yp,z,dE of the local particles.
+	"""
+	n_parts = bunch.getSize()
+	coords = np.empty((n_parts,6),dtype = np.float64)
+	for ind in range(len(COORD_NAMES)):
+		coords[:,ind] = getCoordinate(bunch,COORD_NAMES[ind])
+	return coords
+
+def setCoordinates(bunch, coords):
+	"""
+	Writes the (nParts,6) array back into the bunch. The sizes should be equal.
+	"""
+	n_parts = bunch.getSize()
+	if(coords.shape != (n_parts,6)):
+		orbit_mpi.finalize("bunch_columns.setCoordinates: wrong shape="+str(coords.shape)+" nParts="+str(n_parts))
+	for ind in range(len(COORD_NAMES)):
+		setCoordinate(bunch,COORD_NAMES[ind],coords[:,ind])
+
+def getPartAttr(bunch, attr_name):
+	"""
+	Returns the (nParts,attr_size) NumPy array (a copy) with the particle attribute values.
+	"""
+	if(not bunch.hasPartAttr(attr_name)):
+		orbit_mpi.finalize("bunch_columns.getPartAttr: there is no particle attr. ="+attr_name)
+	n_parts = bunch.getSize()
+	attr_size = bunch.getPartAttrSize(attr_name)
+	arr = np.empty((n_parts,attr_size),dtype = np.float64)
+	for j in xrange(attr_size):
+		arr[:,j] = np.fromiter(imap(bunch.partAttrValue,repeat(attr_name,n_parts),xrange(n_parts),repeat(j,n_parts)),dtype = np.float64,count = n_parts)
+	return arr
+
+def setPartAttr(bunch, attr_name, arr):
+	"""
+	Writes the (nParts,attr_size) array back into the particle attribute.
+	"""
+	n_parts = bunch.getSize()
+	attr_size = bunch.getPartAttrSize(attr_name)
+	if(arr.shape != (n_parts,attr_size)):
+		orbit_mpi.finalize("bunch_columns.setPartAttr: wrong shape="+str(arr.shape)+" attr="+attr_name)
+	for j in xrange(attr_size):
+		map(bunch.partAttrValue,repeat(attr_name,n_parts),xrange(n_parts),repeat(j,n_parts),arr[:,j].tolist())
+
+class BunchColumns:
+	"""
+	The NumPy columns of the bunch. The coordinates are the views
+	self.x, self.xp, ..., self.dE into one (nParts,6) array, and the
+	particle attributes are loaded on demand by attr(name).
+	The arrays are copies of the bunch data, see putBack().
+	"""
+	def __init__(self, bunch):
+		self.bunch = bunch
+		self.coords = getCoordinates(bunch)
+		for ind in range(len(COORD_NAMES)):
+			setattr(self,COORD_NAMES[ind],self.coords[:,ind])
+		self.attrs = {}
+
+	def size(self):
+		"""
+		Returns the number of local particles.
+		"""
+		return self.coords.shape[0]
+
+	def attr(self, attr_name):
+		"""
+		Returns the (nParts,attr_size) array of the particle attribute.
+		"""
+		if(not self.attrs.has_key(attr_name)):
+			self.attrs[attr_name] = getPartAttr(self.bunch,attr_name)
+		return self.attrs[attr_name]
+
+	def putBack(self):
+		"""
+		Writes the coordinates and the loaded attributes back into the bunch.
+		"""
+		setCoordinates(self.bunch,self.coords)
+		for attr_name in self.attrs.keys():
+			setPartAttr(self.bunch,attr_name,self.attrs[attr_name])
+
+	def getMoments(self):
+		"""
+		Returns the global (avg, rms) arrays for 6 coordinates over all CPUs.
+		"""
+		comm = self.bunch.getMPIComm()
+		sums = [float(self.size()),] + list(self.coords.sum(axis = 0)) + list((self.coords**2).sum(axis = 0))
+		sums = orbit_mpi.MPI_Allreduce(tuple(sums),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,comm)
+		n_total = sums[0]
+		if(n_total == 0.):
+			return (np.zeros(6),np.zeros(6))
+		avg = np.array(sums[1:7])/n_total
+		rms = np.sqrt(np.maximum(np.array(sums[7:13])/n_total - avg**2,0.))
+		return (avg,rms)
+
+def addParticles(bunch, coords, attrs = None):
+	"""
+	Adds the (nParts,6) array of particles to the bunch and compresses
+	the bunch once at the end. The attrs is the optional dictionary
+	{attr_name:(nParts,attr_size) array} of the particle attributes
+	for the new particles. The attributes are created if necessary.
+	This is not a bulk memory copy: the Bunch class has no capacity
+	preallocation from Python, so each particle is still added by one
+	addParticle call (and one partAttrValue call per attribute value),
+	but the calls are driven by map without Python loops.
+	"""
+	n_parts = coords.shape[0]
+	if(len(coords.shape) != 2 or coords.shape[1] != 6):
+		orbit_mpi.finalize("bunch_columns.addParticles: wrong shape="+str(coords.shape))
+	if(attrs == None): attrs = {}
+	for attr_name in attrs.keys():
+		arr = attrs[attr_name]
+		if(arr.shape[0] != n_parts):
+			orbit_mpi.finalize("bunch_columns.addParticles: wrong attr. shape="+str(arr.shape)+" attr="+attr_name)
+		if(not bunch.hasPartAttr(attr_name)):
+			if(arr.shape[1] > 1):
+				bunch.addPartAttr(attr_name,{"size":arr.shape[1]})
+			else:
+				bunch.addPartAttr(attr_name)
+	bunch.compress()
+	ind_start = bunch.getSize()
+	columns = [coords[:,ind].tolist() for ind in range(6)]
+	map(bunch.addParticle,*columns)
+	bunch.compress()
+	for attr_name in attrs.keys():
+		arr = attrs[attr_name]
+		for j in xrange(arr.shape[1]):
+			map(bunch.partAttrValue,repeat(attr_name,n_parts),xrange(ind_start,ind_start+n_parts),repeat(j,n_parts),arr[:,j].tolist())
@@ -0,0 +1,63 @@
+import sys
+import math
+import random
+import time
+
+from bunch import Bunch
+from orbit.bunch_utils import ParticleIdNumber
+
+from bunch_columns import BunchColumns, getCoordinate
+
+#-----------------------------------------------------
+#Test of the NumPy column access to the bunch
+#-----------------------------------------------------
+
+print "Start."
+
+b = Bunch()
+
+nParts = 100000
+for i in xrange(nParts):
+	b.addParticle(random.gauss(0.,0.001),random.gauss(0.,0.0001),random.gauss(0.,0.002),random.gauss(0.,0.0002),random.gauss(0.,0.1),random.gauss(0.,0.001))
+b.compress()
+
+ParticleIdNumber.addParticleIdNumbers(b)
+
+#---- loop over particles as it is done in the scripts: x only and all 6 coordinates
+time_start = time.time()
+x_avg = 0.
+for i in xrange(b.getSize()):
+	x_avg += b.x(i)
+x_avg /= b.getSize()
+print "loop      x only      x_avg =",x_avg," time [sec] =",(time.time() - time_start)
+
+time_start = time.time()
+sums = [0.]*6
+for i in xrange(b.getSize()):
+	vals = (b.x(i),b.xp(i),b.y(i),b.yp(i),b.z(i),b.dE(i))
+	for j in range(6):
+		sums[j] += vals[j]
+print "loop      6 coords    x_avg =",sums[0]/b.getSize()," time [sec] =",(time.time() - time_start)
+
+#---- the same with columns (copies of the bunch data)
+time_start = time.time()
+x_avg = getCoordinate(b,"x").mean()
+print "column    x only      x_avg =",x_avg," time [sec] =",(time.time() - time_start)
+
+time_start = time.time()
+columns = BunchColumns(b)
+(avg,rms) = columns.getMoments()
+print "columns   6 coords    x_avg =",avg[0]," time [sec] =",(time.time() - time_start)
+print "avg =",avg
+print "rms =",rms
+
+ids = columns.attr("ParticleIdNumber")
+print "ids min max =",ids.min(),ids.max()
+
+#---- shift the bunch and write it back
+columns.x += 0.001
+columns.dE *= 2.0
+columns.putBack()
+print "x(0) =",b.x(0)," column x[0] =",columns.x[0]
+
+print "Stop."
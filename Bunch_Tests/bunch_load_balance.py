@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The load balancing of the bunch particles between CPUs.
+# After the losses on foils, collimators, and apertures, and
+# after the injection on rank 0, the CPUs have different
+# numbers of particles, and the slowest CPU gates every
+# collective operation. The rebalanceBunch(...) function
+# moves the particles to make the counts proportional to
+# the CPU weights (equal by default). The particles keep
+# their global order: the target ranges are the prefix sums
+# of the target counts.
+# The LoadBalancer checks the imbalance = max/mean of the
+# weighted counts and rebalances the bunch if it exceeds
+# the threshold. It keeps the history of the metrics.
+#--------------------------------------------------------
+
+import math
+import sys
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+
+from bunch_mpi_exchange import getAllColumns, putAllColumns, exchangeColumns
+
+def getRankCounts(bunch):
+	"""
+	Returns the list of the particle counts on all CPUs.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	bunch.compress()
+	counts = [0]*size
+	counts[rank] = bunch.getSize()
+	return list(orbit_mpi.MPI_Allreduce(tuple(counts),mpi_datatype.MPI_INT,mpi_op.MPI_SUM,comm))
+
+def getImbalance(counts, weights = None):
+	"""
+	Returns the max/mean ratio of the counts divided by the CPU weights.
+	"""
+	counts = np.array(counts,dtype = np.float64)
+	if(weights == None): weights = np.ones(counts.shape[0])
+	weights = np.array(weights,dtype = np.float64)
+	loads = counts/weights
+	mean_load = counts.sum()/weights.sum()
+	if(mean_load == 0.): return 1.0
+	return loads.max()/mean_load
+
+def getTargetCounts(n_total, weights):
+	"""
+	Returns the particle counts proportional to the weights with the sum n_total.
+	"""
+	weights = np.array(weights,dtype = np.float64)
+	bounds = np.floor(np.cumsum(weights)/weights.sum()*n_total + 0.5).astype(np.int64)
+	bounds[-1] = n_total
+	return list(np.diff(np.concatenate(([0,],bounds))))
+
+def rebalanceBunch(bunch, weights = None):
+	"""
+	Redistributes the particles between CPUs according to the CPU weights
+	(the relative speeds). It is collective. Returns the new counts.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	counts = getRankCounts(bunch)
+	if(weights == None): weights = [1.0]*size
+	n_total = sum(counts)
+	targets = getTargetCounts(n_total,weights)
+	if(size == 1 or counts == targets): return counts
+	#---- global indexes of the local particles and their target ranks
+	ind_start = sum(counts[:rank])
+	global_inds = np.arange(ind_start,ind_start + counts[rank])
+	target_bounds = np.cumsum(targets)
+	dest_ranks = np.searchsorted(target_bounds,global_inds,side = "right")
+	(columns,attr_layout) = getAllColumns(bunch)
+	columns = exchangeColumns(comm,columns,dest_ranks)
+	putAllColumns(bunch,columns,attr_layout)
+	return targets
+
+class LoadBalancer:
+	"""
+	Rebalances the bunch when the imbalance exceeds the threshold.
+	"""
+	def __init__(self, threshold = 1.2, weights = None):
+		self.threshold = threshold
+		self.weights = weights
+		self.history = []
+
+	def setWeights(self, weights):
+		"""
+		Sets the relative CPU speeds. None means the equal speeds.
+		"""
+		self.weights = weights
+
+	def getHistory(self):
+		"""
+		Returns the list of (label, imbalance before, imbalance after, min count, max count).
+		"""
+		return self.history
+
+	def check(self, bunch, label = ""):
+		"""
+		Checks the imbalance and rebalances the bunch if it is necessary.
+		Returns True if the bunch was rebalanced. It is collective.
+		"""
+		counts = getRankCounts(bunch)
+		imbalance = getImbalance(counts,self.weights)
+		imbalance_after = imbalance
+		rebalanced = False
+		if(imbalance > self.threshold):
+			counts = rebalanceBunch(bunch,self.weights)
+			imbalance_after = getImbalance(counts,self.weights)
+			rebalanced = True
+		self.history.append((label,imbalance,imbalance_after,min(counts),max(counts)))
+		return rebalanced
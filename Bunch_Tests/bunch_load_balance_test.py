@@ -0,0 +1,52 @@
+import sys
+import math
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch
+from orbit.bunch_utils import ParticleIdNumber
+
+from bunch_load_balance import LoadBalancer, getRankCounts
+
+#-----------------------------------------------------
+#Load balancing of the bunch between CPUs
+#Run it with several CPUs:
+#./START.sh bunch_load_balance_test.py 4
+#-----------------------------------------------------
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+size = orbit_mpi.MPI_Comm_size(comm)
+
+b = Bunch()
+
+#---- all particles on rank 0 as after the injection
+if(rank == 0):
+	for i in xrange(10000):
+		b.addParticle(0.001*i,0.,0.,0.,0.,0.)
+b.compress()
+ParticleIdNumber.addParticleIdNumbers(b)
+
+#---- only rank 0 has the "macrosize" attribute, the empty CPUs do not
+if(rank == 0):
+	b.addPartAttr("macrosize")
+	for i in xrange(b.getSize()):
+		b.partAttrValue("macrosize",i,0,1.0e+10)
+
+balancer = LoadBalancer(threshold = 1.1)
+if(rank == 0): print "counts before =",getRankCounts(b)
+balancer.check(b,"injection")
+if(rank == 0): print "counts after  =",getRankCounts(b)
+print "rank=",rank," has macrosize =",b.hasPartAttr("macrosize")," macrosize[0] =",(b.getSize() > 0 and b.partAttrValue("macrosize",0,0))
+
+#---- rank 0 is twice slower than others
+weights = [1.0]*size
+weights[0] = 0.5
+balancer.setWeights(weights)
+balancer.check(b,"weighted")
+if(rank == 0): print "weighted counts =",getRankCounts(b)
+
+if(rank == 0):
+	for (label,imb_before,imb_after,n_min,n_max) in balancer.getHistory():
+		print "%12s imbalance before = %6.3f after = %6.3f  min = %6d max = %6d"%(label,imb_before,imb_after,n_min,n_max)
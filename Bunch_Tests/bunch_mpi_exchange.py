@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The exchange of the bunch particles between CPUs.
+# The particles (coordinates and all particle attributes)
+# are packed into one (n_cols,nParts) NumPy array, each
+# particle gets the destination rank, and the particles
+# are sent by the pairwise exchanges.
+# The columns layout (the attributes names and sizes) is
+# agreed between CPUs first: the layout of the CPU with the
+# most columns is broadcast, and the CPUs without some of
+# the attributes (e.g. the empty ones) fill them by zeros.
+# The pairs of CPUs exchange in size-1 rounds (size for the
+# odd number of CPUs) of the round-robin schedule, so the
+# latency is O(size). In each pair the lower rank sends
+# first, so the blocking MPI_Send/MPI_Recv do not deadlock.
+# The data are sent as one message of the raw bytes (base64
+# encoded, the MPI_CHAR messages of orbit_mpi are C strings).
+# The allgatherColumns uses the same rounds to give all CPUs
+# the columns of all CPUs.
+#--------------------------------------------------------
+
+import math
+import sys
+import base64
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+
+from bunch_columns import getCoordinates, getPartAttr, addParticles
+
+def bcastString(text, root, comm):
+	"""
+	Returns the string from the root CPU on all CPUs. It is collective.
+	"""
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	n_chars = orbit_mpi.MPI_Bcast(len(text),mpi_datatype.MPI_INT,root,comm)
+	if(n_chars == 0): return ""
+	codes = (0,)*n_chars
+	if(rank == root): codes = tuple([ord(ch) for ch in text])
+	codes = orbit_mpi.MPI_Bcast(codes,mpi_datatype.MPI_INT,root,comm)
+	if(not isinstance(codes,tuple)): codes = (codes,)
+	return "".join([chr(code) for code in codes])
+
+def getCommonAttrLayout(bunch):
+	"""
+	Returns the list of (attr_name, attr_size) of the particle attributes
+	common for all CPUs. It is collective. The layout of the CPU with the
+	most attribute columns is used, and all local attributes should be in it.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	attr_layout = []
+	for attr_name in sorted(bunch.getPartAttrNames()):
+		attr_layout.append((attr_name,bunch.getPartAttrSize(attr_name)))
+	n_cols = sum([attr_size for (attr_name,attr_size) in attr_layout])
+	key = orbit_mpi.MPI_Allreduce(n_cols*size + rank,mpi_datatype.MPI_INT,mpi_op.MPI_MAX,comm)
+	text = " ".join([attr_name+":"+str(attr_size) for (attr_name,attr_size) in attr_layout])
+	text = bcastString(text,key % size,comm)
+	common_layout = []
+	for item in text.split():
+		(attr_name,attr_size) = item.rsplit(":",1)
+		common_layout.append((attr_name,int(attr_size)))
+	for item in attr_layout:
+		if(item not in common_layout):
+			orbit_mpi.finalize("bunch_mpi_exchange: particle attr. "+str(item)+" is not on all CPUs!")
+	return common_layout
+
+def getAllColumns(bunch):
+	"""
+	Returns the (n_cols,nParts) array with the coordinates and particle
+	attributes and the list of (attr_name, attr_size) of the attributes.
+	It is collective. The layout is the same on all CPUs, the attributes
+	that the local bunch does not have are zeros.
+	"""
+	bunch.compress()
+	attr_layout = getCommonAttrLayout(bunch)
+	arrs = [getCoordinates(bunch).T,]
+	for (attr_name,attr_size) in attr_layout:
+		if(bunch.hasPartAttr(attr_name)):
+			arrs.append(getPartAttr(bunch,attr_name).T)
+		else:
+			arrs.append(np.zeros((attr_size,bunch.getSize()),dtype = np.float64))
+	return (np.vstack(arrs),attr_layout)
+
+def getColumnIndex(attr_layout, attr_name):
+	"""
+	Returns the row index of the first column of the attribute.
+	"""
+	ind = 6
+	for (name,attr_size) in attr_layout:
+		if(name == attr_name): return ind
+		ind += attr_size
+	return -1
+
+def putAllColumns(bunch, columns, attr_layout):
+	"""
+	Replaces all particles of the bunch with the particles from the columns array.
+	"""
+	bunch.deleteAllParticles()
+	attrs = {}
+	ind = 6
+	for (attr_name,attr_size) in attr_layout:
+		attrs[attr_name] = columns[ind:ind+attr_size].T
+		ind += attr_size
+	addParticles(bunch,np.ascontiguousarray(columns[0:6].T),attrs)
+
+def getExchangePartners(rank, size):
+	"""
+	Returns the list of the partner ranks of the rank in the rounds of the
+	round-robin schedule (the circle method). The partner is -1 in the round
+	where the rank is idle (the odd number of CPUs).
+	"""
+	n = size + (size % 2)
+	partners = []
+	for step in range(n - 1):
+		if(rank == n - 1):
+			partner = (step*(n/2)) % (n - 1)
+		else:
+			partner = (step - rank) % (n - 1)
+			if(partner == rank): partner = n - 1
+		if(partner >= size): partner = -1
+		partners.append(partner)
+	return partners
+
+def _sendColumns(arr, rank_to, tag, comm):
+	orbit_mpi.MPI_Send(arr.shape[1],mpi_datatype.MPI_INT,rank_to,tag,comm)
+	if(arr.shape[1] > 0):
+		data = base64.b64encode(np.ascontiguousarray(arr,dtype = "<f8").tostring())
+		orbit_mpi.MPI_Send(data,mpi_datatype.MPI_CHAR,rank_to,tag,comm)
+
+def _recvColumns(n_cols, rank_from, tag, comm):
+	n_recv = orbit_mpi.MPI_Recv(mpi_datatype.MPI_INT,rank_from,tag,comm)
+	if(n_recv == 0): return np.zeros((n_cols,0),dtype = np.float64)
+	data = base64.b64decode(orbit_mpi.MPI_Recv(mpi_datatype.MPI_CHAR,rank_from,tag,comm))
+	return np.frombuffer(data,dtype = "<f8").reshape((n_cols,n_recv))
+
+def exchangeColumns(comm, columns, dest_ranks):
+	"""
+	Sends the particles (columns of the array) to the destination ranks
+	and returns the array with the particles received from all CPUs
+	(including itself) in the rank order. The columns layout should be
+	the same on all CPUs (see getAllColumns).
+	"""
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	n_cols = columns.shape[0]
+	parts = [None]*size
+	parts[rank] = columns[:,dest_ranks == rank]
+	tag = 5432
+	for partner in getExchangePartners(rank,size):
+		if(partner < 0): continue
+		arr = columns[:,dest_ranks == partner]
+		if(rank < partner):
+			_sendColumns(arr,partner,tag,comm)
+			parts[partner] = _recvColumns(n_cols,partner,tag,comm)
+		else:
+			parts[partner] = _recvColumns(n_cols,partner,tag,comm)
+			_sendColumns(arr,partner,tag,comm)
+	return np.hstack(parts)
+
+def allgatherColumns(comm, columns):
+	"""
+	Returns the array with the columns of all CPUs in the rank order. Each
+	CPU sends its whole array to all others in the rounds of the round-robin
+	schedule. The number of rows should be the same on all CPUs.
+	"""
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	n_cols = columns.shape[0]
+	parts = [None]*size
+	parts[rank] = columns
+	tag = 5433
+	for partner in getExchangePartners(rank,size):
+		if(partner < 0): continue
+		if(rank < partner):
+			_sendColumns(columns,partner,tag,comm)
+			parts[partner] = _recvColumns(n_cols,partner,tag,comm)
+		else:
+			parts[partner] = _recvColumns(n_cols,partner,tag,comm)
+			_sendColumns(columns,partner,tag,comm)
+	return np.hstack(parts)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The thread pool for the per-particle kernels inside one
+# CPU. The bunch columns (see bunch_columns.py) are split
+# into contiguous chunks, and each thread applies the
+# kernel to its chunk in place. The NumPy operations on
+# large arrays release the GIL, so the chunks are processed
+# in parallel. One MPI rank per socket with the threads
+# keeps one copy of the lattice and the space charge
+# solvers per socket instead of one copy per core.
+# The number of threads is defined by the ORBIT_NUM_THREADS
+# environment variable (default 1 - no threads).
+#--------------------------------------------------------
+
+import os
+import sys
+
+import numpy as np
+
+from multiprocessing.pool import ThreadPool
+
+#---- the chunks smaller than this are not worth a thread
+MIN_CHUNK_SIZE = 4096
+
+def getDefaultNumberOfThreads():
+	"""
+	Returns the number of threads from the ORBIT_NUM_THREADS environment variable.
+	"""
+	return max(1,int(os.environ.get("ORBIT_NUM_THREADS","1")))
+
+class KernelThreadPool:
+	"""
+	Applies the kernels to the chunks of the particle arrays in parallel.
+	"""
+	def __init__(self, n_threads = None):
+		if(n_threads == None): n_threads = getDefaultNumberOfThreads()
+		self.n_threads = n_threads
+		self.pool = None
+		if(n_threads > 1):
+			self.pool = ThreadPool(n_threads)
+
+	def getNumberOfThreads(self):
+		return self.n_threads
+
+	def getChunks(self, n_parts):
+		"""
+		Returns the list of (ind_start, ind_stop) chunks for n_parts particles.
+		"""
+		n_chunks = min(self.n_threads,max(1,n_parts/MIN_CHUNK_SIZE))
+		bounds = [(n_parts*i)/n_chunks for i in range(n_chunks+1)]
+		return [(bounds[i],bounds[i+1]) for i in range(n_chunks)]
+
+	def run(self, kernel, arrays, *args):
+		"""
+		Calls kernel(chunk_arrays, *args) for every chunk. The chunk_arrays are
+		the slices (views) of the arrays, so the kernel modifies them in place.
+		"""
+		n_parts = arrays[0].shape[0]
+		chunks = self.getChunks(n_parts)
+		if(self.pool == None or len(chunks) == 1):
+			kernel(arrays,*args)
+			return
+		tasks = [[arr[ind_start:ind_stop] for arr in arrays] for (ind_start,ind_stop) in chunks]
+		self.pool.map(lambda chunk_arrays: kernel(chunk_arrays,*args),tasks)
+
+	def reduce(self, kernel, arrays, *args):
+		"""
+		Calls kernel(chunk_arrays, *args) for every chunk and returns the sum
+		of the results (e.g. the partial grids of the binning).
+		"""
+		n_parts = arrays[0].shape[0]
+		chunks = self.getChunks(n_parts)
+		if(self.pool == None or len(chunks) == 1):
+			return kernel(arrays,*args)
+		tasks = [[arr[ind_start:ind_stop] for arr in arrays] for (ind_start,ind_stop) in chunks]
+		results = self.pool.map(lambda chunk_arrays: kernel(chunk_arrays,*args),tasks)
+		res = results[0]
+		for part in results[1:]:
+			res = res + part
+		return res
+
+	def close(self):
+		if(self.pool != None):
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
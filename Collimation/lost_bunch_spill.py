@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The lost bunch with the bounded memory. The particles
+# of the lost bunch are appended to the binary file when
+# their number exceeds the buffer size, and the lost bunch
+# is emptied. Each CPU writes its own file <name>.<rank>
+# (the rank in the lost bunch communicator).
+# Each record has the coordinates, the loss position from
+# the "LostParticleAttributes" attribute, the macro-size,
+# the index of the loss node, and the turn number of the
+# loss. The turn is stamped on the particles that appeared
+# in the lost bunch since the previous call, so the
+# checkAndSpill(lostbunch,turn) should be called every turn.
+# The loss node is the last node from the user's list
+# with the start position <= the loss position. The names
+# of the nodes are in the <name>.names text file.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+import glob
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_columns import getCoordinates, getPartAttr
+
+SPILL_RECORD_DTYPE = np.dtype([("x","<f8"),("xp","<f8"),("y","<f8"),("yp","<f8"),("z","<f8"),("dE","<f8"),("position","<f8"),("macrosize","<f8"),("node_index","<i8"),("turn","<i8")])
+
+class LostBunchSpiller:
+	"""
+	Spills the lost bunch particles into the binary file.
+	The loss_nodes is the list of (name, start position) sorted by the position.
+	"""
+	def __init__(self, fileName, lostbunch, loss_nodes = [], buffer_size = 100000):
+		self.fileName = fileName
+		self.buffer_size = buffer_size
+		self.loss_node_names = []
+		self.loss_node_positions = np.zeros(len(loss_nodes),dtype = np.float64)
+		for ind in range(len(loss_nodes)):
+			(name,pos) = loss_nodes[ind]
+			self.loss_node_names.append(name)
+			self.loss_node_positions[ind] = pos
+		self.n_spilled = 0
+		self.turns = np.zeros(0,dtype = np.int64)
+		rank = orbit_mpi.MPI_Comm_rank(lostbunch.getMPIComm())
+		self.rank_file_name = fileName + "." + str(rank)
+		fl = open(self.rank_file_name,"wb")
+		fl.close()
+		if(rank == 0):
+			fl = open(fileName + ".names","w")
+			for name in self.loss_node_names:
+				fl.write(name+"\n")
+			fl.close()
+
+	def getNumberOfSpilled(self):
+		"""
+		Returns the number of particles spilled to the file by this CPU.
+		"""
+		return self.n_spilled
+
+	def stampTurn(self, lostbunch, turn):
+		"""
+		Assigns the turn number to the particles added to the lost bunch
+		after the previous call.
+		"""
+		n_parts = lostbunch.getSize()
+		n_stamped = self.turns.shape[0]
+		if(n_parts > n_stamped):
+			self.turns = np.concatenate((self.turns,np.zeros(n_parts - n_stamped,dtype = np.int64) + turn))
+
+	def checkAndSpill(self, lostbunch, turn = -1):
+		"""
+		Stamps the turn number on the new lost particles and spills
+		the lost bunch if its size exceeds the buffer size.
+		"""
+		self.stampTurn(lostbunch,turn)
+		if(lostbunch.getSize() > self.buffer_size):
+			self.spill(lostbunch,turn)
+
+	def spill(self, lostbunch, turn = -1):
+		"""
+		Appends the lost bunch particles to the file and deletes them from the lost bunch.
+		The particles without the turn stamp get the turn number.
+		"""
+		self.stampTurn(lostbunch,turn)
+		lostbunch.compress()
+		n_parts = lostbunch.getSize()
+		if(n_parts == 0): return
+		records = np.zeros(n_parts,dtype = SPILL_RECORD_DTYPE)
+		coords = getCoordinates(lostbunch)
+		for ind in range(6):
+			records[SPILL_RECORD_DTYPE.names[ind]] = coords[:,ind]
+		if(lostbunch.hasPartAttr("LostParticleAttributes")):
+			records["position"] = getPartAttr(lostbunch,"LostParticleAttributes")[:,0]
+		if(lostbunch.hasPartAttr("macrosize")):
+			records["macrosize"] = getPartAttr(lostbunch,"macrosize")[:,0]
+		else:
+			records["macrosize"] = lostbunch.macroSize()
+		records["node_index"] = -1
+		records["turn"] = self.turns[:n_parts]
+		if(self.loss_node_positions.shape[0] > 0):
+			records["node_index"] = np.searchsorted(self.loss_node_positions,records["position"],side = "right") - 1
+		fl = open(self.rank_file_name,"ab")
+		records.tofile(fl)
+		fl.close()
+		self.n_spilled += n_parts
+		lostbunch.deleteAllParticles()
+		self.turns = np.zeros(0,dtype = np.int64)
+
+def readSpilledLosses(fileName):
+	"""
+	Returns the NumPy record array with all spilled particles from all
+	CPUs' files and the list of the loss node names.
+	"""
+	arrs = []
+	for rank_file_name in sorted(glob.glob(fileName + ".[0-9]*")):
+		if(os.path.getsize(rank_file_name) > 0):
+			arrs.append(np.fromfile(rank_file_name,dtype = SPILL_RECORD_DTYPE))
+	names = []
+	if(os.path.exists(fileName + ".names")):
+		fl = open(fileName + ".names","r")
+		names = [line.strip() for line in fl.readlines() if len(line.strip()) > 0]
+		fl.close()
+	if(len(arrs) == 0):
+		return (np.zeros(0,dtype = SPILL_RECORD_DTYPE),names)
+	return (np.concatenate(arrs),names)
+
+def getLossesPerNode(fileName):
+	"""
+	Returns the list of [node name, number of particles, total macro-size]
+	for the loss nodes from the spilled files.
+	"""
+	(records,names) = readSpilledLosses(fileName)
+	n_nodes = len(names)
+	inds = records["node_index"]
+	mask = (inds >= 0) & (inds < n_nodes)
+	counts = np.bincount(inds[mask],minlength = n_nodes)
+	m_sizes = np.bincount(inds[mask],weights = records["macrosize"][mask],minlength = n_nodes)
+	res_arr = []
+	for ind in range(n_nodes):
+		res_arr.append([names[ind],int(counts[ind]),m_sizes[ind]])
+	return res_arr
+
+def GetLostDistributionArrFromSpill(aprtNodes, fileName):
+	"""
+	The same as GetLostDistributionArr(aprtNodes,lostbunch) from
+	orbit.py_linac.lattice_modifications, but for the spilled file.
+	Returns the list of [aprtNode, loss] where the loss is the sum of the
+	macro-sizes of the particles lost at the aperture node position.
+	The losses outside the range of the aperture nodes positions are
+	skipped as in GetLostDistributionArr.
+	"""
+	(records,names) = readSpilledLosses(fileName)
+	positions = np.array([node.getPosition() for node in aprtNodes],dtype = np.float64)
+	res_arr = []
+	for node in aprtNodes:
+		res_arr.append([node,0.])
+	if(len(aprtNodes) == 0 or records.shape[0] == 0):
+		return res_arr
+	order = np.argsort(positions)
+	positions_sorted = positions[order]
+	in_range = (records["position"] >= positions_sorted[0]) & (records["position"] <= positions_sorted[-1])
+	loss_positions = records["position"][in_range]
+	#---- the closest aperture node for each loss position
+	inds = np.searchsorted(positions_sorted,loss_positions)
+	inds_low = np.clip(inds - 1,0,len(aprtNodes)-1)
+	inds_high = np.clip(inds,0,len(aprtNodes)-1)
+	dist_low = np.fabs(positions_sorted[inds_low] - loss_positions)
+	dist_high = np.fabs(positions_sorted[inds_high] - loss_positions)
+	inds = np.where(dist_low <= dist_high,inds_low,inds_high)
+	losses = np.bincount(order[inds],weights = records["macrosize"][in_range],minlength = len(aprtNodes))
+	for ind in range(len(aprtNodes)):
+		res_arr[ind][1] = losses[ind]
+	return res_arr
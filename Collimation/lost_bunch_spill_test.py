@@ -0,0 +1,82 @@
+##############################################################
+# This script tracks a bunch through the lattice with the
+# collimator and spills the lost bunch to the binary file
+# every turn when it is larger than the buffer size.
+# The losses at the aperture nodes from the spilled file are
+# compared with the native GetLostDistributionArr for the
+# lost bunch with all lost particles.
+##############################################################
+
+import math
+import sys
+import os
+import glob
+
+from orbit.teapot import teapot
+from orbit.teapot import TEAPOT_Lattice
+from bunch import Bunch
+from orbit.utils.orbit_mpi_utils import bunch_orbit_to_pyorbit
+
+from orbit.collimation import TeapotCollimatorNode
+from orbit.collimation import addTeapotCollimatorNode
+
+from orbit.py_linac.lattice import LinacApertureNode
+from orbit.py_linac.lattice_modifications import GetLostDistributionArr
+
+from lost_bunch_spill import LostBunchSpiller, getLossesPerNode, readSpilledLosses
+from lost_bunch_spill import GetLostDistributionArrFromSpill
+
+print "Start."
+
+teapot_latt = teapot.TEAPOT_Lattice()
+print "Read MAD."
+teapot_latt.readMAD("./MAD_Lattice/LATTICE","RING")
+
+collimator = TeapotCollimatorNode(0.5, 9, 1.0, 1, 0.01, 0., 0., 0., 0., "Collimator 1")
+addTeapotCollimatorNode(teapot_latt, 18.5,collimator)
+
+#---- the loss nodes are all top level nodes of the lattice
+loss_nodes = []
+node_pos_dict = teapot_latt.getNodePositionsDict()
+for node in teapot_latt.getNodes():
+	loss_nodes.append((node.getName(),node_pos_dict[node][0]))
+
+b = Bunch()
+b.mass(0.93827231)
+b.macroSize(1.0e+1)
+energy = 1.0 #Gev
+bunch_orbit_to_pyorbit(teapot_latt.getLength(), energy, "ORBIT_Benchmarks/Bm_KV_Uniform_10000",b)
+b.getSyncParticle().kinEnergy(energy)
+
+paramsDict = {}
+lostbunch = Bunch()
+lostbunch.addPartAttr("LostParticleAttributes") 
+lostbunch.macroSize(b.macroSize())
+paramsDict["lostbunch"]=lostbunch
+paramsDict["bunch"]= b
+
+spiller = LostBunchSpiller("lost_spill.bin",lostbunch,loss_nodes,buffer_size = 100)
+
+n_lost_per_turn = []
+for turn in range(10):
+	n_lost_before = spiller.getNumberOfSpilled() + lostbunch.getSize()
+	teapot_latt.trackBunch(b, paramsDict)
+	n_lost_per_turn.append(spiller.getNumberOfSpilled() + lostbunch.getSize() - n_lost_before)
+	spiller.checkAndSpill(lostbunch,turn)
+spiller.spill(lostbunch)
+
+#---- the turn numbers of the records should be the turns of the losses
+(records,names) = readSpilledLosses("lost_spill.bin")
+for turn in range(10):
+	n_records = int((records["turn"] == turn).sum())
+	print "turn=",turn," lost=",n_lost_per_turn[turn]," records=",n_records
+	if(n_records != n_lost_per_turn[turn]):
+		print "The turn numbers of the spilled records are wrong!"
+		sys.exit(1)
+
+print "particles =",b.getSize()," spilled lost particles =",spiller.getNumberOfSpilled()
+for [name,count,macrosize] in getLossesPerNode("lost_spill.bin"):
+	if(count > 0):
+		print "node= %30s "%name," lost particles= %6d "%count," macro-size= %12.5g "%macrosize
+
+print "Stop."
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The fused MPI reductions for the diagnostics.
+# The FusedReduction collects the local partial sums,
+# maxima, and minima from many sources under the keys and
+# reduces all of them with at most two MPI_Allreduce calls
+# (MPI_SUM for the sums, MPI_MAX for the maxima and the
+# negated minima).
+# The DeferredTwissCollector uses it to defer the
+# reductions of the Twiss and extrema diagnostics: at each
+# diagnostics point it only computes the local sums of the
+# bunch, and the flush() at the end of the turn (or of the
+# lattice) makes one fused reduction for all points instead
+# of the blocking MPI_Allreduce at every point.
+# If the caller already has the bunch columns (e.g. the
+# NumPy trackers of the BunchColumns), they are passed to
+# record(...) and the bunch is not read again.
+# The orbit_mpi module does not have MPI_Iallreduce, so the
+# reductions are deferred instead of overlapped.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_columns import getCoordinates
+
+class FusedReduction:
+	"""
+	Reduces the registered local values over all CPUs with at most
+	two collective calls.
+	"""
+	def __init__(self, comm = mpi_comm.MPI_COMM_WORLD):
+		self.comm = comm
+		self.clear()
+
+	def clear(self):
+		self.sum_keys = []
+		self.sum_values = []
+		self.max_keys = []
+		self.max_values = []
+		self.results = {}
+
+	def _add(self, keys, values_arr, key, values):
+		if(key in keys):
+			orbit_mpi.finalize("FusedReduction: the key is already registered! key="+str(key))
+		keys.append(key)
+		values_arr.append(np.atleast_1d(np.asarray(values,dtype = np.float64)).ravel())
+
+	def addSum(self, key, values):
+		self._add(self.sum_keys,self.sum_values,key,values)
+
+	def addMax(self, key, values):
+		self._add(self.max_keys,self.max_values,key,values)
+
+	def addMin(self, key, values):
+		self._add(self.max_keys,self.max_values,("min",key),-np.asarray(values,dtype = np.float64))
+
+	def _reduce(self, keys, values_arr, op):
+		if(len(keys) == 0): return
+		vector = np.concatenate(values_arr)
+		res = np.array(orbit_mpi.MPI_Allreduce(tuple(vector.tolist()),mpi_datatype.MPI_DOUBLE,op,self.comm))
+		ind_start = 0
+		for ind in range(len(keys)):
+			n_vals = values_arr[ind].shape[0]
+			key = keys[ind]
+			if(isinstance(key,tuple) and len(key) == 2 and key[0] == "min"):
+				self.results[key[1]] = -res[ind_start:ind_start+n_vals]
+			else:
+				self.results[key] = res[ind_start:ind_start+n_vals]
+			ind_start += n_vals
+
+	def reduce(self):
+		"""
+		Makes the collective reductions of all registered values. It is collective,
+		and all CPUs should register the same keys in the same order.
+		"""
+		self.results = {}
+		self._reduce(self.sum_keys,self.sum_values,mpi_op.MPI_SUM)
+		self._reduce(self.max_keys,self.max_values,mpi_op.MPI_MAX)
+		self.sum_keys = []
+		self.sum_values = []
+		self.max_keys = []
+		self.max_values = []
+
+	def get(self, key):
+		"""
+		Returns the reduced values array for the key.
+		"""
+		return self.results[key]
+
+def getLocalTwissSums(bunch, columns = None):
+	"""
+	Returns the arrays (sums,mins,maxs) of the local particles where the sums
+	are [n, sum of 6 coordinates, sum of u*u, u*up, up*up for 3 planes],
+	and mins, maxs are for x,y,z. The columns are the BunchColumns instance
+	already loaded by the caller or None, then only the coordinates of the
+	bunch are read.
+	"""
+	if(columns != None):
+		coords = columns.coords
+	else:
+		coords = getCoordinates(bunch)
+	sums = np.zeros(16,dtype = np.float64)
+	sums[0] = coords.shape[0]
+	mins = np.empty(3)
+	maxs = np.empty(3)
+	mins.fill(1.0e+36)
+	maxs.fill(-1.0e+36)
+	if(coords.shape[0] == 0): return (sums,mins,maxs)
+	sums[1:7] = coords.sum(axis = 0)
+	for ind in range(3):
+		u = coords[:,2*ind]
+		up = coords[:,2*ind+1]
+		sums[7+3*ind:10+3*ind] = ((u*u).sum(),(u*up).sum(),(up*up).sum())
+	mins[:] = coords[:,0:6:2].min(axis = 0)
+	maxs[:] = coords[:,0:6:2].max(axis = 0)
+	return (sums,mins,maxs)
+
+def getTwissFromSums(sums):
+	"""
+	Returns the list of (alpha,beta,gamma,emittance) for 3 planes like
+	BunchTwissAnalysis.getTwiss(ind) from the global sums.
+	"""
+	n_total = sums[0]
+	twiss_arr = []
+	for ind in range(3):
+		if(n_total == 0.):
+			twiss_arr.append((0.,0.,0.,0.))
+			continue
+		u_avg = sums[1+2*ind]/n_total
+		up_avg = sums[2+2*ind]/n_total
+		uu = sums[7+3*ind]/n_total - u_avg*u_avg
+		uup = sums[8+3*ind]/n_total - u_avg*up_avg
+		upup = sums[9+3*ind]/n_total - up_avg*up_avg
+		emitt2 = uu*upup - uup*uup
+		if(emitt2 <= 0.):
+			twiss_arr.append((0.,0.,0.,0.))
+			continue
+		emitt = math.sqrt(emitt2)
+		twiss_arr.append((-uup/emitt,uu/emitt,upup/emitt,emitt))
+	return twiss_arr
+
+class DeferredTwissCollector:
+	"""
+	Collects the local Twiss sums and extrema at the diagnostics points and
+	reduces all of them in one fused reduction by flush().
+	"""
+	def __init__(self, comm = mpi_comm.MPI_COMM_WORLD):
+		self.fused_reduction = FusedReduction(comm)
+		self.labels = []
+
+	def record(self, label, bunch, columns = None):
+		"""
+		Computes the local sums of the bunch for the diagnostics point.
+		The columns are the BunchColumns of the bunch loaded by the caller
+		or None. There is no communication.
+		"""
+		(sums,mins,maxs) = getLocalTwissSums(bunch,columns)
+		ind = len(self.labels)
+		self.fused_reduction.addSum((ind,"sums"),sums)
+		self.fused_reduction.addMin((ind,"mins"),mins)
+		self.fused_reduction.addMax((ind,"maxs"),maxs)
+		self.labels.append(label)
+
+	def getNumberOfRecords(self):
+		return len(self.labels)
+
+	def flush(self):
+		"""
+		Reduces the sums of all recorded points. It is collective. Returns the list of
+		[label, n_parts_global, twiss_arr, (xMin,xMax,yMin,yMax,zMin,zMax)]
+		where twiss_arr is the list of (alpha,beta,gamma,emittance) for x,y,z.
+		"""
+		self.fused_reduction.reduce()
+		res_arr = []
+		for ind in range(len(self.labels)):
+			sums = self.fused_reduction.get((ind,"sums"))
+			mins = self.fused_reduction.get((ind,"mins"))
+			maxs = self.fused_reduction.get((ind,"maxs"))
+			extrema = (mins[0],maxs[0],mins[1],maxs[1],mins[2],maxs[2])
+			res_arr.append([self.labels[ind],int(sums[0]),getTwissFromSums(sums),extrema])
+		self.fused_reduction.clear()
+		self.labels = []
+		return res_arr
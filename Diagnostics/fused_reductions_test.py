@@ -0,0 +1,64 @@
+#-----------------------------------------------------
+#Compares the deferred fused reductions of the Twiss and extrema
+#diagnostics with BunchTwissAnalysis and BunchExtremaCalculator
+#./START.sh fused_reductions_test.py 4
+#-----------------------------------------------------
+import sys
+import os
+import math
+import random
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch, BunchTwissAnalysis
+from orbit_utils import BunchExtremaCalculator
+from orbit.teapot import teapot
+
+from fused_reductions import DeferredTwissCollector
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_columns import BunchColumns
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+
+random.seed(100 + rank)
+
+b = Bunch()
+b.getSyncParticle().kinEnergy(1.0)
+for i in xrange(10000):
+	x = random.gauss(0.,0.001)
+	y = random.gauss(0.,0.002)
+	b.addParticle(x,random.gauss(0.,0.0001) - 0.0002*x,y,random.gauss(0.,0.0002),random.gauss(0.,0.1),random.gauss(0.,0.001))
+
+collector = DeferredTwissCollector(comm)
+twiss_analysis = BunchTwissAnalysis()
+extremaCalculator = BunchExtremaCalculator()
+
+#---- 10 diagnostics points with the drifts between them
+ref_arr = []
+for ind in range(10):
+	teapot.TPB.drift(b,1.0)
+	collector.record("point_"+str(ind),b)
+	twiss_analysis.analyzeBunch(b)
+	twiss_arr = [twiss_analysis.getTwiss(i) for i in range(3)]
+	ref_arr.append((twiss_arr,extremaCalculator.extremaXYZ(b)))
+
+#---- the columns loaded by the caller give the same sums
+columns = BunchColumns(b)
+collector.record("point_columns",b,columns)
+
+#---- one fused reduction for all points
+res_arr = collector.flush()
+if(res_arr[len(res_arr)-1][1:] != res_arr[len(res_arr)-2][1:]):
+	print "The sums of the caller's columns differ from the bunch ones!"
+	sys.exit(1)
+res_arr = res_arr[:len(res_arr)-1]
+
+if(rank == 0):
+	for ind in range(len(res_arr)):
+		[label,n_parts,twiss_arr,extrema] = res_arr[ind]
+		(twiss_ref_arr,extrema_ref) = ref_arr[ind]
+		print "%10s n=%8d betaX = %10.5f ref= %10.5f emittX = %12.5g ref= %12.5g xMax = %10.6f ref= %10.6f"%(label,n_parts,twiss_arr[0][1],twiss_ref_arr[0][1],twiss_arr[0][3],twiss_ref_arr[0][3],extrema[1],extrema_ref[1])
+print "Stop."
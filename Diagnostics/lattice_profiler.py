@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The per-node profiler of the lattice tracking.
+# The LatticeProfiler adds the ENTRANCE and EXIT actions to
+# the actions container of lattice.trackBunch(...) and
+# records for each node:
+#   type, number of calls, total time (with child nodes),
+#   own time (without child nodes), particles at the entrance
+#   and at the exit, and MPI wait time.
+# The MPI wait time is measured by MPI_Barrier at the entrance
+# of the top level nodes if measure_mpi_wait = True. It shows
+# the load imbalance between CPUs, but the barriers themselves
+# synchronize the CPUs, so it is off by default.
+# The records are keyed by the node objects, so the nodes
+# with the same names are not merged. The keys of the returned
+# records are the node names, and the second, third, ... node
+# with the same name gets the "#2", "#3", ... suffix in the
+# order of the first calls.
+# The records are accumulated over the turns until clear().
+# The getGlobalRecords() sums the records over all CPUs (the
+# max of the times is also kept), and the results can be
+# printed as the table or written into the JSON file.
+# Usage:
+#   profiler = LatticeProfiler()
+#   lattice.trackBunch(bunch,paramsDict,profiler.getActionsContainer())
+#   profiler.printTable()
+#--------------------------------------------------------
+
+import math
+import sys
+import json
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from orbit.lattice import AccLattice, AccNode, AccActionsContainer
+
+#---- the indexes of the numerical values in the record
+CALLS = 0
+TIME_TOTAL = 1
+TIME_OWN = 2
+PARTS_IN = 3
+PARTS_OUT = 4
+TIME_MPI_WAIT = 5
+RECORD_NAMES = ("calls","time_total","time_own","parts_in","parts_out","time_mpi_wait")
+
+class LatticeProfiler:
+	"""
+	Records the time and the number of particles for each lattice node.
+	"""
+	def __init__(self, measure_mpi_wait = False):
+		self.measure_mpi_wait = measure_mpi_wait
+		self.actionsContainer = AccActionsContainer("Lattice Profiler")
+		self.addActions(self.actionsContainer)
+		self.clear()
+
+	def clear(self):
+		"""
+		Removes all records.
+		"""
+		self.records = {}
+		self.types = {}
+		self.labels = {}
+		self.name_counts = {}
+		self.stack = []
+
+	def addActions(self, actionsContainer):
+		"""
+		Adds the profiler actions to the user's actions container.
+		"""
+		actionsContainer.addAction(self._entrance,AccActionsContainer.ENTRANCE)
+		actionsContainer.addAction(self._exit,AccActionsContainer.EXIT)
+
+	def getActionsContainer(self):
+		return self.actionsContainer
+
+	def _entrance(self, paramsDict):
+		node = paramsDict["node"]
+		bunch = paramsDict["bunch"]
+		time_wait = 0.
+		if(self.measure_mpi_wait and isinstance(paramsDict["parentNode"],AccLattice)):
+			time_start = orbit_mpi.MPI_Wtime()
+			orbit_mpi.MPI_Barrier(bunch.getMPIComm())
+			time_wait = orbit_mpi.MPI_Wtime() - time_start
+		#---- [node, start time, time of children, particles in, MPI wait time]
+		self.stack.append([node,orbit_mpi.MPI_Wtime(),0.,bunch.getSize(),time_wait])
+
+	def _exit(self, paramsDict):
+		(node,time_start,time_children,n_parts_in,time_wait) = self.stack.pop()
+		time_total = orbit_mpi.MPI_Wtime() - time_start
+		if(not self.records.has_key(node)):
+			self.records[node] = [0,0.,0.,0,0,0.]
+			self.types[node] = node.getType()
+			name = node.getName()
+			count = self.name_counts.get(name,0) + 1
+			self.name_counts[name] = count
+			if(count > 1): name = name+"#"+str(count)
+			self.labels[node] = name
+		record = self.records[node]
+		record[CALLS] += 1
+		record[TIME_TOTAL] += time_total
+		record[TIME_OWN] += time_total - time_children
+		record[PARTS_IN] += n_parts_in
+		record[PARTS_OUT] += paramsDict["bunch"].getSize()
+		record[TIME_MPI_WAIT] += time_wait
+		if(len(self.stack) > 0):
+			self.stack[len(self.stack)-1][2] += time_total
+
+	def getRecords(self):
+		"""
+		Returns the dictionary {name:[type, calls, time_total, time_own,
+		parts_in, parts_out, time_mpi_wait]} of this CPU.
+		"""
+		res_dict = {}
+		for node in self.records.keys():
+			res_dict[self.labels[node]] = [self.types[node],] + self.records[node]
+		return res_dict
+
+	def getGlobalRecords(self, comm = mpi_comm.MPI_COMM_WORLD):
+		"""
+		Returns the records summed over all CPUs as getRecords() plus the
+		max over CPUs of the time_total and time_own. All CPUs should have
+		the same lattice. It is collective.
+		"""
+		nodes = sorted(self.records.keys(),key = lambda node: self.labels[node])
+		names = [self.labels[node] for node in nodes]
+		vals = []
+		max_vals = []
+		for node in nodes:
+			vals += self.records[node]
+			max_vals += [self.records[node][TIME_TOTAL],self.records[node][TIME_OWN]]
+		if(orbit_mpi.MPI_Comm_size(comm) > 1 and len(names) > 0):
+			vals = orbit_mpi.MPI_Allreduce(tuple(vals),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,comm)
+			max_vals = orbit_mpi.MPI_Allreduce(tuple(max_vals),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_MAX,comm)
+		n_vals = len(RECORD_NAMES)
+		res_dict = {}
+		for ind in range(len(names)):
+			name = names[ind]
+			res_dict[name] = [self.types[nodes[ind]],] + list(vals[ind*n_vals:(ind+1)*n_vals]) + list(max_vals[2*ind:2*ind+2])
+		return res_dict
+
+	def getTypeRecords(self, records):
+		"""
+		Returns the records from getRecords() or getGlobalRecords() summed by the node type.
+		"""
+		res_dict = {}
+		for name in records.keys():
+			record = records[name]
+			node_type = record[0]
+			if(not res_dict.has_key(node_type)):
+				res_dict[node_type] = [node_type,] + [0.]*(len(record) - 1)
+			type_record = res_dict[node_type]
+			for ind in range(1,len(record)):
+				type_record[ind] += record[ind]
+		return res_dict
+
+	def printTable(self, records = None, n_lines = 30):
+		"""
+		Prints the records sorted by the own time (the local records by default).
+		"""
+		if(records == None): records = self.getRecords()
+		names = sorted(records.keys(),key = lambda name: -records[name][1+TIME_OWN])
+		print "%40s %20s %8s %12s %12s %12s %12s %12s"%("name","type","calls","time_total","time_own","parts_in","parts_out","mpi_wait")
+		for name in names[:n_lines]:
+			record = records[name]
+			print "%40s %20s %8d %12.6f %12.6f %12d %12d %12.6f"%((name,record[0]) + tuple(record[1:7]))
+
+	def writeJSON(self, fileName, records = None):
+		"""
+		Writes the records (the local records by default) into the JSON file.
+		"""
+		if(records == None): records = self.getRecords()
+		res_dict = {}
+		for name in records.keys():
+			record = records[name]
+			record_dict = {"type":record[0]}
+			for ind in range(len(RECORD_NAMES)):
+				record_dict[RECORD_NAMES[ind]] = record[1+ind]
+			if(len(record) > 1+len(RECORD_NAMES)):
+				record_dict["time_total_max"] = record[1+len(RECORD_NAMES)]
+				record_dict["time_own_max"] = record[2+len(RECORD_NAMES)]
+			res_dict[name] = record_dict
+		fl = open(fileName,"w")
+		json.dump(res_dict,fl,indent = 1,sort_keys = True)
+		fl.close()
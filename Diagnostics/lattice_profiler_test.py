@@ -0,0 +1,47 @@
+##############################################################
+# This script profiles the tracking of the bunch through
+# the TEAPOT lattice with the LatticeProfiler.
+# ./START.sh lattice_profiler_test.py 2
+##############################################################
+
+import math
+import sys
+import random
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from orbit.teapot import teapot
+from bunch import Bunch
+
+from lattice_profiler import LatticeProfiler
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+
+teapot_latt = teapot.TEAPOT_Lattice()
+teapot_latt.readMAD("MAD_Lattice/LATTICE","RING")
+teapot_latt.initialize()
+
+b = Bunch()
+b.mass(0.93827231)
+b.getSyncParticle().kinEnergy(1.0)
+random.seed(1 + rank)
+for i in xrange(1000*(rank+1)):
+	b.addParticle(random.gauss(0.,0.001),random.gauss(0.,0.0001),random.gauss(0.,0.001),random.gauss(0.,0.0001),random.uniform(-100.,100.),random.gauss(0.,0.0001))
+b.compress()
+
+profiler = LatticeProfiler(measure_mpi_wait = True)
+paramsDict = {}
+for turn in xrange(5):
+	teapot_latt.trackBunch(b,paramsDict,profiler.getActionsContainer())
+
+records = profiler.getGlobalRecords(comm)
+if(rank == 0):
+	print "lattice nodes =",len(teapot_latt.getNodes())," profiled nodes =",len(records)
+	print "======== nodes ========"
+	profiler.printTable(records,20)
+	print "======== node types ========"
+	profiler.printTable(profiler.getTypeRecords(records))
+	profiler.writeJSON("lattice_profile.json",records)
+print "Stop."
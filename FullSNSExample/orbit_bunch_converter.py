@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# Block-wise parallel converters between the ORBIT bunch
+# files and pyORBIT bunches. They do the same as
+# bunch_orbit_to_pyorbit and bunch_pyorbit_to_orbit from
+# orbit.utils.orbit_mpi_utils, but:
+#  - reading: each CPU parses its own byte range of the
+#    ORBIT file with NumPy, there is no communication
+#  - writing: each CPU formats its particles and writes
+#    the text at the offset defined by the text sizes
+#    of the previous CPUs
+#  - the ORBIT file can be converted directly into the
+#    binary bunch file
+# The ORBIT file columns: x[mm] xp[mrad] y[mm] yp[mrad] phi[rad] dE[GeV]
+# The longitudinal coordinate z = -phi*L/(2*pi) as in the
+# bunch_orbit_to_pyorbit converter.
+# The file system should be shared between CPUs.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_columns import getCoordinates, addParticles
+from bunch_binary_io import dumpBunchBinaryParallel
+
+ORBIT_LINE_FORMAT = "%21.12E%21.12E%21.12E%21.12E%21.12E%21.12E"
+
+def _getOrbitTextRange(fileName, rank, size):
+	"""
+	Returns the text of the complete lines of the ORBIT file for this CPU.
+	The file is split into equal byte ranges, and a line belongs to the
+	CPU whose range contains its first byte.
+	"""
+	file_size = os.path.getsize(fileName)
+	pos_start = (file_size*rank)/size
+	pos_stop = (file_size*(rank+1))/size
+	fl = open(fileName,"rb")
+	if(pos_start > 0):
+		fl.seek(pos_start - 1)
+		if(fl.read(1) != "\n"):
+			fl.readline()
+		pos_start = fl.tell()
+	text = ""
+	if(pos_start < pos_stop):
+		text = fl.read(pos_stop - pos_start)
+		if(len(text) > 0 and text[-1] != "\n"):
+			text += fl.readline()
+	fl.close()
+	return text
+
+def orbitToPyorbit(ringLength, kineticEnergy, fileName, bunch = None, block_size = 100000):
+	"""
+	Reads the ORBIT bunch file into the pyORBIT bunch. It is collective.
+	Each CPU reads its own part of the file. Returns the bunch.
+	"""
+	if(bunch == None): bunch = Bunch()
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	bunch.getSyncParticle().kinEnergy(kineticEnergy)
+	lines = _getOrbitTextRange(fileName,rank,size).splitlines()
+	z_coeff = -ringLength/(2*math.pi)
+	for ind_start in xrange(0,len(lines),block_size):
+		block = " ".join(lines[ind_start:ind_start+block_size])
+		arr = np.fromstring(block,dtype = np.float64,sep = " ")
+		if(arr.shape[0] % 6 != 0):
+			orbit_mpi.finalize("orbit_bunch_converter: wrong ORBIT file structure! file="+fileName)
+		arr = arr.reshape((arr.shape[0]/6,6))
+		arr[:,0:4] /= 1000.
+		arr[:,4] *= z_coeff
+		addParticles(bunch,arr)
+	return bunch
+
+def pyorbitToOrbit(ringLength, bunch, fileName, block_size = 100000):
+	"""
+	Writes the pyORBIT bunch into the ORBIT bunch file. It is collective.
+	Each CPU writes its own particles at the offset of its text.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	coords = getCoordinates(bunch)
+	coords[:,0:4] *= 1000.
+	coords[:,4] *= -2*math.pi/ringLength
+	blocks = []
+	for ind_start in xrange(0,coords.shape[0],block_size):
+		arr = coords[ind_start:ind_start+block_size]
+		blocks.append("\n".join([ORBIT_LINE_FORMAT%tuple(vals) for vals in arr.tolist()])+"\n")
+	text = "".join(blocks)
+	#---- the sizes are reduced as doubles (exact up to 2^53), MPI_INT overflows at 2 GB
+	text_sizes = [0.]*size
+	text_sizes[rank] = float(len(text))
+	text_sizes = orbit_mpi.MPI_Allreduce(tuple(text_sizes),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,comm)
+	text_sizes = [int(val) for val in text_sizes]
+	if(rank == 0):
+		fl = open(fileName,"wb")
+		fl.truncate(sum(text_sizes))
+		fl.close()
+	orbit_mpi.MPI_Barrier(comm)
+	if(len(text) > 0):
+		fl = open(fileName,"r+b")
+		fl.seek(sum(text_sizes[:rank]))
+		fl.write(text)
+		fl.close()
+	orbit_mpi.MPI_Barrier(comm)
+
+def orbitToBinary(ringLength, kineticEnergy, fileName, binFileName, bunch_template = None):
+	"""
+	Converts the ORBIT bunch file into the binary bunch file. The optional
+	bunch_template defines the mass, charge, macro-size and other attributes.
+	"""
+	bunch = Bunch()
+	if(bunch_template != None):
+		bunch_template.copyEmptyBunchTo(bunch)
+	orbitToPyorbit(ringLength,kineticEnergy,fileName,bunch)
+	dumpBunchBinaryParallel(bunch,binFileName)
@@ -0,0 +1,87 @@
+##############################################################
+# This script compares the block-wise parallel ORBIT bunch
+# converters with bunch_orbit_to_pyorbit and bunch_pyorbit_to_orbit
+##############################################################
+
+import time
+import math
+import sys
+
+from bunch import Bunch
+from orbit.utils.orbit_mpi_utils import bunch_orbit_to_pyorbit, bunch_pyorbit_to_orbit
+
+import orbit_mpi
+from orbit_mpi import mpi_op
+from orbit_mpi import mpi_datatype
+
+from orbit_bunch_converter import orbitToPyorbit, pyorbitToOrbit, orbitToBinary
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+size = orbit_mpi.MPI_Comm_size(comm)
+
+ORBIT_file_name = "../Collimation/ORBIT_Benchmarks/Bm_KV_Uniform_10000"
+
+kineticEnergy = 1.0
+ringLength = 248.0
+
+def getSums(b):
+	"""
+	Returns the global sums of the coordinates and of the products that
+	are odd in z (z*x, z*dE, z^3), so the sign of z is checked too.
+	"""
+	var_arr = [0.]*9
+	for i in range(b.getSize()):
+		coords = (b.x(i),b.xp(i),b.y(i),b.yp(i),b.z(i),b.dE(i))
+		for j in range(6):
+			var_arr[j] += coords[j]
+		var_arr[6] += coords[4]*coords[0]
+		var_arr[7] += coords[4]*coords[5]
+		var_arr[8] += coords[4]**3
+	return orbit_mpi.MPI_Allreduce(tuple(var_arr),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,comm)
+
+def checkSums(sums, sums_ref, name):
+	"""
+	Stops the test if the sums differ.
+	"""
+	for (s,s_ref) in zip(sums,sums_ref):
+		if(math.fabs(s - s_ref) > 1.0e-6*(math.fabs(s_ref) + 1.0e-3)):
+			orbit_mpi.finalize("orbit_bunch_converter_test: "+name+" differs! sums="+str(sums)+" ref. sums="+str(sums_ref))
+
+#---- old converters
+time_start = orbit_mpi.MPI_Wtime()
+b_old = Bunch()
+bunch_orbit_to_pyorbit(ringLength, kineticEnergy, ORBIT_file_name, b_old)
+bunch_pyorbit_to_orbit(ringLength, b_old, "orbit_file_old.dat")
+time_old = orbit_mpi.MPI_Wtime() - time_start
+
+#---- new converters
+time_start = orbit_mpi.MPI_Wtime()
+b_new = Bunch()
+orbitToPyorbit(ringLength, kineticEnergy, ORBIT_file_name, b_new)
+pyorbitToOrbit(ringLength, b_new, "orbit_file_new.dat")
+time_new = orbit_mpi.MPI_Wtime() - time_start
+
+orbitToBinary(ringLength, kineticEnergy, ORBIT_file_name, "orbit_file_new.bin")
+
+sums_old = getSums(b_old)
+sums_new = getSums(b_new)
+if(rank == 0):
+	print "n parts old =",b_old.getSizeGlobal()," new =",b_new.getSizeGlobal()
+	print "time [sec] old =",time_old," new =",time_new
+	for (name,s_old,s_new) in zip(("x","xp","y","yp","z","dE"),sums_old,sums_new):
+		print "sum %2s old = %14.7e  new = %14.7e"%(name,s_old,s_new)
+	for (name,s_old,s_new) in zip(("z*x","z*dE","z^3"),sums_old[6:],sums_new[6:]):
+		print "sum %4s old = %14.7e  new = %14.7e"%(name,s_old,s_new)
+if(b_old.getSizeGlobal() != b_new.getSizeGlobal()):
+	orbit_mpi.finalize("orbit_bunch_converter_test: the numbers of particles differ!")
+checkSums(sums_new,sums_old,"orbitToPyorbit")
+
+#---- round trip: the new ORBIT file read back by both converters
+b_old_rt = Bunch()
+bunch_orbit_to_pyorbit(ringLength, kineticEnergy, "orbit_file_new.dat", b_old_rt)
+checkSums(getSums(b_old_rt),sums_old,"pyorbitToOrbit read by bunch_orbit_to_pyorbit")
+b_new_rt = Bunch()
+orbitToPyorbit(ringLength, kineticEnergy, "orbit_file_old.dat", b_new_rt)
+checkSums(getSums(b_new_rt),sums_old,"bunch_pyorbit_to_orbit read by orbitToPyorbit")
+if(rank == 0): print "The converters agree."
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# Checkpoint and restart of the ring simulation state.
+# The checkpoint keeps:
+#  - the main bunch and the lost bunch in the binary bunch
+#    format (<name>.bunch.bin and <name>.lostbunch.bin)
+#  - the bunch double and int attributes (mass, charge,
+#    classical_radius, macro_size, and the user's ones) and the
+#    sync. particle coordinates, momentum, and time (the kicker
+#    waveforms time) with 17 significant digits, because the
+#    text bunch header keeps them with 6 digits only
+#  - the turn counter, the Python and NumPy random generators
+#    states, and the parameters of the lattice nodes in
+#    <name>.state_<rank> files (one per CPU)
+#  - the states of the user's stateful objects through the
+#    (getState, setState) handlers registered by addStateHandler.
+# The states inside the C++ nodes are not accessible from Python
+# and are NOT checkpointed:
+#  - the random generator state of the foil scattering
+#  - the impedance and wake fields history (the previous turns
+#    kicks of the longitudinal and transverse impedance nodes)
+#  - any other internal state of the C++ tracking classes
+# After the restore these states start from scratch, so the run
+# is not bit-identical to the continuous one if such nodes are
+# in the lattice. The user can add them through the state
+# handlers if the node provides the access methods.
+# Usage:
+#   checkpoint = RingCheckpoint(lattice, bunch, lostbunch)
+#   checkpoint.addStateHandler("tunes",getTunesState,setTunesState)
+#   for turn in range(turn_start,n_turns):
+#      lattice.trackBunch(bunch, paramsDict)
+#      if((turn+1) % 100 == 0): checkpoint.save("ring_ckpt",turn+1)
+#   ... after restart:
+#   turn_start = checkpoint.restore("ring_ckpt")
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+import random
+import pickle
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_binary_io import dumpBunchBinaryParallel, readBunchBinary
+from bunch_binary_io import getBunchAttrsText, setBunchAttrsText
+
+class RingCheckpoint:
+	"""
+	Saves and restores the state of the ring simulation.
+	"""
+	def __init__(self, lattice, bunch, lostbunch = None):
+		self.lattice = lattice
+		self.bunch = bunch
+		self.lostbunch = lostbunch
+		self.state_handlers = []
+
+	def addStateHandler(self, name, getStateFunc, setStateFunc):
+		"""
+		Registers the state handler. The getStateFunc() should return
+		the picklable state, and setStateFunc(state) should restore it.
+		"""
+		self.state_handlers.append((name,getStateFunc,setStateFunc))
+
+	def _getNodesParams(self):
+		"""
+		Returns the list of (name, picklable params dict) for the lattice nodes.
+		"""
+		nodes_params = []
+		for node in self.lattice.getNodes():
+			params = {}
+			params_dict = node.getParamsDict()
+			for key in params_dict.keys():
+				try:
+					pickle.dumps(params_dict[key],pickle.HIGHEST_PROTOCOL)
+					params[key] = params_dict[key]
+				except Exception:
+					pass
+			nodes_params.append((node.getName(),params))
+		return nodes_params
+
+	def _setNodesParams(self, nodes_params):
+		nodes = self.lattice.getNodes()
+		if(len(nodes) != len(nodes_params)):
+			orbit_mpi.finalize("RingCheckpoint: the lattice differs from the checkpoint one!")
+		for ind in range(len(nodes)):
+			(name,params) = nodes_params[ind]
+			if(nodes[ind].getName() != name):
+				orbit_mpi.finalize("RingCheckpoint: node name="+nodes[ind].getName()+" differs from="+name)
+			for key in params.keys():
+				nodes[ind].setParam(key,params[key])
+
+	def save(self, fileName, turn):
+		"""
+		Saves the checkpoint. It is collective. The files are written
+		into temporary names and renamed at the end, so the previous
+		checkpoint with the same name is valid until the new one is complete.
+		"""
+		comm = self.bunch.getMPIComm()
+		rank = orbit_mpi.MPI_Comm_rank(comm)
+		size = orbit_mpi.MPI_Comm_size(comm)
+		dumpBunchBinaryParallel(self.bunch,fileName+".bunch.bin.tmp")
+		if(self.lostbunch != None):
+			dumpBunchBinaryParallel(self.lostbunch,fileName+".lostbunch.bin.tmp")
+		state = {}
+		state["turn"] = turn
+		state["n_cpus"] = size
+		state["random"] = random.getstate()
+		state["numpy_random"] = np.random.get_state()
+		state["bunch_attrs"] = getBunchAttrsText(self.bunch)
+		if(self.lostbunch != None):
+			state["lostbunch_attrs"] = getBunchAttrsText(self.lostbunch)
+		state["nodes_params"] = self._getNodesParams()
+		handlers_states = {}
+		for (name,getStateFunc,setStateFunc) in self.state_handlers:
+			handlers_states[name] = getStateFunc()
+		state["handlers"] = handlers_states
+		state_file_name = fileName+".state_"+str(rank)
+		fl = open(state_file_name+".tmp","wb")
+		pickle.dump(state,fl,pickle.HIGHEST_PROTOCOL)
+		fl.close()
+		orbit_mpi.MPI_Barrier(comm)
+		os.rename(state_file_name+".tmp",state_file_name)
+		if(rank == 0):
+			os.rename(fileName+".bunch.bin.tmp",fileName+".bunch.bin")
+			if(self.lostbunch != None):
+				os.rename(fileName+".lostbunch.bin.tmp",fileName+".lostbunch.bin")
+		orbit_mpi.MPI_Barrier(comm)
+
+	def restore(self, fileName):
+		"""
+		Restores the checkpoint and returns the turn number. It is collective.
+		The number of CPUs should be the same as at the save, because the
+		random generators states are kept per CPU.
+		The foil scattering random generator state and the impedance and
+		wake fields history of the C++ nodes are not restored.
+		"""
+		comm = self.bunch.getMPIComm()
+		rank = orbit_mpi.MPI_Comm_rank(comm)
+		size = orbit_mpi.MPI_Comm_size(comm)
+		fl = open(fileName+".state_"+str(rank),"rb")
+		state = pickle.load(fl)
+		fl.close()
+		if(state["n_cpus"] != size):
+			orbit_mpi.finalize("RingCheckpoint: checkpoint nCPUs="+str(state["n_cpus"])+" current nCPUs="+str(size))
+		self.bunch.deleteAllParticles()
+		readBunchBinary(self.bunch,fileName+".bunch.bin",keep_slabs = True)
+		if(self.lostbunch != None):
+			self.lostbunch.deleteAllParticles()
+			readBunchBinary(self.lostbunch,fileName+".lostbunch.bin",keep_slabs = True)
+		#---- the exact attributes instead of the 6 digits ones of the bunch header
+		setBunchAttrsText(self.bunch,state["bunch_attrs"])
+		if(self.lostbunch != None):
+			setBunchAttrsText(self.lostbunch,state["lostbunch_attrs"])
+		random.setstate(state["random"])
+		np.random.set_state(state["numpy_random"])
+		self._setNodesParams(state["nodes_params"])
+		handlers_states = state["handlers"]
+		for (name,getStateFunc,setStateFunc) in self.state_handlers:
+			if(handlers_states.has_key(name)):
+				setStateFunc(handlers_states[name])
+		return state["turn"]
@@ -0,0 +1,96 @@
+##############################################################
+# This script checks the checkpoint and restart of the ring
+# simulation. The bunch is tracked 20 turns in one go, and
+# then 10 turns, saved, spoiled, restored, and tracked 10
+# turns more. The lattice has the aperture, so there are
+# losses. The final coordinates, the lost particles, the
+# sync. particle time, and the bunch attributes should be
+# identical.
+##############################################################
+
+import math
+import sys
+import random
+
+from orbit.teapot import teapot
+from orbit.teapot import TEAPOT_Lattice
+from bunch import Bunch
+from orbit.aperture import addTeapotApertureNode, CircleApertureNode
+
+from ring_checkpoint import RingCheckpoint
+
+print "Start."
+
+#=====Make a Teapot style lattice======
+teapot_latt = teapot.TEAPOT_Ring()
+print "Read MAD."
+teapot_latt.readMAD("MAD_Lattice/RealInjection/SNSring_pyOrbitBenchmark.LAT","RING")
+teapot_latt.initialize()
+addTeapotApertureNode(teapot_latt,100.,CircleApertureNode(0.01))
+
+def makeBunch():
+	b = Bunch()
+	b.mass(0.93827231)
+	b.macroSize(1.23456789012345e+10)
+	b.getSyncParticle().kinEnergy(1.0)
+	random.seed(1)
+	for i in xrange(1000):
+		b.addParticle(random.gauss(0.,0.005),random.gauss(0.,0.0005),random.gauss(0.,0.005),random.gauss(0.,0.0005),random.uniform(-100.,100.),random.gauss(0.,0.001))
+	b.compress()
+	return b
+
+paramsDict = {}
+
+#---- 20 turns in one go
+b_ref = makeBunch()
+lostbunch_ref = Bunch()
+lostbunch_ref.addPartAttr("LostParticleAttributes")
+paramsDict["lostbunch"] = lostbunch_ref
+for turn in xrange(20):
+	teapot_latt.trackBunch(b_ref, paramsDict)
+
+#---- 10 turns, checkpoint, spoil, restore, 10 turns
+b = makeBunch()
+lostbunch = Bunch()
+lostbunch.addPartAttr("LostParticleAttributes")
+paramsDict["lostbunch"] = lostbunch
+checkpoint = RingCheckpoint(teapot_latt,b,lostbunch)
+for turn in xrange(10):
+	teapot_latt.trackBunch(b, paramsDict)
+checkpoint.save("ring_ckpt_test",10)
+
+for turn in xrange(5):
+	teapot_latt.trackBunch(b, paramsDict)
+b.addParticle(1.,1.,1.,1.,1.,1.)
+b.compress()
+b.macroSize(1.0)
+b.mass(1.0)
+
+turn_start = checkpoint.restore("ring_ckpt_test")
+print "restored turn =",turn_start," nParts =",b.getSize()
+for turn in xrange(turn_start,20):
+	teapot_latt.trackBunch(b, paramsDict)
+
+def getMaxDiff(b, b_ref):
+	if(b.getSize() != b_ref.getSize()): return float("inf")
+	max_diff = 0.
+	for i in xrange(b.getSize()):
+		coords = (b.x(i),b.xp(i),b.y(i),b.yp(i),b.z(i),b.dE(i))
+		coords_ref = (b_ref.x(i),b_ref.xp(i),b_ref.y(i),b_ref.yp(i),b_ref.z(i),b_ref.dE(i))
+		for (u,u_ref) in zip(coords,coords_ref):
+			max_diff = max(max_diff,math.fabs(u-u_ref))
+	return max_diff
+
+max_diff = getMaxDiff(b,b_ref)
+max_diff_lost = getMaxDiff(lostbunch,lostbunch_ref)
+time_diff = b.getSyncParticle().time() - b_ref.getSyncParticle().time()
+print "nParts =",b.getSize()," ref. nParts =",b_ref.getSize()," max diff =",max_diff
+print "nLost =",lostbunch.getSize()," ref. nLost =",lostbunch_ref.getSize()," max diff =",max_diff_lost
+attrs_same = (b.mass() == b_ref.mass() and b.macroSize() == b_ref.macroSize())
+print "sync. part. time diff =",time_diff
+print "mass =",repr(b.mass())," macroSize =",repr(b.macroSize())
+if(max_diff != 0. or max_diff_lost != 0. or time_diff != 0. or not attrs_same):
+	print "The restarted run differs from the reference one!"
+	sys.exit(1)
+
+print "Stop."
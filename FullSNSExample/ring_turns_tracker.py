@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The multi-turn tracking of the bunch in the ring.
+# The RingTurnsTracker compiles the lattice into the flat
+# LatticePlan (see AccLattice_Tests/lattice_plan.py) once
+# and tracks the bunch for many turns without the walks of
+# the node tree. The user's hooks hook(bunch, turn, paramsDict)
+# are called only at the turns where (turn % every == 0),
+# e.g. for the bunch dumps and the diagnostics:
+#
+# tracker = RingTurnsTracker(teapot_latt)
+# tracker.addTurnHook(dumpBunch, 100)
+# tracker.trackBunchTurns(b, 1000, paramsDict)
+#
+# The turn counter is paramsDict["turn"] (1 after the first turn).
+# The tracking of the same paramsDict continues the turn count.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../AccLattice_Tests"))
+from lattice_plan import LatticePlan
+
+class RingTurnsTracker:
+	"""
+	Tracks the bunch through the ring lattice for many turns.
+	"""
+	def __init__(self, lattice):
+		self.lattice = lattice
+		self.plan = LatticePlan(lattice)
+		self.hooks = []
+		self.compiled = False
+
+	def getLatticePlan(self):
+		"""
+		Returns the LatticePlan. The actions attached to it are
+		used after the next compile().
+		"""
+		return self.plan
+
+	def compile(self):
+		"""
+		Compiles the lattice plan. It should be called after the
+		changes of the lattice structure.
+		"""
+		self.plan.compile()
+		self.compiled = True
+
+	def addTurnHook(self, hook, every = 1):
+		"""
+		Adds the hook(bunch, turn, paramsDict) called after every "every" turns.
+		"""
+		self.hooks.append((hook,max(1,every)))
+
+	def removeTurnHooks(self):
+		self.hooks = []
+
+	def trackBunchTurns(self, bunch, nTurns, paramsDict = None):
+		"""
+		Tracks the bunch nTurns turns. If paramsDict is None the new
+		dictionary is used and the turns are counted from 0. The user's
+		paramsDict continues the turn count paramsDict["turn"] of the
+		previous calls. The "stopTracking" key is reset at the start.
+		"""
+		if(paramsDict == None): paramsDict = {}
+		if(not self.compiled): self.compile()
+		paramsDict["stopTracking"] = False
+		turn = paramsDict.get("turn",0)
+		hooks = self.hooks
+		plan = self.plan
+		for ind in xrange(nTurns):
+			paramsDict["path_length"] = 0.
+			plan.trackBunch(bunch,paramsDict)
+			turn += 1
+			paramsDict["turn"] = turn
+			for (hook,every) in hooks:
+				if(turn % every == 0):
+					hook(bunch,turn,paramsDict)
+			if(paramsDict.get("stopTracking",False)): break
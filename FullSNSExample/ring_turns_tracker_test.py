@@ -0,0 +1,78 @@
+##############################################################
+# This script compares the multi-turn tracking of the
+# RingTurnsTracker with the turn loop of trackBunch(...)
+# and calls the hook every 10 turns.
+##############################################################
+
+import math
+import sys
+import random
+import time
+
+from orbit.teapot import teapot
+from orbit.teapot import TEAPOT_Lattice
+from bunch import Bunch
+
+from ring_turns_tracker import RingTurnsTracker
+
+print "Start."
+
+teapot_latt = teapot.TEAPOT_Ring()
+print "Read MAD."
+teapot_latt.readMAD("MAD_Lattice/RealInjection/SNSring_pyOrbitBenchmark.LAT","RING")
+teapot_latt.initialize()
+
+def makeBunch():
+	b = Bunch()
+	b.mass(0.93827231)
+	b.getSyncParticle().kinEnergy(1.0)
+	random.seed(1)
+	for i in xrange(10):
+		b.addParticle(random.gauss(0.,0.005),random.gauss(0.,0.0005),random.gauss(0.,0.005),random.gauss(0.,0.0005),random.uniform(-100.,100.),random.gauss(0.,0.001))
+	b.compress()
+	return b
+
+n_turns = 50
+
+#---- the turn loop in the script
+b_ref = makeBunch()
+time_start = time.time()
+paramsDict = {}
+for turn in xrange(n_turns):
+	teapot_latt.trackBunch(b_ref, paramsDict)
+print "trackBunch loop time [sec] = %8.3f "%(time.time() - time_start)
+
+#---- the multi-turn tracker
+def printHook(bunch, turn, paramsDict):
+	print "turn=",turn," x[0] = %12.5e "%bunch.x(0)
+
+b = makeBunch()
+tracker = RingTurnsTracker(teapot_latt)
+tracker.addTurnHook(printHook,10)
+time_start = time.time()
+tracker.trackBunchTurns(b, n_turns, {})
+print "trackBunchTurns time [sec] = %8.3f "%(time.time() - time_start)
+
+max_diff = 0.
+for i in xrange(b.getSize()):
+	for (v,v_ref) in ((b.x(i),b_ref.x(i)),(b.xp(i),b_ref.xp(i)),(b.y(i),b_ref.y(i)),(b.yp(i),b_ref.yp(i)),(b.z(i),b_ref.z(i)),(b.dE(i),b_ref.dE(i))):
+		max_diff = max(max_diff,math.fabs(v - v_ref))
+print "max coordinates diff =",max_diff
+
+#---- the calls without paramsDict start from turn 0, the same paramsDict continues the count
+turns = []
+def turnHook(bunch, turn, paramsDict):
+	turns.append(turn)
+	if(turn == 2): paramsDict["stopTracking"] = True
+tracker.removeTurnHooks()
+tracker.addTurnHook(turnHook)
+tracker.trackBunchTurns(b, 1)
+tracker.trackBunchTurns(b, 1)
+paramsDict = {}
+tracker.trackBunchTurns(b, 3, paramsDict)
+tracker.trackBunchTurns(b, 1, paramsDict)
+print "hook turns =",turns
+if(turns != [1,1,1,2,3]):
+	print "The turn count is wrong!"
+	sys.exit(1)
+print "Stop."
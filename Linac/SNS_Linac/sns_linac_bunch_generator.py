@@ -3,7 +3,11 @@
 #--------------------------------------------------------
 # The classes will generates bunches for pyORBIT SNS linac 
 # at the entrance of SNS MEBT accelerator line (by default)
-# It is parallel, but it is not efficient.
+# It is parallel. The KV, Water Bag, and Gauss distributions
+# are replaced by their batch versions (see batch_distributions
+# module) that generate on each CPU only its own part of the
+# bunch without any communication. For other distributions all
+# particles are generated on rank 0 and broadcasted.
 #--------------------------------------------------------
 
 import math
@@ -24,6 +28,15 @@ from orbit.bunch_generators import TwissAnalysis
 
 from bunch import Bunch
 
+_dir_name = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_dir_name,"../../Bunch_Generators_Tests"))
+sys.path.append(os.path.join(_dir_name,"../../Bunch_Tests"))
+from batch_distributions import WaterBagDist3DBatch, GaussDist3DBatch, KVDist3DBatch
+from bunch_columns import addParticles
+
+#---- the batch versions of the distributions
+BATCH_DISTRIBUTIONS = {WaterBagDist3D:WaterBagDist3DBatch, GaussDist3D:GaussDist3DBatch, KVDist3D:KVDist3DBatch}
+
 class SNS_Linac_BunchGenerator:
 	"""
 	Generates the pyORBIT SNS Linac Bunches.
@@ -78,9 +91,11 @@ class SNS_Linac_BunchGenerator:
 		"""
 		self.beam_current = current
 	
-	def getBunch(self, nParticles = 0, distributorClass = WaterBagDist3D, cut_off = -1.):
+	def getBunch(self, nParticles = 0, distributorClass = WaterBagDist3D, cut_off = -1., seed = 1):
 		"""
 		Returns the pyORBIT bunch with particular number of particles.
+		The seed is used by the distributions with getCoordinatesRange(...)
+		method. The bunch for the seed does not depend on the number of CPUs.
 		"""
 		comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
 		rank = orbit_mpi.MPI_Comm_rank(comm)
@@ -91,13 +106,20 @@ class SNS_Linac_BunchGenerator:
 		self.bunch.copyEmptyBunchTo(bunch)		
 		macrosize = (self.beam_current*1.0e-3/self.bunch_frequency)
 		macrosize /= (math.fabs(bunch.charge())*self.si_e_charge)
+		if(BATCH_DISTRIBUTIONS.has_key(distributorClass)):
+			distributorClass = BATCH_DISTRIBUTIONS[distributorClass]
 		distributor = distributorClass(self.twiss[0],self.twiss[1],self.twiss[2], cut_off)
 		bunch.getSyncParticle().time(0.)	
-		for i in range(nParticles):
-			(x,xp,y,yp,z,dE) = distributor.getCoordinates()
-			(x,xp,y,yp,z,dE) = orbit_mpi.MPI_Bcast((x,xp,y,yp,z,dE),data_type,main_rank,comm)
-			if(i%size == rank):
-				bunch.addParticle(x,xp,y,yp,z,dE)
+		if(hasattr(distributor,"getCoordinatesRange")):
+			ind_start = (nParticles*rank)/size
+			ind_stop = (nParticles*(rank+1))/size
+			addParticles(bunch,distributor.getCoordinatesRange(ind_start,ind_stop,seed))
+		else:
+			for i in range(nParticles):
+				(x,xp,y,yp,z,dE) = distributor.getCoordinates()
+				(x,xp,y,yp,z,dE) = orbit_mpi.MPI_Bcast((x,xp,y,yp,z,dE),data_type,main_rank,comm)
+				if(i%size == rank):
+					bunch.addParticle(x,xp,y,yp,z,dE)
 		nParticlesGlobal = bunch.getSizeGlobal()
 		bunch.macroSize(macrosize/nParticlesGlobal)
 		return bunch
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The sorting of the bunch particles according to the
+# "ParticleIdNumber" attribute.
+# The radixArgsort sorts the ids by the O(N) LSD radix sort
+# with 16 bits digits (the stable NumPy sort of the uint16
+# digits is the radix sort). It is used by the global sort.
+# The local sort bunchSortIdIfNeeded is not a radix sort. It
+# reads only the id column and, if the particles are already
+# sorted (the usual case for the repeated sorts), the bunch
+# is not touched, otherwise the particles are sorted in place
+# by the native bunchSortId, because writing the permuted
+# columns back through the per-particle setters is slower
+# than the C++ sort.
+# The global version redistributes the particles between
+# CPUs so that each CPU holds a contiguous range of ids
+# (rank 0 - the smallest ids). The particles are moved by
+# bunch_mpi_exchange module and are rebuilt from the columns
+# anyway, so the columns are permuted by the radix argsort
+# before they are put back into the bunch.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+from orbit_utils import bunch_utils_functions
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../../../Bunch_Tests"))
+from bunch_columns import getPartAttr
+from bunch_mpi_exchange import getAllColumns, getColumnIndex, putAllColumns, exchangeColumns
+
+ID_ATTR_NAME = "ParticleIdNumber"
+
+def radixArgsort(ids):
+	"""
+	Returns the permutation that sorts the non-negative integer ids.
+	"""
+	ids = np.asarray(ids,dtype = np.int64)
+	order = np.arange(ids.shape[0])
+	if(ids.shape[0] == 0): return order
+	ids = ids - ids.min()
+	max_id = ids.max()
+	shift = 0
+	while(True):
+		digits = ((ids[order] >> shift) & 0xFFFF).astype(np.uint16)
+		order = order[np.argsort(digits,kind = "stable")]
+		shift += 16
+		if((max_id >> shift) == 0): break
+	return order
+
+def bunchSortIdIfNeeded(bunch):
+	"""
+	Sorts the local particles of the bunch according to the particle ids
+	by the native bunchSortId if they are not sorted already.
+	Returns False if the particles were already sorted and True otherwise.
+	"""
+	if(not bunch.hasPartAttr(ID_ATTR_NAME)):
+		orbit_mpi.finalize("bunchSortIdIfNeeded: the bunch does not have "+ID_ATTR_NAME+" attribute!")
+	bunch.compress()
+	ids = getPartAttr(bunch,ID_ATTR_NAME)[:,0].astype(np.int64)
+	if(ids.shape[0] < 2 or np.all(ids[1:] >= ids[:-1])): return False
+	bunch_utils_functions.bunchSortId(bunch)
+	return True
+
+def bunchSortIdGlobal(bunch):
+	"""
+	Redistributes the particles between CPUs so each CPU holds the
+	contiguous range of the particle ids, and sorts them locally.
+	It is collective.
+	"""
+	comm = bunch.getMPIComm()
+	rank = orbit_mpi.MPI_Comm_rank(comm)
+	size = orbit_mpi.MPI_Comm_size(comm)
+	if(size == 1):
+		bunchSortIdIfNeeded(bunch)
+		return
+	(columns,attr_layout) = getAllColumns(bunch)
+	ind_id = getColumnIndex(attr_layout,ID_ATTR_NAME)
+	if(ind_id < 0):
+		orbit_mpi.finalize("bunchSortIdGlobal: the bunch does not have "+ID_ATTR_NAME+" attribute!")
+	ids = columns[ind_id].astype(np.int64)
+	#---- the global ids range split into equal parts
+	id_min = int(orbit_mpi.MPI_Allreduce(int(ids.min()) if ids.shape[0] > 0 else 2**31-1,mpi_datatype.MPI_INT,mpi_op.MPI_MIN,comm))
+	id_max = int(orbit_mpi.MPI_Allreduce(int(ids.max()) if ids.shape[0] > 0 else -1,mpi_datatype.MPI_INT,mpi_op.MPI_MAX,comm))
+	if(id_max < id_min): return
+	n_ids = id_max - id_min + 1
+	owners = ((ids - id_min)*size)/n_ids
+	columns = exchangeColumns(comm,columns,owners)
+	#---- sort and put the particles back into the bunch
+	columns = columns[:,radixArgsort(columns[ind_id].astype(np.int64))]
+	putAllColumns(bunch,columns,attr_layout)
@@ -0,0 +1,79 @@
+##############################################################
+# This script tests the sorting of the bunch particles
+# according to the particle id numbers and compares the speed
+# with bunch_utils_functions.bunchSortId.
+# The global version is tested with several CPUs.
+##############################################################
+
+import math
+import sys
+import time
+import random
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch
+from orbit.bunch_utils import ParticleIdNumber
+
+import orbit_utils
+from orbit_utils import bunch_utils_functions
+
+from bunch_id_radix_sort import bunchSortIdIfNeeded, bunchSortIdGlobal
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+size = orbit_mpi.MPI_Comm_size(comm)
+
+if(rank == 0): print "Start."
+
+#------------------------------
+#Main Bunch init
+#------------------------------
+nParticles = 100000
+b = Bunch()
+for i in range(nParticles):
+	b.addParticle(random.random(),0.,0.,0.,0.,0.)
+	
+#----set up ids
+ParticleIdNumber.addParticleIdNumbers(b)
+
+def shuffleIds(b):
+	n_parts = b.getSize()
+	ids = [b.partAttrValue("ParticleIdNumber",i,0) for i in range(n_parts)]
+	random.shuffle(ids)
+	for i in range(n_parts):
+		b.partAttrValue("ParticleIdNumber",i,0,ids[i])
+
+#----- sorting speed measurements
+shuffleIds(b)
+time_start = time.time()
+bunch_utils_functions.bunchSortId(b)
+print "rank=",rank," bunchSortId time [sec] =",(time.time() - time_start)
+
+shuffleIds(b)
+time_start = time.time()
+bunchSortIdIfNeeded(b)
+print "rank=",rank," bunchSortIdIfNeeded time [sec] =",(time.time() - time_start)
+
+is_sorted = True
+for i in range(1,b.getSize()):
+	if(b.partAttrValue("ParticleIdNumber",i-1,0) > b.partAttrValue("ParticleIdNumber",i,0)):
+		is_sorted = False
+print "rank=",rank," sorted =",is_sorted
+
+#----- the second sort of the sorted bunch does not touch the bunch
+time_start = time.time()
+was_sorted = bunchSortIdIfNeeded(b)
+print "rank=",rank," bunchSortIdIfNeeded of sorted bunch time [sec] =",(time.time() - time_start)," resorted =",was_sorted
+
+#----- global sorting
+shuffleIds(b)
+bunchSortIdGlobal(b)
+n_parts = b.getSize()
+if(n_parts > 0):
+	id_min = b.partAttrValue("ParticleIdNumber",0,0)
+	id_max = b.partAttrValue("ParticleIdNumber",n_parts-1,0)
+	print "rank=",rank," global sort nParts=",n_parts," ids range =",id_min,id_max
+
+if(rank == 0): print "Stop."
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The apertures with the lazy compression of the bunch.
+# The LazyLossApertureNode instances do not read the bunch.
+# They register themselves as pending in the LazyLossCompactor,
+# and the compactor checks all pending apertures at once at
+# the deferred loss checkpoints: the x and y columns are
+# loaded once per checkpoint, the apertures are evaluated on
+# these columns in the lattice order, and the particle is
+# lost at the first aperture it does not pass. The lost
+# particles are deleted by Bunch.deleteParticleFast, and the
+# loss position and the coordinates at the checkpoint are
+# registered in the compactor.
+# The checkpoints are the LazyCompactionNode instances at
+# the user defined places of the lattice (they should be
+# before the collective operations - space charge,
+# statistics) and, if the maximal number of the pending
+# apertures is set, the aperture that reaches it.
+# The apertures are evaluated on the coordinates at the
+# checkpoint, not at the aperture position, so the loss
+# pattern is the same as with the native apertures only if
+# the checkpoint is at the aperture (the maximal number of
+# the pending apertures is 1) or there is no element
+# changing x,y between the apertures and the checkpoint.
+# The compactor moves all lost particles into the lost bunch
+# in one bulk insertion of the column arrays and compresses
+# the bunch at the checkpoint nodes or when the dead
+# fraction crosses the threshold.
+# The particles indexes are kept until the compaction, so
+# the lattice should not have other nodes that compress
+# the bunch between the lazy apertures.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+import numpy as np
+
+import orbit_mpi
+
+from orbit.py_linac.lattice import BaseLinacNode
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../../Bunch_Tests"))
+from bunch_columns import getCoordinate, getPartAttr, addParticles
+
+class LazyLossCompactor:
+	"""
+	Keeps the indexes, loss positions, and coordinates at the loss of the
+	dead particles of the bunch and compacts the bunch when it is necessary.
+	"""
+	def __init__(self, dead_fraction_threshold = 0.05, max_pending_apertures = None):
+		self.dead_fraction_threshold = dead_fraction_threshold
+		self.max_pending_apertures = max_pending_apertures
+		self.pending_apertures = []
+		self.dead = np.zeros(0,dtype = bool)
+		self.lost_inds = []
+		self.lost_positions = []
+		self.lost_coords = []
+		self.n_compactions = 0
+
+	def setDeadFractionThreshold(self, dead_fraction_threshold):
+		self.dead_fraction_threshold = dead_fraction_threshold
+
+	def getDeadFractionThreshold(self):
+		return self.dead_fraction_threshold
+
+	def setMaxPendingApertures(self, max_pending_apertures):
+		"""
+		Sets the maximal number of the apertures checked at once. If it is
+		None the apertures are checked at the LazyCompactionNode nodes only.
+		"""
+		self.max_pending_apertures = max_pending_apertures
+
+	def getMaxPendingApertures(self):
+		return self.max_pending_apertures
+
+	def getNumberOfCompactions(self):
+		return self.n_compactions
+
+	def addPendingAperture(self, aperture_node, bunch):
+		"""
+		Registers the aperture node to be checked at the next checkpoint.
+		The apertures are checked if the maximal number of the pending
+		apertures is reached.
+		"""
+		self.pending_apertures.append(aperture_node)
+		if(self.max_pending_apertures != None and len(self.pending_apertures) >= self.max_pending_apertures):
+			self.checkApertures(bunch)
+
+	def checkApertures(self, bunch):
+		"""
+		Checks all pending apertures on the x and y columns loaded once,
+		marks the lost particles, and returns the number of them.
+		"""
+		if(len(self.pending_apertures) == 0): return 0
+		aperture_nodes = self.pending_apertures
+		self.pending_apertures = []
+		x = getCoordinate(bunch,"x")
+		y = getCoordinate(bunch,"y")
+		dead = self.getDeadMask(bunch)
+		n_lost = 0
+		for aperture_node in aperture_nodes:
+			inds = np.nonzero(np.logical_not(aperture_node.isInside(x,y) | dead))[0]
+			if(inds.shape[0] == 0): continue
+			n_lost_node = self.markLost(bunch,inds,aperture_node.getPosition(),x,y)
+			aperture_node.n_lost += n_lost_node
+			n_lost += n_lost_node
+		return n_lost
+
+	def getDeadMask(self, bunch):
+		"""
+		Returns the boolean array of the dead particles of the bunch.
+		"""
+		if(self.dead.shape[0] != bunch.getSize()):
+			dead = np.zeros(bunch.getSize(),dtype = bool)
+			n = min(self.dead.shape[0],dead.shape[0])
+			dead[:n] = self.dead[:n]
+			self.dead = dead
+		return self.dead
+
+	def markLost(self, bunch, inds, position, x = None, y = None):
+		"""
+		Deletes the particles with the indexes by Bunch.deleteParticleFast
+		and saves their coordinates. The x and y are the already loaded
+		columns or None. The bunch is compressed later by compact().
+		"""
+		dead = self.getDeadMask(bunch)
+		inds = np.asarray(inds,dtype = np.int64)
+		inds = inds[np.logical_not(dead[inds])]
+		if(inds.shape[0] == 0): return 0
+		dead[inds] = True
+		for ind in inds.tolist():
+			(x_ind,y_ind) = (bunch.x(ind),bunch.y(ind))
+			if(x is not None): (x_ind,y_ind) = (x[ind],y[ind])
+			self.lost_coords.append((x_ind,bunch.xp(ind),y_ind,bunch.yp(ind),bunch.z(ind),bunch.dE(ind)))
+			bunch.deleteParticleFast(ind)
+		self.lost_inds.extend(inds.tolist())
+		self.lost_positions.extend([position]*inds.shape[0])
+		return inds.shape[0]
+
+	def isLost(self, ind):
+		return (ind < self.dead.shape[0] and self.dead[ind])
+
+	def getDeadFraction(self, bunch):
+		n_parts = bunch.getSize()
+		if(n_parts == 0): return 0.
+		return len(self.lost_inds)/float(n_parts)
+
+	def compactIfNeeded(self, bunch, lostbunch = None):
+		"""
+		Compacts the bunch if the dead fraction is above the threshold.
+		"""
+		if(self.getDeadFraction(bunch) > self.dead_fraction_threshold):
+			self.compact(bunch,lostbunch)
+
+	def compact(self, bunch, lostbunch = None):
+		"""
+		Checks the pending apertures, moves the dead particles into the lost
+		bunch with the coordinates at the loss and the loss positions in the
+		"LostParticleAttributes" attribute, and compresses the bunch.
+		"""
+		self.checkApertures(bunch)
+		if(len(self.lost_inds) == 0): return
+		if(lostbunch != None):
+			if(lostbunch.getSize() == 0 and len(lostbunch.getPartAttrNames()) == 0):
+				bunch.copyEmptyBunchTo(lostbunch)
+			inds = np.array(self.lost_inds,dtype = np.int64)
+			attrs = {}
+			for attr_name in bunch.getPartAttrNames():
+				if(lostbunch.hasPartAttr(attr_name) and attr_name != "LostParticleAttributes"):
+					attrs[attr_name] = getPartAttr(bunch,attr_name)[inds]
+			attrs["LostParticleAttributes"] = np.array(self.lost_positions,dtype = np.float64)[:,np.newaxis]
+			addParticles(lostbunch,np.array(self.lost_coords,dtype = np.float64),attrs)
+		bunch.compress()
+		self.dead = np.zeros(bunch.getSize(),dtype = bool)
+		self.lost_inds = []
+		self.lost_positions = []
+		self.lost_coords = []
+		self.n_compactions += 1
+
+class LazyLossApertureNode(BaseLinacNode):
+	"""
+	The aperture node that is checked by the compactor at the next
+	checkpoint. The number of the lost particles is updated at the check.
+	The shape is "circle" (a - radius) or "rectangle" (a,b - half sizes)
+	with the center at (x0,y0).
+	"""
+	def __init__(self, compactor, shape, a, b = 0., x0 = 0., y0 = 0., pos = 0., name = "LazyAperture"):
+		BaseLinacNode.__init__(self,name)
+		self.compactor = compactor
+		self.shape = shape
+		self.a = a
+		self.b = b
+		self.x0 = x0
+		self.y0 = y0
+		self.setPosition(pos)
+		self.n_lost = 0
+
+	def isInside(self, x, y):
+		"""
+		Returns True (or the boolean array for the arrays x,y) for the points inside.
+		"""
+		if(self.shape == "circle"):
+			return ((x-self.x0)**2 + (y-self.y0)**2) <= self.a**2
+		return (np.fabs(x-self.x0) <= self.a) & (np.fabs(y-self.y0) <= self.b)
+
+	def getNumberOfLost(self):
+		return self.n_lost
+
+	def track(self, paramsDict):
+		bunch = paramsDict["bunch"]
+		self.compactor.addPendingAperture(self,bunch)
+		lostbunch = None
+		if(paramsDict.has_key("lostbunch")): lostbunch = paramsDict["lostbunch"]
+		self.compactor.compactIfNeeded(bunch,lostbunch)
+
+	def trackDesign(self, paramsDict):
+		"""
+		This method does nothing for the aperture.
+		"""
+		pass
+
+class LazyCompactionNode(BaseLinacNode):
+	"""
+	The node is the loss checkpoint. It checks the pending apertures and
+	compacts the bunch unconditionally. It should be placed before the
+	collective operations (space charge, statistics) and at the end of
+	the lattice.
+	"""
+	def __init__(self, compactor, name = "LazyCompaction"):
+		BaseLinacNode.__init__(self,name)
+		self.compactor = compactor
+
+	def track(self, paramsDict):
+		lostbunch = None
+		if(paramsDict.has_key("lostbunch")): lostbunch = paramsDict["lostbunch"]
+		self.compactor.compact(paramsDict["bunch"],lostbunch)
+
+	def trackDesign(self, paramsDict):
+		"""
+		This method does nothing for this class.
+		"""
+		pass
+
+def AddLazyCompactionNodes(accLattice, compactor, name_patterns):
+	"""
+	Adds the LazyCompactionNode at the entrance of every lattice node which
+	name contains one of the name patterns and at the exit of the last node.
+	Returns the list of the added nodes.
+	"""
+	compaction_nodes = []
+	nodes = accLattice.getNodes()
+	for node in nodes:
+		for name_pattern in name_patterns:
+			if(node.getName().find(name_pattern) >= 0):
+				compaction_node = LazyCompactionNode(compactor,node.getName()+":LazyCompaction")
+				compaction_node.setSequence(node.getSequence())
+				node.addChildNode(compaction_node,node.ENTRANCE)
+				compaction_nodes.append(compaction_node)
+				break
+	if(len(nodes) > 0):
+		node = nodes[len(nodes)-1]
+		compaction_node = LazyCompactionNode(compactor,"LatticeEnd:LazyCompaction")
+		compaction_node.setSequence(node.getSequence())
+		node.addChildNode(compaction_node,node.EXIT)
+		compaction_nodes.append(compaction_node)
+	return compaction_nodes
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# Test of the lazy loss apertures. The apertures are placed
+# at the entrance of each MEBT quad. They are checked at the
+# loss checkpoints, and the bunch is compacted when the dead
+# fraction is above the threshold, before the RF gaps, and
+# at the lattice end.
+# With the check at each aperture (one pending aperture) the
+# lost and surviving particles are compared with the same
+# lattice with the native apertures. With the checks at the
+# compaction nodes only the number of particles is checked.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+import time
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
+from orbit.py_linac.lattice_modifications import GetLostDistributionArr
+
+from orbit.bunch_generators import TwissContainer
+from orbit.bunch_generators import WaterBagDist3D
+
+from orbit.py_linac.lattice import LinacApertureNode
+from orbit.bunch_utils import ParticleIdNumber
+
+from bunch import Bunch
+
+import numpy as np
+
+sys.path.append("../../Bunch_Tests")
+from bunch_columns import getCoordinates, getPartAttr
+
+from lazy_loss_apertures import LazyLossCompactor, LazyLossApertureNode, AddLazyCompactionNodes
+
+names = ["MEBT",]
+
+py_orbit_sns_home = "../"
+
+def getLattice():
+	sns_linac_factory = SNS_LinacLatticeFactory()
+	sns_linac_factory.setMaxDriftLength(0.01)
+	xml_file_name = py_orbit_sns_home+"sns_linac_xml/sns_linac.xml"
+	return sns_linac_factory.getLinacAccLattice(names,xml_file_name)
+
+aprt_radius = 0.016
+
+#---- lazy apertures at the quads' entrances, compactions before the RF gaps and at the end
+def getLazyLattice(max_pending_apertures):
+	accLattice = getLattice()
+	compactor = LazyLossCompactor(dead_fraction_threshold = 0.02,max_pending_apertures = max_pending_apertures)
+	aprtNodes = []
+	node_pos_dict = accLattice.getNodePositionsDict()
+	for node in accLattice.getQuads():
+		(posBefore, posAfter) = node_pos_dict[node]
+		aprtNode = LazyLossApertureNode(compactor,"circle",aprt_radius,pos = posBefore,name = node.getName()+":LazyAprt")
+		aprtNode.setSequence(node.getSequence())
+		node.addChildNode(aprtNode,node.ENTRANCE)
+		aprtNodes.append(aprtNode)
+	compactionNodes = AddLazyCompactionNodes(accLattice,compactor,["Rg",])
+	return (accLattice,compactor,aprtNodes)
+
+(accLattice,compactor,aprtNodes) = getLazyLattice(1)
+print "Linac lattice is ready. L=",accLattice.getLength()
+(accLatticeDeferred,compactorDeferred,aprtNodesDeferred) = getLazyLattice(None)
+
+#---- the same lattice with the native apertures
+accLatticeNative = getLattice()
+node_pos_dict = accLatticeNative.getNodePositionsDict()
+for node in accLatticeNative.getQuads():
+	(posBefore, posAfter) = node_pos_dict[node]
+	aprtNode = LinacApertureNode(1,aprt_radius,aprt_radius,posBefore,name = node.getName()+":Aprt")
+	aprtNode.setSequence(node.getSequence())
+	node.addChildNode(aprtNode,node.ENTRANCE)
+
+#---- bunch generation
+bunch = Bunch()
+bunch.mass(0.9382723 + 2*0.000511)
+bunch.charge(-1.0)
+bunch.getSyncParticle().kinEnergy(0.0025)
+
+twissX = TwissContainer(-1.39,0.126,3.67*1.0e-6*5.)
+twissY = TwissContainer( 2.92,0.281,3.74*1.0e-6*10.)
+twissZ = TwissContainer( 0.0 ,117.0,0.0166*1.0e-6)
+distributor = WaterBagDist3D(twissX,twissY,twissZ)
+for ind in range(10000):
+	(x,xp,y,yp,z,dE) = distributor.getCoordinates()
+	bunch.addParticle(x,xp,y,yp,z,dE)
+bunch.compress()
+ParticleIdNumber.addParticleIdNumbers(bunch)
+
+accLattice.trackDesignBunch(bunch)
+accLatticeDeferred.trackDesignBunch(bunch)
+accLatticeNative.trackDesignBunch(bunch)
+
+bunch_native = Bunch()
+bunch.copyBunchTo(bunch_native)
+bunch_deferred = Bunch()
+bunch.copyBunchTo(bunch_deferred)
+n_parts_init = bunch.getSize()
+
+paramsDict = {}
+lost_parts_bunch = Bunch()
+lost_parts_bunch.addPartAttr("ParticleIdNumber")
+paramsDict["lostbunch"] = lost_parts_bunch
+time_start = time.time()
+accLattice.trackBunch(bunch, paramsDict = paramsDict)
+print "lazy   tracking time [sec] =",(time.time() - time_start)
+print "compactions =",compactor.getNumberOfCompactions()
+print "particles =",bunch.getSize()," lost =",lost_parts_bunch.getSize()
+
+paramsDict = {}
+lost_parts_bunch_deferred = Bunch()
+lost_parts_bunch_deferred.addPartAttr("ParticleIdNumber")
+paramsDict["lostbunch"] = lost_parts_bunch_deferred
+time_start = time.time()
+accLatticeDeferred.trackBunch(bunch_deferred, paramsDict = paramsDict)
+print "lazy tracking with deferred checks time [sec] =",(time.time() - time_start)
+print "particles =",bunch_deferred.getSize()," lost =",lost_parts_bunch_deferred.getSize()
+
+paramsDict = {}
+lost_parts_bunch_native = Bunch()
+lost_parts_bunch_native.addPartAttr("ParticleIdNumber")
+paramsDict["lostbunch"] = lost_parts_bunch_native
+time_start = time.time()
+accLatticeNative.trackBunch(bunch_native, paramsDict = paramsDict)
+print "native tracking time [sec] =",(time.time() - time_start)
+print "particles =",bunch_native.getSize()," lost =",lost_parts_bunch_native.getSize()
+
+aprtNodes_loss_arr = GetLostDistributionArr(aprtNodes,lost_parts_bunch)
+for [aprtNode,loss] in aprtNodes_loss_arr:
+	print "aprt. node= %30s "%aprtNode.getName()," pos= %9.3f "%aprtNode.getPosition()," loss= %6.0f "%loss
+
+#---- the lazy and native results should be the same
+def getSortedColumns(b):
+	coords = getCoordinates(b)
+	ids = getPartAttr(b,"ParticleIdNumber")[:,0]
+	order = np.argsort(ids)
+	return (ids[order],coords[order])
+
+if(lost_parts_bunch.getSize() != lost_parts_bunch_native.getSize() or bunch.getSize() != bunch_native.getSize()):
+	orbit_mpi.finalize("lazy_loss_apertures_test: the numbers of the lost particles differ from the native apertures!")
+for (b,b_native,name) in ((lost_parts_bunch,lost_parts_bunch_native,"lost"),(bunch,bunch_native,"surviving")):
+	(ids,coords) = getSortedColumns(b)
+	(ids_native,coords_native) = getSortedColumns(b_native)
+	max_diff = 0.
+	if(coords.shape[0] > 0): max_diff = np.fabs(coords - coords_native).max()
+	print name," particles: max coordinates diff lazy - native =",max_diff
+	if(np.any(ids != ids_native) or max_diff > 1.0e-12):
+		orbit_mpi.finalize("lazy_loss_apertures_test: the "+name+" particles differ from the native apertures!")
+print "The lazy apertures agree with the native ones."
+
+#---- the deferred checks keep all particles, the loss pattern is approximate
+if(bunch_deferred.getSize() + lost_parts_bunch_deferred.getSize() != n_parts_init):
+	orbit_mpi.finalize("lazy_loss_apertures_test: the deferred checks do not keep the number of particles!")
+print "deferred checks lost =",lost_parts_bunch_deferred.getSize()," native lost =",lost_parts_bunch_native.getSize()
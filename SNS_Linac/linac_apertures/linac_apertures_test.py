@@ -41,6 +41,11 @@ from orbit.bunch_generators import TwissAnalysis
 from bunch import Bunch
 from bunch import BunchTwissAnalysis
 
+sys.path.append("../../Bunch_Generators_Tests")
+sys.path.append("../../Bunch_Tests")
+from batch_distributions import WaterBagDist3DBatch
+from bunch_columns import addParticles
+
 #--------------------------------------------------------
 # This is an example of the custom AccNode subclass
 # that can be added to the lattice or attached as a child
@@ -196,13 +201,11 @@ twissX = TwissContainer(alphaX,betaX,emittX)
 twissY = TwissContainer(alphaY,betaY,emittY)
 twissZ = TwissContainer(alphaZ,betaZ,emittZ)
 
-distributor = WaterBagDist3D(twissX,twissY,twissZ)
-
-for ind in range(N_particles):
-	(x,xp,y,yp,z,dE) = distributor.getCoordinates()
-	(x,xp,y,yp,z,dE) = orbit_mpi.MPI_Bcast((x,xp,y,yp,z,dE),data_type,main_rank,comm)
-	if(ind%size == rank):
-		bunch.addParticle(x,xp,y,yp,z,dE)
+#---- each CPU generates only its own part of the bunch
+distributor = WaterBagDist3DBatch(twissX,twissY,twissZ)
+ind_start = (N_particles*rank)/size
+ind_stop = (N_particles*(rank+1))/size
+addParticles(bunch,distributor.getCoordinatesRange(ind_start,ind_stop))
 		
 nParticlesGlobal = bunch.getSizeGlobal()
 if(rank == 0):
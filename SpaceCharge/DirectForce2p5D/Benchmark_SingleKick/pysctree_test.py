@@ -0,0 +1,146 @@
+#-----------------------------------------------------
+#Compares the single kick of the tree 2.5D direct force
+#calculator (sc_direct_force_tree.py) with the exact direct
+#sum and with the SpaceChargeForceCalc2p5D for the KV
+#uniform beam, and prints the errors and the times for
+#several opening angles and expansion orders.
+#The direct sum and the tree are checked against the
+#exact grid forces in exactforce.dat (see pysctest.py),
+#and the tree calculator in the direct force SC nodes of
+#the lattice is checked against the SC nodes with the
+#SpaceChargeForceCalc2p5D.
+#Run: ${ORBIT_ROOT}/bin/pyORBIT pysctree_test.py
+#-----------------------------------------------------
+import sys
+import os
+import math
+
+import numpy as np
+
+import orbit_mpi
+
+from bunch import Bunch
+from orbit.teapot import teapot
+from orbit.utils.orbit_mpi_utils import bunch_orbit_to_pyorbit
+from orbit.space_charge.directforce2p5d import directforceLatticeModifications
+from spacecharge import SpaceChargeForceCalc2p5D
+
+dir_name = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dir_name,".."))
+from sc_direct_force_tree import SpaceChargeForceCalc2p5DTree, MultipoleTree2D, getDirectField
+from sc_direct_force_tree import setTreeDirectForce2p5DAccNodes
+
+sys.path.append(os.path.join(dir_name,"../../../Bunch_Tests"))
+from bunch_columns import getCoordinates
+
+rank = orbit_mpi.MPI_Comm_rank(orbit_mpi.mpi_comm.MPI_COMM_WORLD)
+
+lattice_length = 248.0
+total_macroSize = 1.0e+14
+energy = 1.0
+
+def getBunch(fileName):
+	b = Bunch()
+	b.mass(0.93827231)
+	bunch_orbit_to_pyorbit(lattice_length,energy,os.path.join(dir_name,fileName),b)
+	b.getSyncParticle().kinEnergy(energy)
+	b.macroSize(total_macroSize/b.getSizeGlobal())
+	return b
+
+def checkError(name, error, max_error):
+	if(rank == 0):
+		print "%s rel. error = %10.3e (max %8.1e)"%(name,error,max_error)
+	if(error > max_error):
+		orbit_mpi.finalize("pysctree_test: "+name+" error is too large! error="+str(error))
+
+#---- the exact grid forces of pysctest.py for the 10 particles bunch
+b10 = getBunch("Bm_KV_Uniform_10")
+calc9 = SpaceChargeForceCalc2p5D(9,9,1)
+calc9.trackBunch(b10,lattice_length)
+rhogrid = calc9.getRhoGrid()
+(nx,ny) = (rhogrid.getSizeX(),rhogrid.getSizeY())
+z_grid = np.array([complex(rhogrid.getGridX(i),rhogrid.getGridY(j)) for i in range(nx) for j in range(ny)])
+rho_grid = np.array([rhogrid.getValueOnGrid(i,j) for i in range(nx) for j in range(ny)])
+force_exact = np.zeros(nx*ny,dtype = np.complex128)
+fl_in = open(os.path.join(dir_name,"exactforce.dat"))
+for line in fl_in:
+	vals = line.split()
+	if(len(vals) != 4): continue
+	force_exact[int(vals[0])*ny + int(vals[1])] = complex(float(vals[2]),-float(vals[3]))
+fl_in.close()
+force_norm = math.sqrt((np.abs(force_exact)**2).mean())
+field = getDirectField(z_grid,z_grid,rho_grid)
+checkError("exactforce.dat direct sum",math.sqrt((np.abs(field - force_exact)**2).mean())/force_norm,1.0e-6)
+tree = MultipoleTree2D(theta = 0.5,order = 8,leaf_size = 4)
+tree.build(z_grid,rho_grid,z_grid)
+field = tree.getField(z_grid)
+checkError("exactforce.dat tree theta=0.5 order=8",math.sqrt((np.abs(field - force_exact)**2).mean())/force_norm,1.0e-2)
+
+#---- the KV bunch
+b = getBunch("Bm_KV_Uniform_10000")
+coords_init = getCoordinates(b)
+
+def getKicks(calc):
+	b_tmp = Bunch()
+	b.copyBunchTo(b_tmp)
+	time_start = orbit_mpi.MPI_Wtime()
+	calc.trackBunch(b_tmp,lattice_length)
+	time = orbit_mpi.MPI_Wtime() - time_start
+	coords = getCoordinates(b_tmp)
+	return (coords[:,1] - coords_init[:,1],coords[:,3] - coords_init[:,3],time)
+
+(kx_exact,ky_exact,time_exact) = getKicks(SpaceChargeForceCalc2p5DTree(sizeZ = 1,theta = 0.))
+(kx_orbit,ky_orbit,time_orbit) = getKicks(SpaceChargeForceCalc2p5D(9,9,1))
+(kx_orbit64,ky_orbit64,time_orbit64) = getKicks(SpaceChargeForceCalc2p5D(64,64,1))
+k_norm = math.sqrt((kx_exact**2 + ky_exact**2).mean())
+
+def getError(kx,ky):
+	return math.sqrt(((kx - kx_exact)**2 + (ky - ky_exact)**2).mean())/k_norm
+
+error_orbit = getError(kx_orbit,ky_orbit)
+if(rank == 0):
+	print "n particles =",b.getSizeGlobal()," rms kick [rad] =",k_norm
+	print "exact direct sum               time [sec] = %8.4f "%time_exact
+	print "SpaceChargeForceCalc2p5D  9x9  time [sec] = %8.4f  rel. rms error = %10.3e "%(time_orbit,error_orbit)
+	print "SpaceChargeForceCalc2p5D 64x64 time [sec] = %8.4f  rel. rms error = %10.3e "%(time_orbit64,getError(kx_orbit64,ky_orbit64))
+#---- the exact sum and the grid direct force calculator are the same physics
+checkError("SpaceChargeForceCalc2p5D 64x64 vs exact sum",getError(kx_orbit64,ky_orbit64),0.1)
+
+for theta in (0.5,0.75,1.0):
+	for order in (0,2,4,8):
+		calc = SpaceChargeForceCalc2p5DTree(sizeZ = 1,theta = theta,order = order)
+		(kx,ky,time) = getKicks(calc)
+		error = getError(kx,ky)
+		if(rank == 0):
+			print "tree theta = %4.2f order = %d  time [sec] = %8.4f  rel. rms error = %10.3e "%(theta,order,time,error)
+		if(theta <= 0.75 and order >= 4):
+			checkError("tree vs exact sum",error,min(1.0e-2,error_orbit))
+
+#---- the tree calculator in the direct force SC nodes of the lattice
+def getLattice():
+	elem = teapot.DriftTEAPOT("a drift")
+	elem.setLength(lattice_length)
+	elem.setnParts(1)
+	lattice = teapot.TEAPOT_Lattice("teapot_lattice")
+	lattice.addNode(elem)
+	lattice.initialize()
+	return lattice
+
+lattice_tree = getLattice()
+sc_nodes = setTreeDirectForce2p5DAccNodes(lattice_tree,1.0e-8,SpaceChargeForceCalc2p5DTree(sizeZ = 1,theta = 0.5,order = 8))
+lattice_orbit = getLattice()
+directforceLatticeModifications.setDirectForce2p5DAccNodes(lattice_orbit,1.0e-8,SpaceChargeForceCalc2p5D(64,64,1))
+kicks = []
+for lattice in (lattice_tree,lattice_orbit):
+	b_tmp = Bunch()
+	b.copyBunchTo(b_tmp)
+	lattice.trackBunch(b_tmp)
+	coords = getCoordinates(b_tmp)
+	kicks.append((coords[:,1] - coords_init[:,1],coords[:,3] - coords_init[:,3]))
+if(rank == 0): print "SC nodes with the tree calculator =",len(sc_nodes)
+(kx,ky) = kicks[0]
+(kx_ref,ky_ref) = kicks[1]
+error = math.sqrt(((kx - kx_ref)**2 + (ky - ky_ref)**2).mean())/math.sqrt((kx_ref**2 + ky_ref**2).mean())
+checkError("lattice tree SC nodes vs SpaceChargeForceCalc2p5D nodes",error,0.1)
+
+print "Stop."
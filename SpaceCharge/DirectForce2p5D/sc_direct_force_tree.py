@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The 2.5D direct force space charge calculator with the
+# Barnes-Hut / multipole tree instead of the O(N^2) sum
+# over all pairs of macro-particles.
+# The transverse field of the line charges is
+#   Ex - i*Ey = sum_j m_j/(z - z_j), z = x + i*y
+# The sources are sorted into the quadtree of the square
+# root box (the levels are the uniform 2^l x 2^l grids).
+# Only the occupied cells of the level are stored: the
+# sorted unique cell ids (np.unique) and the index of the
+# occupied cell of each source, so the memory is O(N) per
+# level even if the far halo particles enlarge the box and
+# most of the cells are empty. The cells are found in the
+# sorted cell ids by the binary search (np.searchsorted).
+# The depth is adaptive: the levels are added until the
+# mean number of the sources in the cells of the sources
+# sum(n_c^2)/N is not more than leaf_size, so the dense
+# beam core does not make the near sums large. Each cell keeps the complex multipole
+# moments Q_p = sum_j m_j*(z_j - z_c)^p about its centroid
+# z_c up to the expansion order, and the far cell field is
+#   Ex - i*Ey = sum_p Q_p/(z - z_c)^(p+1)
+# The cells interact through the multipoles if they are at
+# least k = ceil(sqrt(2)/theta) cells away from the target
+# cell, where theta is the opening angle (the cell diagonal
+# over the minimal distance to the target). The expansion
+# converges for theta < 1, and its error goes as theta^(p+1).
+# At each level the target interacts with the children of
+# its parent's neighbours that are not its own neighbours
+# (the interaction list), and at the finest level the
+# neighbour cells are summed directly pair by pair. The
+# sources of the finest cells are kept in the CSR layout
+# (the sorted indexes, the starts and counts per cell), and
+# the pairs are expanded exactly without padding.
+# The transverse kicks are the same as in the direct force
+# 2.5D calculator:
+#   dxp = 2*r0*L/(beta^2*gamma^3) * lambda(z)/Q * Ex
+# where lambda(z) is the longitudinal line density from the
+# sizeZ bins (with sizeZ = 1 it is Q/(z_max - z_min)).
+# The sources are gathered from all CPUs by the pairwise raw
+# bytes messages (allgatherColumns of bunch_mpi_exchange.py),
+# and every CPU calculates the field only for its own
+# particles.
+# The setTreeDirectForce2p5DAccNodes(...) function puts the
+# calculator into the lattice with the standard direct force
+# 2.5D SC nodes of directforceLatticeModifications.
+# The theta = 0 means the exact direct sum (for checks).
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+from orbit.space_charge.directforce2p5d import directforceLatticeModifications
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../../Bunch_Tests"))
+from bunch_columns import BunchColumns
+from bunch_mpi_exchange import allgatherColumns
+
+MAX_TREE_DEPTH = 12
+
+def getDirectField(z_t, z_s, m_s, softening = 0., chunk_size = 1024):
+	"""
+	Returns the complex field Ex - i*Ey at the targets z_t from the
+	sources (z_s, m_s) by the direct sum. The coinciding points are skipped.
+	"""
+	field = np.zeros(z_t.shape[0],dtype = np.complex128)
+	for ind_start in xrange(0,z_t.shape[0],chunk_size):
+		d = z_t[ind_start:ind_start+chunk_size,np.newaxis] - z_s[np.newaxis,:]
+		field[ind_start:ind_start+chunk_size] = _sumPairs(d,m_s[np.newaxis,:],softening)
+	return field
+
+def _sumPairs(d, m, softening):
+	r2 = d.real*d.real + d.imag*d.imag
+	valid = (r2 > 0.) & (m != 0.)
+	r2 = np.where(valid,r2 + softening*softening,1.0)
+	return (np.where(valid,m,0.)*d.conj()/r2).sum(axis = 1)
+
+def _getInteractionOffsets(k):
+	"""
+	Returns the dictionary {(parity_x,parity_y):[(dx,dy),...]} of the offsets
+	of the far cells for the target cell parity and the list of the near offsets.
+	"""
+	far_offsets = {}
+	for px in (0,1):
+		for py in (0,1):
+			offsets = []
+			for dx in range(-2*k-2,2*k+3):
+				if(abs((px + dx)//2) > k): continue
+				for dy in range(-2*k-2,2*k+3):
+					if(abs((py + dy)//2) > k): continue
+					if(max(abs(dx),abs(dy)) > k): offsets.append((dx,dy))
+			far_offsets[(px,py)] = offsets
+	near_offsets = [(dx,dy) for dx in range(-k,k+1) for dy in range(-k,k+1)]
+	return (far_offsets,near_offsets)
+
+class _TreeLevel:
+	"""
+	The multipoles of the occupied level cells: the sorted cell ids, the
+	index of the occupied cell for each source, the centroids and the
+	moments Q_p.
+	"""
+	def __init__(self, n_side, cell_size, cell_ids, source_cells, centroids, moments):
+		self.n_side = n_side
+		self.cell_size = cell_size
+		self.cell_ids = cell_ids
+		self.source_cells = source_cells
+		self.centroids = centroids
+		self.moments = moments
+
+	def getCellIndexes(self, cells):
+		"""
+		Returns the indexes of the cells with the ids in the occupied cells
+		arrays and the boolean array of the occupied ones.
+		"""
+		inds = np.searchsorted(self.cell_ids,cells)
+		inds = np.minimum(inds,self.cell_ids.shape[0]-1)
+		return (inds,self.cell_ids[inds] == cells)
+
+class MultipoleTree2D:
+	"""
+	The quadtree of the 2D line charges with the complex multipole moments.
+	"""
+	def __init__(self, theta = 0.75, order = 4, leaf_size = 16, softening = 0.):
+		self.theta = theta
+		self.order = order
+		self.leaf_size = leaf_size
+		self.softening = softening
+		self.n_far = 0
+		self.n_near = 0
+
+	def getNeighbourDistance(self):
+		"""
+		Returns the number of cells k between the target cell and the far cells.
+		"""
+		return max(1,int(math.ceil(math.sqrt(2.0)/self.theta - 1.0e-12)))
+
+	def getDepth(self):
+		"""
+		Returns the number of the levels of the last built tree.
+		"""
+		return len(self.levels)
+
+	def _getCells(self, z, n_side, cell_size):
+		ix = np.clip(np.floor((z.real - self.origin.real)/cell_size).astype(np.int64),0,n_side-1)
+		iy = np.clip(np.floor((z.imag - self.origin.imag)/cell_size).astype(np.int64),0,n_side-1)
+		return (ix,iy)
+
+	def build(self, z_s, m_s, z_t):
+		"""
+		Builds the tree of the sources in the root box covering the sources and targets.
+		"""
+		self.z_s = z_s
+		self.m_s = m_s
+		self.levels = []
+		if(z_s.shape[0] == 0): return
+		z_all = np.concatenate((z_s,z_t))
+		(x_min,x_max) = (z_all.real.min(),z_all.real.max())
+		(y_min,y_max) = (z_all.imag.min(),z_all.imag.max())
+		box_size = max(x_max - x_min,y_max - y_min,1.0e-12)*(1.0 + 1.0e-9)
+		self.origin = complex(x_min,y_min)
+		self.box_size = box_size
+		n_sources = z_s.shape[0]
+		for level in range(1,MAX_TREE_DEPTH+1):
+			n_side = 2**level
+			cell_size = box_size/n_side
+			(ix,iy) = self._getCells(z_s,n_side,cell_size)
+			(cell_ids,cells) = np.unique(ix*n_side + iy,return_inverse = True)
+			n_cells = cell_ids.shape[0]
+			mass = np.bincount(cells,weights = m_s,minlength = n_cells)
+			mx = np.bincount(cells,weights = m_s*z_s.real,minlength = n_cells)
+			my = np.bincount(cells,weights = m_s*z_s.imag,minlength = n_cells)
+			#---- the cells with the zero charge get the geometric centers, their moments are zeros
+			centers = self.origin + cell_size*((cell_ids//n_side + 0.5) + 1j*(cell_ids%n_side + 0.5))
+			non_empty = mass != 0.
+			centroids = np.where(non_empty,(mx + 1j*my)/np.where(non_empty,mass,1.0),centers)
+			w = z_s - centroids[cells]
+			moments = [mass.astype(np.complex128)]
+			w_p = np.ones(z_s.shape[0],dtype = np.complex128)
+			for p in range(1,self.order+1):
+				w_p = w_p*w
+				if(p == 1):
+					moments.append(np.zeros(n_cells,dtype = np.complex128))
+					continue
+				vals = m_s*w_p
+				moments.append(np.bincount(cells,weights = vals.real,minlength = n_cells) + 1j*np.bincount(cells,weights = vals.imag,minlength = n_cells))
+			self.levels.append(_TreeLevel(n_side,cell_size,cell_ids,cells,centroids,moments))
+			counts = np.bincount(cells,minlength = n_cells).astype(np.float64)
+			if((counts*counts).sum() <= self.leaf_size*n_sources): break
+
+	def _getFarField(self, z_t, field):
+		(far_offsets,near_offsets) = _getInteractionOffsets(self.getNeighbourDistance())
+		for tree_level in self.levels:
+			n_side = tree_level.n_side
+			(tx,ty) = self._getCells(z_t,n_side,tree_level.cell_size)
+			for (px,py) in far_offsets.keys():
+				sel = np.nonzero(((tx & 1) == px) & ((ty & 1) == py))[0]
+				if(sel.shape[0] == 0): continue
+				for (dx,dy) in far_offsets[(px,py)]:
+					(cx,cy) = (tx[sel] + dx,ty[sel] + dy)
+					valid = (cx >= 0) & (cx < n_side) & (cy >= 0) & (cy < n_side)
+					if(not valid.any()): continue
+					(cells,occupied) = tree_level.getCellIndexes(cx[valid]*n_side + cy[valid])
+					if(not occupied.any()): continue
+					inds = sel[valid][occupied]
+					cells = cells[occupied]
+					inv_d = 1.0/(z_t[inds] - tree_level.centroids[cells])
+					inv_d_p = inv_d
+					vals = tree_level.moments[0][cells]*inv_d_p
+					for p in range(2,self.order+1):
+						inv_d_p = inv_d_p*inv_d
+						vals += tree_level.moments[p][cells]*inv_d_p*inv_d
+					field[inds] += vals
+					self.n_far += inds.shape[0]
+
+	def _getNearField(self, z_t, field, chunk_size = 1024):
+		tree_level = self.levels[len(self.levels)-1]
+		n_side = tree_level.n_side
+		n_cells = tree_level.cell_ids.shape[0]
+		(far_offsets,near_offsets) = _getInteractionOffsets(self.getNeighbourDistance())
+		#---- CSR: the sources of the occupied cell c are order[starts[c]:starts[c]+counts[c]]
+		order = np.argsort(tree_level.source_cells,kind = "stable")
+		counts = np.bincount(tree_level.source_cells,minlength = n_cells)
+		starts = np.cumsum(counts) - counts
+		(tx,ty) = self._getCells(z_t,n_side,tree_level.cell_size)
+		soft2 = self.softening*self.softening
+		for ind_start in xrange(0,z_t.shape[0],chunk_size):
+			(ctx,cty) = (tx[ind_start:ind_start+chunk_size],ty[ind_start:ind_start+chunk_size])
+			z_chunk = z_t[ind_start:ind_start+chunk_size]
+			n_chunk = z_chunk.shape[0]
+			for (dx,dy) in near_offsets:
+				(cx,cy) = (ctx + dx,cty + dy)
+				t_inds = np.nonzero((cx >= 0) & (cx < n_side) & (cy >= 0) & (cy < n_side))[0]
+				if(t_inds.shape[0] == 0): continue
+				(cells,occupied) = tree_level.getCellIndexes(cx[t_inds]*n_side + cy[t_inds])
+				n_pairs = np.where(occupied,counts[cells],0)
+				n_total = int(n_pairs.sum())
+				if(n_total == 0): continue
+				#---- the (target, source) pairs of the chunk
+				pair_t = np.repeat(t_inds,n_pairs)
+				pair_first = np.repeat(starts[cells] - (np.cumsum(n_pairs) - n_pairs),n_pairs)
+				pair_s = order[pair_first + np.arange(n_total)]
+				d = z_chunk[pair_t] - self.z_s[pair_s]
+				r2 = d.real*d.real + d.imag*d.imag
+				m = self.m_s[pair_s]
+				valid = (r2 > 0.) & (m != 0.)
+				vals = np.where(valid,m,0.)*d.conj()/np.where(valid,r2 + soft2,1.0)
+				field[ind_start:ind_start+n_chunk] += np.bincount(pair_t,weights = vals.real,minlength = n_chunk) + 1j*np.bincount(pair_t,weights = vals.imag,minlength = n_chunk)
+				self.n_near += n_total
+
+	def getField(self, z_t):
+		"""
+		Returns the complex field Ex - i*Ey of the tree sources at the targets.
+		"""
+		field = np.zeros(z_t.shape[0],dtype = np.complex128)
+		if(z_t.shape[0] == 0 or len(self.levels) == 0): return field
+		self._getFarField(z_t,field)
+		self._getNearField(z_t,field)
+		return field
+
+class SpaceChargeForceCalc2p5DTree:
+	"""
+	The 2.5D direct force space charge calculator with the multipole tree.
+	It has the same trackBunch(bunch, length) method as SpaceChargeForceCalc2p5D.
+	"""
+	def __init__(self, sizeZ = 1, theta = 0.75, order = 4, leaf_size = 16, softening = 0., comm = mpi_comm.MPI_COMM_WORLD):
+		self.sizeZ = sizeZ
+		self.tree = MultipoleTree2D(theta,order,leaf_size,softening)
+		self.comm = comm
+		self.time_field = 0.
+
+	def setOpeningAngle(self, theta):
+		"""
+		Sets the opening angle. The theta = 0 means the exact direct sum.
+		"""
+		self.tree.theta = theta
+
+	def getOpeningAngle(self):
+		return self.tree.theta
+
+	def setExpansionOrder(self, order):
+		"""
+		Sets the maximal order of the multipole moments (0 - the monopoles).
+		"""
+		self.tree.order = order
+
+	def getExpansionOrder(self):
+		return self.tree.order
+
+	def getTime(self):
+		"""
+		Returns the accumulated time of the field calculations of this CPU.
+		"""
+		return self.time_field
+
+	def getInteractionCounts(self):
+		"""
+		Returns the accumulated numbers of the (particle-cell, particle-particle) interactions.
+		"""
+		return (self.tree.n_far,self.tree.n_near)
+
+	def _gatherSources(self, x, y, m_sizes):
+		"""
+		Returns the (x,y,macrosize) arrays of the particles of all CPUs.
+		"""
+		if(orbit_mpi.MPI_Comm_size(self.comm) == 1): return (x,y,m_sizes)
+		arr = allgatherColumns(self.comm,np.vstack((x,y,m_sizes)))
+		return (arr[0],arr[1],arr[2])
+
+	def _getLongFactors(self, z, m_sizes):
+		"""
+		Returns the line density lambda(z)/Q for the particles.
+		"""
+		z_min = orbit_mpi.MPI_Allreduce(float(z.min()) if z.shape[0] > 0 else 1.0e+300,mpi_datatype.MPI_DOUBLE,mpi_op.MPI_MIN,self.comm)
+		z_max = orbit_mpi.MPI_Allreduce(float(z.max()) if z.shape[0] > 0 else -1.0e+300,mpi_datatype.MPI_DOUBLE,mpi_op.MPI_MAX,self.comm)
+		length = max(z_max - z_min,1.0e-12)
+		nz = self.sizeZ
+		if(nz < 2):
+			return np.zeros(z.shape[0]) + 1.0/length
+		step = length/(nz-1)
+		g = (z - z_min)/step
+		ind = np.clip(np.floor(g).astype(np.int64),0,nz-2)
+		frac = g - ind
+		hist = np.bincount(ind,weights = (1.0 - frac)*m_sizes,minlength = nz) + np.bincount(ind+1,weights = frac*m_sizes,minlength = nz)
+		hist = np.array(orbit_mpi.MPI_Allreduce(tuple(hist.tolist()),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,self.comm))
+		#---- the end points have the half widths
+		widths = np.zeros(nz) + step
+		widths[0] = widths[nz-1] = 0.5*step
+		density = hist/widths/max(hist.sum(),1.0e-300)
+		return (1.0 - frac)*density[ind] + frac*density[ind+1]
+
+	def trackBunch(self, bunch, length):
+		"""
+		Applies the space charge kicks for the path length to the bunch. It is collective.
+		"""
+		columns = BunchColumns(bunch)
+		coords = columns.coords
+		(x,y) = (coords[:,0],coords[:,2])
+		if(bunch.hasPartAttr("macrosize")):
+			m_sizes = columns.attr("macrosize")[:,0]
+		else:
+			m_sizes = np.zeros(coords.shape[0]) + bunch.macroSize()
+		long_factors = self._getLongFactors(coords[:,4],m_sizes)
+		(x_s,y_s,m_s) = self._gatherSources(x,y,m_sizes)
+		if(x_s.shape[0] == 0): return
+		time_start = orbit_mpi.MPI_Wtime()
+		z_t = x + 1j*y
+		z_s = x_s + 1j*y_s
+		if(self.tree.theta <= 0.):
+			field = getDirectField(z_t,z_s,m_s,self.tree.softening)
+		else:
+			self.tree.build(z_s,m_s,z_t)
+			field = self.tree.getField(z_t)
+		self.time_field += orbit_mpi.MPI_Wtime() - time_start
+		syncPart = bunch.getSyncParticle()
+		(beta,gamma) = (syncPart.beta(),syncPart.gamma())
+		coeff = 2*bunch.classicalRadius()*length/(beta*beta*gamma*gamma*gamma)
+		columns.xp += coeff*long_factors*field.real
+		columns.yp += -coeff*long_factors*field.imag
+		columns.putBack()
+
+def setTreeDirectForce2p5DAccNodes(lattice, sc_path_length_min, calc):
+	"""
+	Puts the direct force 2.5D SC nodes with the tree calculator into
+	the lattice and returns the list of the SC nodes.
+	"""
+	return directforceLatticeModifications.setDirectForce2p5DAccNodes(lattice,sc_path_length_min,calc)
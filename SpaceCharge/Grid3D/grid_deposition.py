@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The vectorized charge deposition and field interpolation
+# on the 1D, 2D, and 3D grids (NumPy C-ordered arrays) with
+# the selectable shape functions:
+#   "NGP" - nearest grid point (1 point per dimension)
+#   "CIC" - cloud in cell, linear (2 points per dimension)
+#   "TSC" - triangular shaped cloud, quadratic (3 points)
+# The grid points are u_min + i*(u_max - u_min)/(n-1) as
+# in Grid1D, Grid2D, and Grid3D. The particles outside
+# [u_min,u_max] deposit nothing and get zero interpolated
+# values. For the particles inside the grid the weights of
+# the stencil points outside the grid (TSC near the edges)
+# are folded into the edge points, so the deposited charge
+# of the inside particles is conserved exactly.
+# The stencil points are generated and accumulated one at a
+# time, so the memory is the few arrays of the particle chunk
+# size for any shape function. The particles are split
+# into chunks by the KernelThreadPool (Bunch_Tests), each
+# thread deposits into its own private grid, and the grids
+# are summed. The interpolation of the values and of all
+# gradient components is done for all particles at once.
+# The gridToArray and arrayToGrid functions copy the values
+# between the NumPy arrays and Grid2D or Grid3D. The Grid
+# classes do not expose their memory, so the copies use
+# the per-cell getValueOnGrid/setValue calls driven by the
+# C-level iterators (as in bunch_columns.py).
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+import itertools
+
+from itertools import imap
+
+import numpy as np
+
+import orbit_mpi
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../../Bunch_Tests"))
+from bunch_thread_pool import KernelThreadPool
+
+SHAPES = ("NGP","CIC","TSC")
+
+def _maskStencilPoint(ind, weights, n, inside):
+	"""
+	Returns the (indexes, weights) with the outside points of the inside
+	particles moved to the edge points and with zero weights for the
+	particles outside the grid.
+	"""
+	return (np.where(inside,np.clip(ind,0,n-1),0),np.where(inside,weights,0.))
+
+def getShapeStencil(u, u_min, u_max, n, shape = "CIC"):
+	"""
+	Returns the list of (indexes, weights) arrays for one dimension.
+	The stencil points outside the grid are moved to the edge points,
+	and the weights of the particles outside the grid are zeros.
+	"""
+	step = (u_max - u_min)/(n - 1)
+	g = (u - u_min)/step
+	inside = (g >= 0.) & (g <= n - 1)
+	if(shape == "NGP"):
+		ind = np.floor(g + 0.5).astype(np.int64)
+		return [_maskStencilPoint(ind,np.ones(u.shape[0],dtype = np.float64),n,inside),]
+	if(shape == "CIC"):
+		ind = np.floor(g).astype(np.int64)
+		f = g - ind
+		return [_maskStencilPoint(ind,1.0 - f,n,inside),_maskStencilPoint(ind + 1,f,n,inside)]
+	if(shape == "TSC"):
+		ind = np.floor(g + 0.5).astype(np.int64)
+		d = g - ind
+		return [_maskStencilPoint(ind - 1,0.5*(0.5 - d)**2,n,inside),_maskStencilPoint(ind,0.75 - d*d,n,inside),_maskStencilPoint(ind + 1,0.5*(0.5 + d)**2,n,inside)]
+	orbit_mpi.finalize("grid_deposition: unknown shape = "+str(shape))
+
+def _iterStencilND(coords, extents, sizes, shape):
+	"""
+	Yields the (flat indexes, weights) for the stencil points in N dimensions
+	one at a time.
+	"""
+	stencils = []
+	for ind in range(len(sizes)):
+		(u_min,u_max) = extents[ind]
+		stencils.append(getShapeStencil(coords[ind],u_min,u_max,sizes[ind],shape))
+	for points in itertools.product(*stencils):
+		flat_inds = points[0][0]
+		weights = points[0][1]
+		for ind in range(1,len(points)):
+			flat_inds = flat_inds*sizes[ind] + points[ind][0]
+			weights = weights*points[ind][1]
+		yield (flat_inds,weights)
+
+def _depositKernel(arrays, extents, sizes, shape):
+	coords = arrays[:-1]
+	values = arrays[-1]
+	n_total = int(np.prod(sizes))
+	grid = np.zeros(n_total,dtype = np.float64)
+	for (flat_inds,weights) in _iterStencilND(coords,extents,sizes,shape):
+		grid += np.bincount(flat_inds,weights = weights*values,minlength = n_total)
+	return grid
+
+def deposit(coords, values, extents, sizes, shape = "CIC", pool = None):
+	"""
+	Returns the grid array with the shape sizes with the deposited values.
+	The coords is the list of the coordinates arrays (one per dimension),
+	the extents is the list of (u_min,u_max), and values is the array of
+	the charges or a scalar.
+	"""
+	coords = [np.asarray(u,dtype = np.float64) for u in coords]
+	values = np.asarray(values,dtype = np.float64)
+	if(values.ndim == 0): values = np.zeros(coords[0].shape[0]) + values
+	if(pool == None): pool = KernelThreadPool(1)
+	grid = pool.reduce(_depositKernel,coords + [values,],extents,sizes,shape)
+	return grid.reshape(sizes)
+
+def _interpolateKernel(arrays, grids, extents, sizes, shape):
+	n_dim = len(sizes)
+	coords = arrays[:n_dim]
+	outs = arrays[n_dim:]
+	for out in outs:
+		out.fill(0.)
+	for (flat_inds,weights) in _iterStencilND(coords,extents,sizes,shape):
+		for ind in range(len(grids)):
+			outs[ind] += weights*grids[ind][flat_inds]
+
+def interpolate(grids, coords, extents, shape = "CIC", pool = None):
+	"""
+	Returns the list of the arrays with the values of the grids at the particles.
+	All grids should have the same shape. The stencil is computed once for all grids.
+	"""
+	sizes = grids[0].shape
+	coords = [np.asarray(u,dtype = np.float64) for u in coords]
+	flat_grids = [np.ascontiguousarray(grid).ravel() for grid in grids]
+	outs = [np.zeros(coords[0].shape[0],dtype = np.float64) for grid in grids]
+	if(pool == None): pool = KernelThreadPool(1)
+	pool.run(_interpolateKernel,coords + outs,flat_grids,extents,sizes,shape)
+	return outs
+
+def interpolateGradient(grid, coords, extents, shape = "CIC", pool = None):
+	"""
+	Returns the list of the gradient components of the grid at the particles.
+	"""
+	steps = []
+	for ind in range(grid.ndim):
+		(u_min,u_max) = extents[ind]
+		steps.append((u_max - u_min)/(grid.shape[ind] - 1))
+	grads = np.gradient(grid,*steps)
+	if(grid.ndim == 1): grads = [grads,]
+	return interpolate(list(grads),coords,extents,shape,pool)
+
+def _getCellIndexes(shape):
+	"""
+	Returns the list of the C-ordered index arrays of all cells.
+	"""
+	return [inds.ravel() for inds in np.indices(shape)]
+
+def gridToArray(grid):
+	"""
+	Returns the NumPy array with the values of Grid2D or Grid3D.
+	"""
+	if(hasattr(grid,"getSizeZ")):
+		shape = (grid.getSizeX(),grid.getSizeY(),grid.getSizeZ())
+	else:
+		shape = (grid.getSizeX(),grid.getSizeY())
+	inds = [ind_arr.tolist() for ind_arr in _getCellIndexes(shape)]
+	n_cells = int(np.prod(shape))
+	return np.fromiter(imap(grid.getValueOnGrid,*inds),dtype = np.float64,count = n_cells).reshape(shape)
+
+def arrayToGrid(arr, grid):
+	"""
+	Sets the values of Grid2D or Grid3D from the NumPy array.
+	"""
+	inds = [ind_arr.tolist() for ind_arr in _getCellIndexes(arr.shape)]
+	map(grid.setValue,np.ascontiguousarray(arr,dtype = np.float64).ravel().tolist(),*inds)
+
+def getGridExtents(grid):
+	"""
+	Returns the list of (u_min,u_max) of Grid2D or Grid3D.
+	"""
+	extents = [(grid.getMinX(),grid.getMaxX()),(grid.getMinY(),grid.getMaxY())]
+	if(hasattr(grid,"getSizeZ")):
+		extents.append((grid.getMinZ(),grid.getMaxZ()))
+	return extents
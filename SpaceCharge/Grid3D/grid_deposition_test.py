@@ -0,0 +1,115 @@
+#-----------------------------------------------------
+#The tests of the vectorized deposition and interpolation
+#for the NGP, CIC, and TSC shape functions:
+# 1. the charge conservation (also for the particles near the
+#    edges) and threads vs no threads
+# 2. the point charge potential with PoissonSolverFFT3D
+#    compared with the exact 1/r (as sc_3D_Poisson_Exact_test.py)
+# 3. the batched gradient interpolation for 1/(x^2+y^2+z^2)
+#The number of threads: ORBIT_NUM_THREADS=4 ./START.sh grid_deposition_test.py 1
+#-----------------------------------------------------
+
+import sys
+import os
+import math
+import time
+
+import numpy as np
+
+from spacecharge import Grid3D
+from spacecharge import PoissonSolverFFT3D
+
+from grid_deposition import SHAPES, deposit, interpolate, interpolateGradient, arrayToGrid, gridToArray
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../../Bunch_Tests"))
+from bunch_thread_pool import KernelThreadPool
+
+print "Start."
+
+pool = KernelThreadPool()
+rng = np.random.RandomState(1)
+
+#---- 1. charge conservation and threads
+sizes = (64,64,64)
+extents = [(-5.0,5.0),(-5.5,5.5),(-6.0,6.0)]
+n_parts = 1000000
+coords = [rng.uniform(u_min,u_max,n_parts) for (u_min,u_max) in extents]
+for shape in SHAPES:
+	time_start = time.time()
+	grid = deposit(coords,1.0,extents,sizes,shape)
+	time_single = time.time() - time_start
+	time_start = time.time()
+	grid_threads = deposit(coords,1.0,extents,sizes,shape,pool)
+	time_threads = time.time() - time_start
+	print "%s total charge = %12.5f threads diff = %10.3e time single = %7.3f threads(%d) = %7.3f"%(shape,grid.sum(),np.abs(grid - grid_threads).max(),time_single,pool.getNumberOfThreads(),time_threads)
+	if(math.fabs(grid.sum() - n_parts) > 1.0e-9*n_parts or np.abs(grid - grid_threads).max() > 1.0e-9):
+		print "The charge of the inside particles is not conserved or the threads differ!"
+		sys.exit(1)
+
+#---- the particles inside near the edges keep all charge
+for shape in SHAPES:
+	coords_edge = [np.array([u_min,u_min + 1.0e-3*(u_max - u_min),u_max]) for (u_min,u_max) in extents]
+	grid = deposit(coords_edge,1.0,extents,sizes,shape)
+	print "%s edge particles deposited = %12.9f of 3"%(shape,grid.sum())
+	if(math.fabs(grid.sum() - 3.0) > 1.0e-12 or grid.min() < 0.):
+		print "The charge of the particles near the edges is lost!"
+		sys.exit(1)
+
+#---- the particles outside the grid deposit nothing, no weights are negative
+coords_out = [rng.uniform(u_min - 1.0,u_max + 1.0,n_parts) for (u_min,u_max) in extents]
+for shape in SHAPES:
+	grid = deposit(coords_out,1.0,extents,sizes,shape,pool)
+	outside = np.zeros(n_parts,dtype = bool)
+	for ind in range(3):
+		(u_min,u_max) = extents[ind]
+		outside |= (coords_out[ind] < u_min) | (coords_out[ind] > u_max)
+	print "%s min grid value = %10.3e deposited = %12.1f inside particles = %d"%(shape,grid.min(),grid.sum(),n_parts - outside.sum())
+	if(grid.min() < 0. or math.fabs(grid.sum() - (n_parts - outside.sum())) > 1.0e-9*n_parts):
+		print "The off-grid particles are deposited or the weights are negative!"
+		sys.exit(1)
+
+#---- 2. point charge at the grid point
+solver = PoissonSolverFFT3D(sizes[0],sizes[1],sizes[2],extents[0][0],extents[0][1],extents[1][0],extents[1][1],extents[2][0],extents[2][1])
+steps = [(u_max - u_min)/(n - 1) for ((u_min,u_max),n) in zip(extents,sizes)]
+ind0 = [n/2 for n in sizes]
+pos0 = [extents[ind][0] + ind0[ind]*steps[ind] for ind in range(3)]
+for shape in SHAPES:
+	rho = deposit([np.array([u]) for u in pos0],1.0,extents,sizes,shape)
+	gridRho = Grid3D(sizes[0],sizes[1],sizes[2])
+	gridPhi = Grid3D(sizes[0],sizes[1],sizes[2])
+	for (grid3D,ind) in ((gridRho,0),(gridPhi,1)):
+		grid3D.setGridX(extents[0][0],extents[0][1])
+		grid3D.setGridY(extents[1][0],extents[1][1])
+		grid3D.setGridZ(extents[2][0],extents[2][1])
+	arrayToGrid(rho,gridRho)
+	solver.findPotential(gridRho,gridPhi)
+	phi = gridToArray(gridPhi)
+	#---- the test points far from the charge
+	test_coords = [rng.uniform(u_min*0.8,u_max*0.8,1000) for (u_min,u_max) in extents]
+	dist = np.sqrt(sum([(test_coords[ind] - pos0[ind])**2 for ind in range(3)]))
+	mask = dist > 3*math.sqrt(sum([step**2 for step in steps]))
+	test_coords = [u[mask] for u in test_coords]
+	dist = dist[mask]
+	phi_vals = interpolate([phi,],test_coords,extents,shape,pool)[0]
+	grads = interpolateGradient(phi,test_coords,extents,shape,pool)
+	grad_th = [-(test_coords[ind] - pos0[ind])/dist**3 for ind in range(3)]
+	grad_diff = np.sqrt(sum([(grads[ind] - grad_th[ind])**2 for ind in range(3)]))/np.sqrt(sum([g**2 for g in grad_th]))
+	print "%s point charge: max phi deviation [%%] = %8.4f max gradient deviation [%%] = %8.4f"%(shape,100*np.abs(phi_vals*dist - 1.0).max(),100*grad_diff.max())
+
+#---- 3. gradient interpolation of the analytic function
+sizes = (50,50,50)
+extents = [(2.0,4.0),(1.0,4.0),(1.0,4.0)]
+axes = [np.linspace(u_min,u_max,n) for ((u_min,u_max),n) in zip(extents,sizes)]
+(X,Y,Z) = np.meshgrid(axes[0],axes[1],axes[2],indexing = "ij")
+func_grid = 1.0/(X*X + Y*Y + Z*Z)
+#---- the stencils of the points 2 steps from the edges are inside the grid
+margins = [2*(u_max - u_min)/(n - 1) for ((u_min,u_max),n) in zip(extents,sizes)]
+test_coords = [rng.uniform(u_min + margin,u_max - margin,100000) for ((u_min,u_max),margin) in zip(extents,margins)]
+r2 = sum([u*u for u in test_coords])
+for shape in SHAPES:
+	grads = interpolateGradient(func_grid,test_coords,extents,shape,pool)
+	diff = np.sqrt(sum([(grads[ind] + 2*test_coords[ind]/r2**2)**2 for ind in range(3)]))
+	print "%s gradient of 1/r^2 max diff = %12.5g "%(shape,diff.max())
+
+pool.close()
+print "Stop."
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The process-wide cache of the space charge objects with
+# the FFT plans and Green functions inside: the Poisson
+# solvers (PoissonSolverFFT2D, PoissonSolverFFT3D), the
+# calculators (SpaceChargeCalc2p5D, SpaceChargeCalc3D,
+# SpaceChargeCalcSliceBySlice2D, ...), and the boundaries
+# (Boundary2D). The objects are keyed by the class and the
+# constructor arguments (grid sizes, extents, boundary
+# shape), so the SC nodes and scripts with the same geometry
+# share one object instead of recomputing the FFT plans and
+# the Green functions. The least recently used objects are
+# evicted when the cache is full.
+# The shared calculators keep their rho and phi grids from the
+# last trackBunch(...) call. Each call rebins the grids, so the
+# sequential use by the SC nodes of several lattices gives the
+# same results as the separate calculators (it is checked by
+# poisson_solver_cache_test.py), but the grids read after the
+# tracking belong to the last node that used the calculator.
+# The user should not change the shared objects (e.g. the grid
+# extents of the solver).
+# The setCachedSC2p5DAccNodes(...) and setCachedSC3DAccNodes(...)
+# functions are the node setup functions setSC2p5DAccNodes(...)
+# and setSC3DAccNodes(...) with the calculators and the boundary
+# from the cache.
+# Usage:
+#   cache = getSolverCache()
+#   solver = cache.get(PoissonSolverFFT2D,sizeX,sizeY,xMin,xMax,yMin,yMax)
+#   calc2p5d = cache.get(SpaceChargeCalc2p5D,sizeX,sizeY,sizeZ)
+#   sc_nodes = setCachedSC2p5DAccNodes(lattice,0.1,(sizeX,sizeY,sizeZ),(32,10,"Circle",0.22))
+#--------------------------------------------------------
+
+import sys
+
+from collections import OrderedDict
+
+from spacecharge import SpaceChargeCalc2p5D, SpaceChargeCalc3D
+from spacecharge import Boundary2D
+
+from orbit.space_charge.sc2p5d import scLatticeModifications
+from orbit.space_charge.sc3d import setSC3DAccNodes
+
+class SolverCache:
+	"""
+	The LRU cache of the objects created by constructor(*args).
+	"""
+	def __init__(self, max_size = 16):
+		self.max_size = max_size
+		self.objects = OrderedDict()
+		self.n_hits = 0
+		self.n_misses = 0
+		self.n_evictions = 0
+
+	def setMaxSize(self, max_size):
+		self.max_size = max_size
+		self._evict()
+
+	def getMaxSize(self):
+		return self.max_size
+
+	def get(self, constructor, *args):
+		"""
+		Returns the cached object constructor(*args) or creates it.
+		The arguments should be hashable (numbers, strings).
+		"""
+		key = (constructor,args)
+		if(self.objects.has_key(key)):
+			obj = self.objects.pop(key)
+			self.objects[key] = obj
+			self.n_hits += 1
+			return obj
+		obj = constructor(*args)
+		self.objects[key] = obj
+		self.n_misses += 1
+		self._evict()
+		return obj
+
+	def release(self, constructor, *args):
+		"""
+		Removes the object from the cache. The users still keep their references.
+		"""
+		key = (constructor,args)
+		if(self.objects.has_key(key)):
+			del self.objects[key]
+
+	def _evict(self):
+		while(len(self.objects) > self.max_size):
+			self.objects.popitem(last = False)
+			self.n_evictions += 1
+
+	def clear(self):
+		self.objects.clear()
+
+	def getStatistics(self):
+		"""
+		Returns the dictionary with the number of objects, hits, misses, and evictions.
+		"""
+		return {"objects":len(self.objects),"hits":self.n_hits,"misses":self.n_misses,"evictions":self.n_evictions}
+
+#---- the process-wide cache
+_solver_cache = SolverCache()
+
+def getSolverCache():
+	"""
+	Returns the process-wide cache.
+	"""
+	return _solver_cache
+
+def setCachedSC2p5DAccNodes(lattice, sc_path_length_min, calc_args, boundary_args = None):
+	"""
+	Sets the 2.5D SC nodes into the lattice with the cached
+	SpaceChargeCalc2p5D(*calc_args) and Boundary2D(*boundary_args)
+	and returns the list of the SC nodes.
+	"""
+	calc2p5d = _solver_cache.get(SpaceChargeCalc2p5D,*calc_args)
+	boundary = None
+	if(boundary_args != None):
+		boundary = _solver_cache.get(Boundary2D,*boundary_args)
+	return scLatticeModifications.setSC2p5DAccNodes(lattice,sc_path_length_min,calc2p5d,boundary)
+
+def setCachedSC3DAccNodes(lattice, sc_path_length_min, calc_args):
+	"""
+	Sets the 3D SC nodes into the lattice with the cached
+	SpaceChargeCalc3D(*calc_args) and returns the list of the SC nodes.
+	"""
+	calc3d = _solver_cache.get(SpaceChargeCalc3D,*calc_args)
+	return setSC3DAccNodes(lattice,sc_path_length_min,calc3d)
@@ -0,0 +1,92 @@
+#-----------------------------------------------------
+#Compares the creation of the Poisson solvers for each
+#use with the cached solvers
+#-----------------------------------------------------
+import sys
+import time
+
+from spacecharge import Grid2D
+from spacecharge import PoissonSolverFFT2D
+from spacecharge import Boundary2D
+
+from bunch import Bunch
+from orbit.teapot import teapot
+from orbit.space_charge.sc2p5d import scLatticeModifications
+from spacecharge import SpaceChargeCalc2p5D
+
+from poisson_solver_cache import getSolverCache, setCachedSC2p5DAccNodes
+
+print "Start."
+
+sizeX = 128
+sizeY = 128
+n_calls = 200
+
+grid0 = Grid2D(sizeX,sizeY)
+grid1 = Grid2D(sizeX,sizeY)
+grid0.binValue(1.0,0.3,0.1)
+
+time_start = time.time()
+for count in xrange(n_calls):
+	solver = PoissonSolverFFT2D(sizeX,sizeY)
+	solver.findPotential(grid0,grid1)
+print "new solver for each call time [sec] = %8.3f "%(time.time() - time_start)
+phi_ref = grid1.getValue(0.,0.)
+
+cache = getSolverCache()
+time_start = time.time()
+for count in xrange(n_calls):
+	solver = cache.get(PoissonSolverFFT2D,sizeX,sizeY)
+	solver.findPotential(grid0,grid1)
+print "cached solver time [sec] = %8.3f "%(time.time() - time_start)
+print "phi(0,0) new= %12.5g cached= %12.5g "%(phi_ref,grid1.getValue(0.,0.))
+
+#---- the boundaries with the same shape are shared too
+boundary0 = cache.get(Boundary2D,128,10,"Circle",0.073,0.073)
+boundary1 = cache.get(Boundary2D,128,10,"Circle",0.073,0.073)
+print "the same boundary =",(boundary0 is boundary1)
+print "cache statistics =",cache.getStatistics()
+
+#---- two lattices with the cached SC nodes share one calculator
+#---- and give the same kicks as the lattice with its own calculator
+def getLattice(name):
+	lattice = teapot.TEAPOT_Lattice(name)
+	for ind in range(10):
+		drift = teapot.DriftTEAPOT("drift"+str(ind))
+		drift.setLength(1.0)
+		lattice.addNode(drift)
+	lattice.initialize()
+	return lattice
+
+boundary_args = (32,10,"Circle",0.22)
+lattice_ref = getLattice("ref")
+scLatticeModifications.setSC2p5DAccNodes(lattice_ref,0.5,SpaceChargeCalc2p5D(64,64,1),Boundary2D(*boundary_args))
+lattices = (getLattice("cached0"),getLattice("cached1"))
+for lattice in lattices:
+	setCachedSC2p5DAccNodes(lattice,0.5,(64,64,1),boundary_args)
+print "cache statistics after the SC nodes setup =",cache.getStatistics()
+
+b = Bunch()
+b.getSyncParticle().kinEnergy(1.0)
+b.macroSize(1.0e+10)
+for ix in range(-20,21):
+	for iy in range(-20,21):
+		if(ix**2 + iy**2 <= 400):
+			b.addParticle(0.001*ix,0.,0.0005*iy,0.,0.,0.)
+
+bunches = []
+for lattice in (lattice_ref,) + lattices:
+	b_tmp = Bunch()
+	b.copyBunchTo(b_tmp)
+	lattice.trackBunch(b_tmp)
+	bunches.append(b_tmp)
+max_diff = 0.
+for b_tmp in bunches[1:]:
+	for ind in xrange(b.getSize()):
+		max_diff = max(max_diff,abs(b_tmp.xp(ind) - bunches[0].xp(ind)),abs(b_tmp.yp(ind) - bunches[0].yp(ind)))
+print "max diff of the kicks cached vs own calculator =",max_diff
+if(max_diff > 0.):
+	print "The cached calculator gives different kicks!"
+	sys.exit(1)
+
+print "Stop."
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The policies for the transverse grid extents of the space
+# charge calculators. The min-max extents are inflated by
+# a single halo particle, so the resolution of the grid for
+# the beam core is lost. The policies:
+#  MinMaxExtents     - the global min and max (as now)
+#  RmsExtents        - mean +- n_sigma*rms
+#  PercentileExtents - the interval with the fraction of the
+#                      particles found from the global histogram
+# The RMS and percentile policies have the hysteresis: the
+# extents are kept while the required interval is inside
+# them and not much smaller, and the new extents have the
+# margin hysteresis*width, so they do not change at every
+# space charge node. One policy instance is used per axis.
+# The particles outside the extents are handled by the
+# calculator: the DistributedSliceBySlice2D adds their direct
+# potential at the grid points to the core field and kicks
+# them by the far field of the slice charge.
+#--------------------------------------------------------
+
+import math
+import sys
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+def _getGlobalMinMax(u_arr, comm):
+	vals = (-1.0e+36,-1.0e+36)
+	if(u_arr.shape[0] > 0): vals = (u_arr.max(),-u_arr.min())
+	vals = orbit_mpi.MPI_Allreduce(vals,mpi_datatype.MPI_DOUBLE,mpi_op.MPI_MAX,comm)
+	return (-vals[1],vals[0])
+
+class MinMaxExtents:
+	"""
+	The extents are the global min and max of the coordinate.
+	"""
+	def __init__(self):
+		self.extents = None
+
+	def getExtents(self, u_arr, comm = mpi_comm.MPI_COMM_WORLD):
+		"""
+		Returns the (u_min, u_max) for the coordinate array. It is collective.
+		"""
+		self.extents = _getGlobalMinMax(u_arr,comm)
+		return self.extents
+
+class _HysteresisExtents:
+	"""
+	The base class for the extents with the hysteresis.
+	"""
+	def __init__(self, hysteresis):
+		self.hysteresis = hysteresis
+		self.extents = None
+		self.n_changes = 0
+
+	def getNumberOfChanges(self):
+		"""
+		Returns the number of the extents changes.
+		"""
+		return self.n_changes
+
+	def _applyHysteresis(self, u_min, u_max):
+		h = self.hysteresis
+		if(self.extents != None):
+			(old_min,old_max) = self.extents
+			if(u_min >= old_min and u_max <= old_max and (u_max - u_min) >= (1.0 - 2*h)*(old_max - old_min)):
+				return self.extents
+		width = u_max - u_min
+		self.extents = (u_min - 0.5*h*width,u_max + 0.5*h*width)
+		self.n_changes += 1
+		return self.extents
+
+class RmsExtents(_HysteresisExtents):
+	"""
+	The extents are mean +- n_sigma*rms.
+	"""
+	def __init__(self, n_sigma = 4.0, hysteresis = 0.1):
+		_HysteresisExtents.__init__(self,hysteresis)
+		self.n_sigma = n_sigma
+
+	def getExtents(self, u_arr, comm = mpi_comm.MPI_COMM_WORLD):
+		"""
+		Returns the (u_min, u_max) for the coordinate array. It is collective.
+		"""
+		vals = (float(u_arr.shape[0]),u_arr.sum(),(u_arr*u_arr).sum())
+		(n_total,u_sum,u2_sum) = orbit_mpi.MPI_Allreduce(vals,mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,comm)
+		u_avg = u_sum/max(n_total,1.0)
+		u_rms = math.sqrt(max(u2_sum/max(n_total,1.0) - u_avg*u_avg,0.))
+		u_rms = max(u_rms,1.0e-12)
+		return self._applyHysteresis(u_avg - self.n_sigma*u_rms,u_avg + self.n_sigma*u_rms)
+
+class PercentileExtents(_HysteresisExtents):
+	"""
+	The extents include the fraction of the particles (the same fraction
+	of the particles is cut at each side). The quantiles are found from
+	the global histogram with n_bins bins, and the margin*width is added.
+	"""
+	def __init__(self, fraction = 0.999, margin = 0.05, hysteresis = 0.1, n_bins = 1024):
+		_HysteresisExtents.__init__(self,hysteresis)
+		self.fraction = fraction
+		self.margin = margin
+		self.n_bins = n_bins
+
+	def getExtents(self, u_arr, comm = mpi_comm.MPI_COMM_WORLD):
+		"""
+		Returns the (u_min, u_max) for the coordinate array. It is collective.
+		"""
+		(u_min,u_max) = _getGlobalMinMax(u_arr,comm)
+		width = max(u_max - u_min,1.0e-12)
+		hist = np.histogram(u_arr,bins = self.n_bins,range = (u_min,u_min + width))[0].astype(np.float64)
+		hist = np.array(orbit_mpi.MPI_Allreduce(tuple(hist.tolist()),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,comm))
+		cumul = np.cumsum(hist)
+		n_cut = 0.5*(1.0 - self.fraction)*cumul[-1]
+		ind_low = np.searchsorted(cumul,n_cut,side = "right")
+		ind_upp = np.searchsorted(cumul,cumul[-1] - n_cut,side = "left")
+		step = width/self.n_bins
+		q_min = u_min + ind_low*step
+		q_max = u_min + (min(ind_upp,self.n_bins-1) + 1)*step
+		q_width = q_max - q_min
+		return self._applyHysteresis(q_min - self.margin*q_width,q_max + self.margin*q_width)
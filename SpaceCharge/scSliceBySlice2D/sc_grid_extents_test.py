@@ -0,0 +1,70 @@
+#-----------------------------------------------------
+#The bunch core with a few halo particles. Compares the
+#kicks of the min-max extents on the 128x128 grid with the
+#RMS and percentile extents on the 64x64 grid. The halo
+#charge outside the RMS and percentile grids still acts on
+#the core, so the core kicks should be close to the min-max.
+#-----------------------------------------------------
+import sys
+import math
+import random
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch
+
+from sc_slices_distributed import DistributedSliceBySlice2D
+from sc_grid_extents import MinMaxExtents, RmsExtents, PercentileExtents
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+
+sizeZ = 16
+slice_length = 0.1
+
+random.seed(100 + rank)
+b = Bunch()
+b.mass(0.93827231)
+b.getSyncParticle().kinEnergy(1.0)
+for i in xrange(20000):
+	b.addParticle(random.gauss(0.,0.003),0.,random.gauss(0.,0.003),0.,random.uniform(-50.,50.),0.)
+#---- the halo particles after the foil scattering
+if(rank == 0):
+	for i in xrange(5):
+		b.addParticle(0.05*(i+1),0.,-0.04*(i+1),0.,0.,0.)
+b.compress()
+b.macroSize(1.0e+14/b.getSizeGlobal())
+
+calcs = []
+calcs.append(("min-max 128x128",DistributedSliceBySlice2D(128,128,sizeZ),MinMaxExtents(),MinMaxExtents()))
+calcs.append(("rms 64x64",DistributedSliceBySlice2D(64,64,sizeZ),RmsExtents(4.5),RmsExtents(4.5)))
+calcs.append(("percentile 64x64",DistributedSliceBySlice2D(64,64,sizeZ),PercentileExtents(0.9995),PercentileExtents(0.9995)))
+
+bunches = []
+for (name,calc,policy_x,policy_y) in calcs:
+	calc.setExtentsPolicies(policy_x,policy_y)
+	b_tmp = Bunch()
+	b.copyBunchTo(b_tmp)
+	#---- several nodes to see the hysteresis
+	for count in xrange(5):
+		calc.trackBunch(b_tmp,slice_length/5)
+	bunches.append(b_tmp)
+	if(rank == 0):
+		((x_min,x_max),(y_min,y_max),(z_min,z_max)) = calc.getExtents()
+		print "%18s x=[%9.5f,%9.5f] y=[%9.5f,%9.5f] outside fraction= %10.3e "%(name,x_min,x_max,y_min,y_max,calc.getOutsideFraction())
+
+if(rank == 0):
+	for i in range(0,20000,2000) + range(20000,20005):
+		s = "x= %9.5f y= %9.5f xp: "%(b.x(i),b.y(i))
+		for b_tmp in bunches:
+			s += " %12.5g "%b_tmp.xp(i)
+		print s
+	#---- the core kicks relative to the min-max grid that includes the halo
+	for ind in range(1,len(calcs)):
+		(diff2,norm2) = (0.,0.)
+		for i in xrange(20000):
+			diff2 += (bunches[ind].xp(i) - bunches[0].xp(i))**2 + (bunches[ind].yp(i) - bunches[0].yp(i))**2
+			norm2 += bunches[0].xp(i)**2 + bunches[0].yp(i)**2
+		print "%18s core kicks rel. rms diff. vs min-max = %10.3e "%(calcs[ind][0],math.sqrt(diff2/max(norm2,1.0e-300)))
+print "Stop."
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The slice-by-slice 2D space charge calculator with the
+# longitudinal slices distributed between CPUs.
+# The charge density is binned into the (sizeZ,sizeX,sizeY)
+# grid with the linear (cloud-in-cell) weights. Each CPU
+# solves the 2D free space Poisson problems (FFT convolution
+# with the Green function -ln(r) on the doubled grid) only
+# for its own contiguous block (slab) of slices. The particles
+# are moved to the CPUs of their slices (by the pairwise
+# exchanges of bunch_mpi_exchange.py, after the first call
+# only the particles that changed the slab are moved), so the
+# CPU bins and kicks only its own particles. The linear
+# weights of the particles in the last slice of the slab reach
+# the first slice of the next slab, so the neighbour CPUs
+# exchange only one slice of the density and one slice of the
+# potential instead of the whole grid. The number of slices
+# should not be less than the number of CPUs.
+# The transverse kicks are interpolated from the potential
+# gradients with the same linear weights:
+#   dxp = 2*r0*L/(beta^2*gamma^3) * Ex, Ex = -dphi/dx
+# where r0 is the classical radius of the particle, and phi
+# is the potential of the line densities (macro-size/dz).
+# With distributed = False every CPU keeps its particles,
+# the density is summed over all CPUs, and every CPU solves
+# all slices as the SpaceChargeCalcSliceBySlice2D does.
+# The transverse grid extents are defined by the policies
+# from sc_grid_extents.py (the min-max by default). The
+# particles outside the grid are not binned, but their
+# potential -q*ln(r) is summed directly at the grid points
+# of their slices and added to the solved potential, so the
+# core feels the field of the halo. The particles outside
+# the grid get the kicks of the far field of the whole slice
+# charge placed at the slice centroid.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+import base64
+
+import numpy as np
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+from orbit_mpi import mpi_datatype
+from orbit_mpi import mpi_op
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../../Bunch_Tests"))
+from bunch_columns import BunchColumns
+from bunch_mpi_exchange import getAllColumns, putAllColumns, exchangeColumns
+
+from sc_grid_extents import MinMaxExtents
+
+def getSlicesRange(sizeZ, rank, size):
+	"""
+	Returns the (ind_start, ind_stop) of the slices solved by the CPU.
+	"""
+	return ((sizeZ*rank)/size,(sizeZ*(rank+1))/size)
+
+def getSlabOwners(iz, sizeZ, size):
+	"""
+	Returns the array of the CPU ranks solving the slices with the indexes iz.
+	"""
+	starts = np.array([getSlicesRange(sizeZ,rank,size)[0] for rank in range(size)])
+	return np.searchsorted(starts,iz,side = "right") - 1
+
+def _sendSlice(arr, rank_to, tag, comm):
+	data = base64.b64encode(np.ascontiguousarray(arr,dtype = "<f8").tostring())
+	orbit_mpi.MPI_Send(data,mpi_datatype.MPI_CHAR,rank_to,tag,comm)
+
+def _recvSlice(shape, rank_from, tag, comm):
+	data = base64.b64decode(orbit_mpi.MPI_Recv(mpi_datatype.MPI_CHAR,rank_from,tag,comm))
+	return np.frombuffer(data,dtype = "<f8").reshape(shape)
+
+#---- the number of the outside particles in one direct sum step
+OUTSIDE_CHUNK = 256
+
+def _getLinearWeights(u, u_min, step, n_points):
+	"""
+	Returns the indexes of the left grid points and the fractions for the right ones.
+	"""
+	g = (u - u_min)/step
+	ind = np.clip(np.floor(g).astype(np.int64),0,n_points-2)
+	return (ind,g - ind)
+
+class DistributedSliceBySlice2D:
+	"""
+	The slice-by-slice 2D space charge calculator with the slices distributed between CPUs.
+	"""
+	def __init__(self, sizeX, sizeY, sizeZ, distributed = True, comm = mpi_comm.MPI_COMM_WORLD):
+		self.sizeX = sizeX
+		self.sizeY = sizeY
+		self.sizeZ = sizeZ
+		self.distributed = distributed
+		self.comm = comm
+		self.time_solve = 0.
+		self.time_exchange = 0.
+		self.extents_policies = (MinMaxExtents(),MinMaxExtents())
+		self.extents = None
+		self.outside_fraction = 0.
+
+	def setExtentsPolicies(self, policy_x, policy_y):
+		"""
+		Sets the policies for the x and y grid extents (see sc_grid_extents.py).
+		"""
+		self.extents_policies = (policy_x,policy_y)
+
+	def getExtents(self):
+		"""
+		Returns the ((x_min,x_max),(y_min,y_max),(z_min,z_max)) of the last call.
+		"""
+		return self.extents
+
+	def getOutsideFraction(self):
+		"""
+		Returns the fraction of the particles outside the transverse grid at the last call.
+		"""
+		return self.outside_fraction
+
+	def getTimes(self):
+		"""
+		Returns the accumulated (solver time, potential exchange time) of this CPU.
+		"""
+		return (self.time_solve,self.time_exchange)
+
+	def _getExtents(self, coords):
+		extents = []
+		for ind in range(2):
+			extents.append(self.extents_policies[ind].getExtents(coords[:,2*ind],self.comm))
+		extents.append(MinMaxExtents().getExtents(coords[:,4],self.comm))
+		res = []
+		for (u_min,u_max) in extents:
+			res.append((u_min,u_min + max(u_max - u_min,1.0e-12)))
+		return res
+
+	def _getGreenFFT(self, stepX, stepY):
+		(nx,ny) = (self.sizeX,self.sizeY)
+		ix = np.arange(2*nx)
+		iy = np.arange(2*ny)
+		ix = np.where(ix < nx,ix,2*nx - ix)*stepX
+		iy = np.where(iy < ny,iy,2*ny - iy)*stepY
+		r2 = ix[:,np.newaxis]**2 + iy[np.newaxis,:]**2
+		#---- the self-potential of the cell is taken at the quarter of the step
+		r2[0,0] = (0.25*min(stepX,stepY))**2
+		return np.fft.rfft2(-0.5*np.log(r2))
+
+	def _getOutsidePotential(self, x, y, iz, fz, m_sizes, nz_loc, x_min, y_min, stepX, stepY):
+		"""
+		Returns the (nz_loc,sizeX*sizeY) potential of the outside particles
+		at the grid points of the slices. The iz are the local slice indexes.
+		"""
+		(nx,ny) = (self.sizeX,self.sizeY)
+		phi_out = np.zeros((nz_loc,nx*ny),dtype = np.float64)
+		if(x.shape[0] == 0): return phi_out
+		x_grid = np.repeat(x_min + stepX*np.arange(nx),ny)
+		y_grid = np.tile(y_min + stepY*np.arange(ny),nx)
+		r2_min = (0.25*min(stepX,stepY))**2
+		for (dz,wz) in ((0,1.0 - fz),(1,fz)):
+			k_arr = iz + dz
+			q_arr = wz*m_sizes
+			for k in np.unique(k_arr):
+				inds = np.nonzero(k_arr == k)[0]
+				for ind in range(0,inds.shape[0],OUTSIDE_CHUNK):
+					sel = inds[ind:ind+OUTSIDE_CHUNK]
+					r2 = (x_grid[np.newaxis,:] - x[sel,np.newaxis])**2 + (y_grid[np.newaxis,:] - y[sel,np.newaxis])**2
+					phi_out[k] -= 0.5*np.dot(q_arr[sel],np.log(np.maximum(r2,r2_min)))
+		return phi_out
+
+	def _moveParticles(self, bunch, z_arr, z_min, stepZ):
+		"""
+		Moves the particles to the CPUs of their slices if some of them
+		are not there. Returns True if the particles were moved. It is collective.
+		"""
+		rank = orbit_mpi.MPI_Comm_rank(self.comm)
+		size = orbit_mpi.MPI_Comm_size(self.comm)
+		dest_ranks = getSlabOwners(_getLinearWeights(z_arr,z_min,stepZ,self.sizeZ)[0],self.sizeZ,size)
+		n_move = orbit_mpi.MPI_Allreduce(int((dest_ranks != rank).sum()),mpi_datatype.MPI_INT,mpi_op.MPI_SUM,self.comm)
+		if(n_move == 0): return False
+		time_start = orbit_mpi.MPI_Wtime()
+		(columns,attr_layout) = getAllColumns(bunch)
+		columns = exchangeColumns(self.comm,columns,dest_ranks)
+		putAllColumns(bunch,columns,attr_layout)
+		self.time_exchange += orbit_mpi.MPI_Wtime() - time_start
+		return True
+
+	def distributeBunch(self, bunch):
+		"""
+		Moves the particles to the CPUs of their slices without the kicks.
+		It is collective.
+		"""
+		bunch.compress()
+		z_arr = BunchColumns(bunch).z
+		(z_min,z_max) = MinMaxExtents().getExtents(z_arr,self.comm)
+		z_max = z_min + max(z_max - z_min,1.0e-12)
+		self._moveParticles(bunch,z_arr,z_min,(z_max - z_min)/(self.sizeZ - 1))
+
+	def _exchangeSlices(self, rho_loc, phi_loc, ind_start, ind_stop, solve):
+		"""
+		Sends the density (and the outside particles potential) of the first
+		slice of the next slab to its CPU,
+		calls solve() for the own slices, and receives the potential of the
+		first slice of the next slab. The even ranks send first.
+		"""
+		rank = orbit_mpi.MPI_Comm_rank(self.comm)
+		(nz,shape) = (self.sizeZ,rho_loc.shape[1:])
+		(has_prev,has_next) = (ind_start > 0,ind_stop < nz)
+		tag = 6543
+		time_start = orbit_mpi.MPI_Wtime()
+		if(rank % 2 == 0):
+			if(has_next): _sendSlice(rho_loc[-1],rank+1,tag,self.comm)
+			if(has_prev): rho_loc[0] += _recvSlice(shape,rank-1,tag,self.comm)
+		else:
+			if(has_prev): rho_loc[0] += _recvSlice(shape,rank-1,tag,self.comm)
+			if(has_next): _sendSlice(rho_loc[-1],rank+1,tag,self.comm)
+		self.time_exchange += orbit_mpi.MPI_Wtime() - time_start
+		solve()
+		time_start = orbit_mpi.MPI_Wtime()
+		if(rank % 2 == 0):
+			if(has_prev): _sendSlice(phi_loc[0],rank-1,tag,self.comm)
+			if(has_next): phi_loc[-1] = _recvSlice(shape,rank+1,tag,self.comm)
+		else:
+			if(has_next): phi_loc[-1] = _recvSlice(shape,rank+1,tag,self.comm)
+			if(has_prev): _sendSlice(phi_loc[0],rank-1,tag,self.comm)
+		self.time_exchange += orbit_mpi.MPI_Wtime() - time_start
+
+	def trackBunch(self, bunch, length):
+		"""
+		Applies the space charge kicks for the path length to the bunch. It is
+		collective. In the distributed mode the particles are moved to the CPUs
+		of their slices.
+		"""
+		rank = orbit_mpi.MPI_Comm_rank(self.comm)
+		size = orbit_mpi.MPI_Comm_size(self.comm)
+		(nx,ny,nz) = (self.sizeX,self.sizeY,self.sizeZ)
+		distributed = (self.distributed and size > 1)
+		if(distributed and nz < size):
+			orbit_mpi.finalize("sc_slices_distributed: the number of slices is less than the number of CPUs!")
+		bunch.compress()
+		columns = BunchColumns(bunch)
+		coords = columns.coords
+		self.extents = self._getExtents(coords)
+		((x_min,x_max),(y_min,y_max),(z_min,z_max)) = self.extents
+		(stepX,stepY,stepZ) = ((x_max - x_min)/(nx-1),(y_max - y_min)/(ny-1),(z_max - z_min)/(nz-1))
+		#---- the slab of this CPU: the own slices [ind_start,ind_stop) and the next one
+		(ind_start,ind_stop) = (0,nz)
+		if(distributed):
+			(ind_start,ind_stop) = getSlicesRange(nz,rank,size)
+			if(self._moveParticles(bunch,coords[:,4],z_min,stepZ)):
+				columns = BunchColumns(bunch)
+				coords = columns.coords
+		nz_loc = min(ind_stop,nz-1) - ind_start + 1
+		(x,y) = (coords[:,0],coords[:,2])
+		inside = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+		#---- binning of the line densities
+		(ix,fx) = _getLinearWeights(x,x_min,stepX,nx)
+		(iy,fy) = _getLinearWeights(y,y_min,stepY,ny)
+		(iz,fz) = _getLinearWeights(coords[:,4],z_min,stepZ,nz)
+		if(bunch.hasPartAttr("macrosize")):
+			m_sizes = columns.attr("macrosize")[:,0]
+		else:
+			m_sizes = np.empty(coords.shape[0])
+			m_sizes.fill(bunch.macroSize())
+		cells = []
+		for (dz,wz) in ((0,1.0 - fz),(1,fz)):
+			for (dx,wx) in ((0,1.0 - fx),(1,fx)):
+				for (dy,wy) in ((0,1.0 - fy),(1,fy)):
+					cells.append((((iz-ind_start+dz)*nx + (ix+dx))*ny + (iy+dy),wz*wx*wy))
+		n_cells = nz_loc*nx*ny
+		rho = np.zeros(n_cells,dtype = np.float64)
+		for (inds,w) in cells:
+			rho += np.bincount(inds,weights = w*m_sizes*inside,minlength = n_cells)
+		#---- the potential of the outside particles at the grid points
+		outside = np.logical_not(inside)
+		phi_out = self._getOutsidePotential(x[outside],y[outside],iz[outside]-ind_start,fz[outside],m_sizes[outside],nz_loc,x_min,y_min,stepX,stepY)
+		grids = np.hstack((rho.reshape((nz_loc,nx*ny)),phi_out))
+		#---- the slices charges and centroids for the far field, and the outside count
+		slice_sums = np.zeros(3*nz + 2,dtype = np.float64)
+		for (dz,wz) in ((0,1.0 - fz),(1,fz)):
+			for (ind,vals) in ((0,m_sizes),(1,m_sizes*x),(2,m_sizes*y)):
+				slice_sums[ind*nz:(ind+1)*nz] += np.bincount(iz+dz,weights = wz*vals,minlength = nz)
+		slice_sums[3*nz] = coords.shape[0] - inside.sum()
+		slice_sums[3*nz+1] = coords.shape[0]
+		if(not distributed):
+			sums = np.concatenate((grids.ravel(),slice_sums))
+			if(size > 1):
+				sums = np.array(orbit_mpi.MPI_Allreduce(tuple(sums.tolist()),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,self.comm))
+			slice_sums = sums[2*n_cells:]
+			grids = sums[:2*n_cells]
+		else:
+			slice_sums = np.array(orbit_mpi.MPI_Allreduce(tuple(slice_sums.tolist()),mpi_datatype.MPI_DOUBLE,mpi_op.MPI_SUM,self.comm))
+		#---- [slice,0] is the density and [slice,1] is the potential of the outside particles
+		grids = grids.reshape((nz_loc,2,nx,ny))/stepZ
+		(rho,phi_out) = (grids[:,0],grids[:,1])
+		self.outside_fraction = slice_sums[3*nz]/max(slice_sums[3*nz+1],1.0)
+		#---- the potentials of this CPU's slices
+		phi = np.zeros((nz_loc,nx,ny),dtype = np.float64)
+		n_own = ind_stop - ind_start
+		def solve():
+			time_start = orbit_mpi.MPI_Wtime()
+			green_fft = self._getGreenFFT(stepX,stepY)
+			rho_fft = np.fft.rfft2(rho[0:n_own],s = (2*nx,2*ny))
+			phi[0:n_own] = np.fft.irfft2(rho_fft*green_fft,s = (2*nx,2*ny))[:,:nx,:ny]
+			phi[0:n_own] += phi_out[0:n_own]
+			self.time_solve += orbit_mpi.MPI_Wtime() - time_start
+		if(distributed):
+			self._exchangeSlices(grids,phi,ind_start,ind_stop,solve)
+		else:
+			solve()
+		#---- the kicks
+		(grad_x,grad_y) = np.gradient(phi,stepX,stepY,axis = (1,2))
+		(ex,ey) = (-grad_x.ravel(),-grad_y.ravel())
+		kick_x = np.zeros(coords.shape[0],dtype = np.float64)
+		kick_y = np.zeros(coords.shape[0],dtype = np.float64)
+		for (inds,w) in cells:
+			kick_x += w*ex[inds]
+			kick_y += w*ey[inds]
+		#---- the far field of the slices for the outside particles
+		if(outside.any()):
+			slice_charges = slice_sums[0:nz]
+			x_c = slice_sums[nz:2*nz]/np.maximum(slice_charges,1.0e-300)
+			y_c = slice_sums[2*nz:3*nz]/np.maximum(slice_charges,1.0e-300)
+			kick_x[outside] = 0.
+			kick_y[outside] = 0.
+			for (dz,wz) in ((0,1.0 - fz),(1,fz)):
+				k = iz[outside] + dz
+				dx = x[outside] - x_c[k]
+				dy = y[outside] - y_c[k]
+				r2 = np.maximum(dx*dx + dy*dy,1.0e-300)
+				lambda_k = wz[outside]*slice_charges[k]/stepZ
+				kick_x[outside] += lambda_k*dx/r2
+				kick_y[outside] += lambda_k*dy/r2
+		syncPart = bunch.getSyncParticle()
+		(beta,gamma) = (syncPart.beta(),syncPart.gamma())
+		coeff = 2*bunch.classicalRadius()*length/(beta*beta*gamma*gamma*gamma)
+		columns.xp += coeff*kick_x
+		columns.yp += coeff*kick_y
+		columns.putBack()
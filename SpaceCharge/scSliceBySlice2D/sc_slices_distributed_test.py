@@ -0,0 +1,71 @@
+#-----------------------------------------------------
+#Compares the kicks of the DistributedSliceBySlice2D with
+#the SpaceChargeCalcSliceBySlice2D and the solver and
+#exchange times with the distributed and redundant slices.
+#The bunch is distributed between CPUs by slices first,
+#so the particles keep their indexes in all copies.
+#Run it with several CPUs: mpirun -np 4 ${ORBIT_ROOT}/bin/pyORBIT sc_slices_distributed_test.py
+#-----------------------------------------------------
+import sys
+import math
+import random
+
+import orbit_mpi
+from orbit_mpi import mpi_comm
+
+from bunch import Bunch
+from spacecharge import SpaceChargeCalcSliceBySlice2D
+
+from sc_slices_distributed import DistributedSliceBySlice2D
+
+comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+rank = orbit_mpi.MPI_Comm_rank(comm)
+size = orbit_mpi.MPI_Comm_size(comm)
+
+sizeX = 64
+sizeY = 64
+sizeZ = 16
+slice_length = 0.1
+
+random.seed(100 + rank)
+b = Bunch()
+b.mass(0.93827231)
+b.getSyncParticle().kinEnergy(1.0)
+for i in xrange(20000):
+	b.addParticle(random.gauss(0.,0.005),0.,random.gauss(0.,0.003),0.,random.uniform(-50.,50.),0.)
+b.compress()
+b.macroSize(1.0e+14/b.getSizeGlobal())
+
+calc_dist = DistributedSliceBySlice2D(sizeX,sizeY,sizeZ,distributed = True)
+calc_red = DistributedSliceBySlice2D(sizeX,sizeY,sizeZ,distributed = False)
+calc_dist.distributeBunch(b)
+
+b_ref = Bunch()
+b.copyBunchTo(b_ref)
+b_red = Bunch()
+b.copyBunchTo(b_red)
+
+calc_ref = SpaceChargeCalcSliceBySlice2D(sizeX,sizeY,sizeZ)
+calc_ref.trackBunch(b_ref,slice_length)
+
+calc_red.trackBunch(b_red,slice_length)
+for count in xrange(9):
+	b_tmp = Bunch()
+	b.copyBunchTo(b_tmp)
+	calc_red.trackBunch(b_tmp,slice_length)
+calc_dist.trackBunch(b,slice_length)
+for count in xrange(9):
+	b_tmp = Bunch()
+	b.copyBunchTo(b_tmp)
+	calc_dist.trackBunch(b_tmp,slice_length)
+
+if(rank == 0):
+	print "solve, exchange times [sec] distributed = %8.4f %8.4f "%calc_dist.getTimes()
+	print "solve, exchange times [sec] redundant   = %8.4f %8.4f "%calc_red.getTimes()
+	for i in xrange(0,b.getSize(),b.getSize()/10):
+		print "x= %9.6f xp= %12.5g ref= %12.5g  y= %9.6f yp= %12.5g ref= %12.5g"%(b.x(i),b.xp(i),b_ref.xp(i),b.y(i),b.yp(i),b_ref.yp(i))
+max_diff = 0.
+for i in xrange(b.getSize()):
+	max_diff = max(max_diff,abs(b.xp(i) - b_red.xp(i)),abs(b.yp(i) - b_red.yp(i)))
+print "rank=",rank," max diff of the kicks distributed vs redundant =",max_diff
+print "Stop."
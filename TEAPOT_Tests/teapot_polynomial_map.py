@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The order-N polynomial one-turn (or any section) map of
+# the TEAPOT lattice and the map-based tracking.
+# The map is x_out[k] = sum_m C[m,k] * (x_in^m) where m runs
+# over all monomials of x,xp,y,yp,z,dE up to the order N.
+# The coefficients are found by the least squares fit of the
+# tracking of the sample particles through the lattice. The
+# sample particles are uniform in the box with the half sizes
+# defined by the user, so the map is valid inside this box
+# only. The map is not symplectic, and the fit error
+# getFitError() should be checked before the long-term tracking.
+# The PolynomialMap.trackBunchTurns(...) loads the bunch into
+# NumPy columns once and applies the map for all turns.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+import numpy as np
+
+import orbit_mpi
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_columns import getCoordinates, setCoordinates, addParticles
+
+def getMonomials(order, n_vars = 6):
+	"""
+	Returns the list of the exponents tuples of all monomials of n_vars
+	variables with the total order from 0 to order.
+	"""
+	monomials = [(0,)*n_vars]
+	for total_order in range(1,order+1):
+		new_monomials = []
+		for exps in monomials:
+			if(sum(exps) != total_order - 1): continue
+			#---- increase only the last non-zero exponent and the following ones
+			ind_last = 0
+			for ind in range(n_vars):
+				if(exps[ind] > 0): ind_last = ind
+			for ind in range(ind_last,n_vars):
+				new_exps = list(exps)
+				new_exps[ind] += 1
+				new_monomials.append(tuple(new_exps))
+		monomials += new_monomials
+	return monomials
+
+def evalMonomials(coords, monomials, order):
+	"""
+	Returns the (nParts,nMonomials) array of the monomials values.
+	"""
+	n_parts = coords.shape[0]
+	n_vars = coords.shape[1]
+	#---- powers[ind][p] = coords[:,ind]**p
+	powers = []
+	for ind in range(n_vars):
+		arr = np.ones((order+1,n_parts),dtype = np.float64)
+		for p in range(1,order+1):
+			arr[p] = arr[p-1]*coords[:,ind]
+		powers.append(arr)
+	res = np.empty((n_parts,len(monomials)),dtype = np.float64)
+	for ind_m in range(len(monomials)):
+		vals = np.ones(n_parts,dtype = np.float64)
+		for ind in range(n_vars):
+			p = monomials[ind_m][ind]
+			if(p > 0): vals = vals*powers[ind][p]
+		res[:,ind_m] = vals
+	return res
+
+class PolynomialMap:
+	"""
+	The polynomial map of the order N for x,xp,y,yp,z,dE.
+	"""
+	def __init__(self, order):
+		self.order = order
+		self.monomials = getMonomials(order)
+		self.coeffs = np.zeros((len(self.monomials),6),dtype = np.float64)
+		self.scales = np.ones(6,dtype = np.float64)
+		self.fit_error = np.zeros(6,dtype = np.float64)
+
+	def getOrder(self):
+		return self.order
+
+	def getNumberOfMonomials(self):
+		return len(self.monomials)
+
+	def getFitError(self):
+		"""
+		Returns the max absolute errors of x,xp,y,yp,z,dE for the test particles.
+		"""
+		return self.fit_error
+
+	def apply(self, coords):
+		"""
+		Returns the (nParts,6) array of the coordinates after the map.
+		"""
+		return np.dot(evalMonomials(coords/self.scales,self.monomials,self.order),self.coeffs)
+
+	def extract(self, lattice, bunch, half_sizes, n_samples = None, seed = 1):
+		"""
+		Finds the map coefficients for the lattice by the tracking of the sample
+		particles uniformly distributed in the box with half_sizes (6 values).
+		The bunch defines the synchronous particle.
+		"""
+		n_monomials = len(self.monomials)
+		if(n_samples == None): n_samples = 4*n_monomials
+		self.scales = np.array(half_sizes,dtype = np.float64)
+		rng = np.random.RandomState(seed)
+		#---- the fit and test particles
+		coords_in = (2*rng.random_sample((n_samples + n_samples/4,6)) - 1.0)*self.scales
+		coords_out = self._track(lattice,bunch,coords_in)
+		(fit_in,test_in) = (coords_in[:n_samples],coords_in[n_samples:])
+		(fit_out,test_out) = (coords_out[:n_samples],coords_out[n_samples:])
+		A = evalMonomials(fit_in/self.scales,self.monomials,self.order)
+		self.coeffs = np.linalg.lstsq(A,fit_out,rcond = -1)[0]
+		self.fit_error = np.abs(self.apply(test_in) - test_out).max(axis = 0)
+
+	def _track(self, lattice, bunch, coords):
+		b = Bunch()
+		bunch.copyEmptyBunchTo(b)
+		addParticles(b,coords)
+		lattice.trackBunch(b)
+		if(b.getSize() != coords.shape[0]):
+			orbit_mpi.finalize("PolynomialMap: particles were lost in the sample box. Reduce the half sizes.")
+		return getCoordinates(b)
+
+	def trackBunch(self, bunch):
+		"""
+		Applies the map to the bunch once.
+		"""
+		self.trackBunchTurns(bunch,1)
+
+	def trackBunchTurns(self, bunch, n_turns):
+		"""
+		Applies the map to the bunch n_turns times.
+		"""
+		coords = getCoordinates(bunch)
+		for turn in xrange(n_turns):
+			coords = self.apply(coords)
+		setCoordinates(bunch,coords)
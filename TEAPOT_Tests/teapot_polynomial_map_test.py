@@ -0,0 +1,55 @@
+#-----------------------------------------------------
+# Extracts the 3rd order one-turn map of the ring with
+# sextupoles and compares the map tracking with the
+# element by element tracking.
+#-----------------------------------------------------
+import sys
+import math
+import time
+
+import numpy as np
+
+from orbit.teapot import teapot
+from bunch import Bunch
+
+from teapot_polynomial_map import PolynomialMap
+
+sys.path.append("../Bunch_Tests")
+from bunch_columns import getCoordinates
+
+print "Start."
+
+teapot_latt = teapot.TEAPOT_Lattice()
+teapot_latt.readMAD("sext_623_620_00.mad","RNG")
+teapot_latt.initialize()
+
+b = Bunch()
+b.getSyncParticle().kinEnergy(1.0)
+
+half_sizes = (0.005,0.0005,0.005,0.0005,1.0,0.0005)
+one_turn_map = PolynomialMap(3)
+time_start = time.time()
+one_turn_map.extract(teapot_latt,b,half_sizes)
+print "monomials=",one_turn_map.getNumberOfMonomials()," extraction time [sec] = %8.3f "%(time.time() - time_start)
+print "fit error x,xp,y,yp,z,dE =",one_turn_map.getFitError()
+
+for i in xrange(100):
+	a = 0.00002*i
+	b.addParticle(a,0.,a,0.,0.,0.)
+b.compress()
+b_ref = Bunch()
+b.copyBunchTo(b_ref)
+
+n_turns = 100
+time_start = time.time()
+for turn in xrange(n_turns):
+	teapot_latt.trackBunch(b_ref)
+print "element tracking time [sec] = %8.3f "%(time.time() - time_start)
+
+time_start = time.time()
+one_turn_map.trackBunchTurns(b,n_turns)
+print "map tracking time [sec] = %8.3f "%(time.time() - time_start)
+
+diff = np.abs(getCoordinates(b) - getCoordinates(b_ref)).max(axis = 0)
+print "max diff after",n_turns,"turns x,xp,y,yp,z,dE =",diff
+print "Stop."
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The NumPy versions of the TEAPOT kernels (teapot.TPB)
+# running on the bunch columns with the KernelThreadPool.
+# The TeapotColumnsTracker loads the bunch into the columns
+# once, applies the sequence of kernels chunk by chunk in
+# the thread pool, and writes the columns back once.
+# The loading and storing of the columns is serial (see
+# bunch_columns.py), so for many elements or turns the
+# columns should be loaded once and tracked by the
+# trackColumns method.
+# Kernels:
+#   drift, multp, kick, rotatexy - the same formulas as in
+#     teapot.TPB.drift, multp, kick, rotatexy
+#   quad - the linear map of teapot.TPB.quad1 with the
+#     chromatic strength kq/(1+dp/p) and the transverse part
+#     of the path length
+#   quad2 - the longitudinal part of the path length in the
+#     quad as teapot.TPB.quad2
+#   bend - the linear sector bend body as teapot.TPB.bend1
+#   rfgap - the harmonic ring RF gap energy kick as
+#     teapot.TPB.RingRF
+# The drift, quad, and bend advance the sync. particle time
+# by length/(beta*c) as the TPB functions do.
+# The teapot_threaded_kernels_test.py compares them with
+# teapot.TPB.
+#--------------------------------------------------------
+
+import math
+import sys
+import os
+
+import numpy as np
+
+from bunch import Bunch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_columns import BunchColumns
+from bunch_thread_pool import KernelThreadPool
+
+SPEED_OF_LIGHT = 2.99792458e+8
+
+def _getSyncParams(bunch):
+	"""
+	Returns the (dp_p_coeff, gamma2i) parameters of the synchronous particle.
+	"""
+	syncPart = bunch.getSyncParticle()
+	gamma = syncPart.gamma()
+	dp_p_coeff = 1.0/(syncPart.momentum()*syncPart.beta())
+	return (dp_p_coeff,1.0/(gamma*gamma))
+
+def driftKernel(arrays, length, dp_p_coeff, gamma2i):
+	(x,xp,y,yp,z,dE) = arrays
+	dp_p = dE*dp_p_coeff
+	KNL = 1.0/(1.0 + dp_p)
+	x += KNL*length*xp
+	y += KNL*length*yp
+	phifac = (xp*xp + yp*yp + dp_p*dp_p*gamma2i)/((1.0 + dp_p)*(1.0 + dp_p))
+	phifac = (phifac/2.0 - dp_p*gamma2i)*KNL
+	z -= length*phifac
+
+def multpKernel(arrays, pole, kl, skew):
+	(x,xp,y,yp,z,dE) = arrays
+	kl = kl/math.factorial(pole)
+	zn = (x + 1j*y)**pole
+	if(skew == 0):
+		xp -= kl*zn.real
+		yp += kl*zn.imag
+	else:
+		xp += kl*zn.imag
+		yp += kl*zn.real
+
+def kickKernel(arrays, kx, ky, kE):
+	(x,xp,y,yp,z,dE) = arrays
+	xp += kx
+	yp += ky
+	dE += kE
+
+def rotatexyKernel(arrays, anglexy):
+	(x,xp,y,yp,z,dE) = arrays
+	cs = math.cos(anglexy)
+	sn = math.sin(anglexy)
+	x_old = x.copy()
+	xp_old = xp.copy()
+	x[:] = cs*x_old + sn*y
+	y[:] = cs*y - sn*x_old
+	xp[:] = cs*xp_old + sn*yp
+	yp[:] = cs*yp - sn*xp_old
+
+def _getPathIntegral(u, up, sqrt_kq, length, focusing):
+	"""
+	Returns the integral of up(s)**2 over the length in the focusing or
+	defocusing plane of the quad for the initial u and angle up.
+	"""
+	kqlength2 = 2.0*sqrt_kq*length
+	if(focusing):
+		return 0.25*sqrt_kq*u*u*(kqlength2 - np.sin(kqlength2)) + \
+			0.25*up*up*(kqlength2 + np.sin(kqlength2))/sqrt_kq - \
+			0.5*u*up*(1.0 - np.cos(kqlength2))
+	return 0.25*sqrt_kq*u*u*(np.sinh(kqlength2) - kqlength2) + \
+		0.25*up*up*(np.sinh(kqlength2) + kqlength2)/sqrt_kq + \
+		0.5*u*up*(np.cosh(kqlength2) - 1.0)
+
+def quadKernel(arrays, length, kqc, dp_p_coeff):
+	(x,xp,y,yp,z,dE) = arrays
+	dp_p = dE*dp_p_coeff
+	KNL = 1.0/(1.0 + dp_p)
+	#---- the chromatic strength and the angles instead of the momenta
+	sqrt_kq = np.sqrt(math.fabs(kqc)*KNL)
+	kqlength = sqrt_kq*length
+	(x_init,xp_init,y_init,yp_init) = (x.copy(),xp*KNL,y.copy(),yp*KNL)
+	if(kqc > 0.):
+		(cx,sx,cy,sy) = (np.cos(kqlength),np.sin(kqlength),np.cosh(kqlength),np.sinh(kqlength))
+		(m11,m12,m21,m22) = (cx,sx/sqrt_kq,-sx*sqrt_kq,cx)
+		(m33,m34,m43,m44) = (cy,sy/sqrt_kq,sy*sqrt_kq,cy)
+	else:
+		(cx,sx,cy,sy) = (np.cosh(kqlength),np.sinh(kqlength),np.cos(kqlength),np.sin(kqlength))
+		(m11,m12,m21,m22) = (cx,sx/sqrt_kq,sx*sqrt_kq,cx)
+		(m33,m34,m43,m44) = (cy,sy/sqrt_kq,-sy*sqrt_kq,cy)
+	x[:] = m11*x_init + m12*xp_init
+	xp[:] = (m21*x_init + m22*xp_init)*(1.0 + dp_p)
+	y[:] = m33*y_init + m34*yp_init
+	yp[:] = (m43*y_init + m44*yp_init)*(1.0 + dp_p)
+	#---- the transverse part of the path length, the drift limit is the same as in driftKernel
+	path_x = _getPathIntegral(x_init,xp_init,sqrt_kq,length,kqc > 0.)
+	path_y = _getPathIntegral(y_init,yp_init,sqrt_kq,length,kqc < 0.)
+	z -= 0.5*KNL*(path_x + path_y)
+
+def quad2Kernel(arrays, length, dp_p_coeff, gamma2i):
+	(x,xp,y,yp,z,dE) = arrays
+	dp_p = dE*dp_p_coeff
+	KNL = 1.0/(1.0 + dp_p)
+	phifac = dp_p*dp_p*gamma2i*KNL*KNL
+	z -= length*(phifac/2.0 - dp_p*gamma2i)*KNL
+
+def bendKernel(arrays, length, th, dp_p_coeff):
+	(x,xp,y,yp,z,dE) = arrays
+	rho = length/th
+	cx = math.cos(th)
+	sx = math.sin(th)
+	dp_p = dE*dp_p_coeff
+	x_init = x.copy()
+	xp_init = xp.copy()
+	x[:] = cx*x_init + rho*sx*xp_init + rho*(1.0 - cx)*dp_p
+	xp[:] = -sx/rho*x_init + cx*xp_init + sx*dp_p
+	y += length*yp
+	z -= sx*x_init + rho*(1.0 - cx)*xp_init + rho*(th - sx)*dp_p
+
+def rfgapKernel(arrays, ring_length, harmonic_numb, voltage, phase_s):
+	(x,xp,y,yp,z,dE) = arrays
+	phase = -harmonic_numb*2*math.pi*z/ring_length
+	dE += voltage*(np.sin(phase + phase_s) - math.sin(phase_s))
+
+class TeapotColumnsTracker:
+	"""
+	Tracks the bunch through the sequence of the TEAPOT kernels on the
+	bunch columns. The kernels are added by the drift, multp, kick,
+	rotatexy, quad, quad2, bend, and rfgap methods with the parameters
+	of the teapot.TPB functions.
+	"""
+	def __init__(self, pool = None):
+		if(pool == None): pool = KernelThreadPool()
+		self.pool = pool
+		self.kernels = []
+
+	def drift(self, length):
+		self.kernels.append(("drift",(length,)))
+
+	def multp(self, pole, kl, skew):
+		self.kernels.append(("multp",(pole,kl,skew)))
+
+	def kick(self, kx, ky, kE):
+		self.kernels.append(("kick",(kx,ky,kE)))
+
+	def rotatexy(self, anglexy):
+		self.kernels.append(("rotatexy",(anglexy,)))
+
+	def quad(self, length, kq):
+		self.kernels.append(("quad",(length,kq)))
+
+	def quad2(self, length):
+		self.kernels.append(("quad2",(length,)))
+
+	def bend(self, length, th):
+		self.kernels.append(("bend",(length,th)))
+
+	def rfgap(self, ring_length, harmonic_numb, voltage, phase_s):
+		self.kernels.append(("rfgap",(ring_length,harmonic_numb,voltage,phase_s)))
+
+	def track(self, bunch):
+		"""
+		Applies all kernels to the bunch.
+		"""
+		columns = BunchColumns(bunch)
+		self.trackColumns(columns)
+		columns.putBack()
+
+	def trackColumns(self, columns):
+		"""
+		Applies all kernels to the loaded BunchColumns instance. The columns
+		should be written back into the bunch by columns.putBack() after all
+		tracking. The sync. particle of the bunch is updated.
+		"""
+		bunch = columns.bunch
+		syncPart = bunch.getSyncParticle()
+		(dp_p_coeff,gamma2i) = _getSyncParams(bunch)
+		velocity = SPEED_OF_LIGHT*syncPart.beta()
+		charge = bunch.charge()
+		arrays = [columns.x,columns.xp,columns.y,columns.yp,columns.z,columns.dE]
+		for (kernel_name,params) in self.kernels:
+			if(kernel_name in ("drift","quad","bend") and params[0] > 0.):
+				syncPart.time(syncPart.time() + params[0]/velocity)
+			if(kernel_name == "drift"):
+				self.pool.run(driftKernel,arrays,params[0],dp_p_coeff,gamma2i)
+			elif(kernel_name == "multp"):
+				(pole,kl,skew) = params
+				self.pool.run(multpKernel,arrays,pole,kl*charge,skew)
+			elif(kernel_name == "kick"):
+				self.pool.run(kickKernel,arrays,*params)
+			elif(kernel_name == "rotatexy"):
+				self.pool.run(rotatexyKernel,arrays,*params)
+			elif(kernel_name == "quad"):
+				(length,kq) = params
+				if(kq*charge == 0.):
+					self.pool.run(driftKernel,arrays,length,dp_p_coeff,gamma2i)
+				else:
+					self.pool.run(quadKernel,arrays,length,kq*charge,dp_p_coeff)
+			elif(kernel_name == "quad2"):
+				self.pool.run(quad2Kernel,arrays,params[0],dp_p_coeff,gamma2i)
+			elif(kernel_name == "bend"):
+				(length,th) = params
+				self.pool.run(bendKernel,arrays,length,th,dp_p_coeff)
+			elif(kernel_name == "rfgap"):
+				(ring_length,harmonic_numb,voltage,phase_s) = params
+				self.pool.run(rfgapKernel,arrays,ring_length,harmonic_numb,voltage*charge,phase_s)
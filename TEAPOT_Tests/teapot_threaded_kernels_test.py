@@ -0,0 +1,93 @@
+#-----------------------------------------------------
+#Compares the threaded NumPy TEAPOT kernels with teapot.TPB
+#for the bunch with the energy spread, and exits with the
+#non-zero status if the difference exceeds the tolerance.
+#The number of threads: ORBIT_NUM_THREADS=4 ./START.sh teapot_threaded_kernels_test.py 1
+#-----------------------------------------------------
+import sys
+import os
+import math
+import time
+
+import numpy as np
+
+from bunch import Bunch
+from orbit.teapot import teapot
+
+from teapot_threaded_kernels import TeapotColumnsTracker
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../Bunch_Tests"))
+from bunch_columns import getCoordinates, BunchColumns
+from bunch_thread_pool import KernelThreadPool
+
+b = Bunch()
+b.getSyncParticle().kinEnergy(1.0)
+nParts = 100000
+for i in xrange(nParts):
+	t = (i+1.0)/nParts
+	b.addParticle(0.01*t,0.001*t*t,-0.005*t,0.0005*t,0.1*t,0.02*(t-0.5))
+
+b_ref = Bunch()
+b.copyBunchTo(b_ref)
+
+tracker = TeapotColumnsTracker(KernelThreadPool())
+tracker.rotatexy(0.5)
+tracker.drift(1.1)
+tracker.multp(2,0.8,0)
+tracker.multp(3,0.7,1)
+tracker.kick(1.0e-5,2.0e-5,2.0e-6)
+tracker.drift(0.3)
+tracker.quad(0.5,1.2)
+tracker.quad2(0.5)
+tracker.quad(0.5,-1.2)
+tracker.quad2(0.5)
+tracker.bend(2.0,0.1)
+tracker.rfgap(248.0,1,1.0e-5,0.)
+
+b_columns = Bunch()
+b.copyBunchTo(b_columns)
+
+time_start = time.time()
+tracker.track(b)
+print "threads =",tracker.pool.getNumberOfThreads()," time with load/store [sec] = %8.3f "%(time.time() - time_start)
+
+#---- the columns are loaded once for 10 passes
+time_start = time.time()
+columns = BunchColumns(b_columns)
+time_load = time.time() - time_start
+time_start = time.time()
+for count in range(10):
+	tracker.trackColumns(columns)
+time_track = time.time() - time_start
+time_start = time.time()
+columns.putBack()
+time_store = time.time() - time_start
+print "10 passes: load = %8.3f track = %8.3f store = %8.3f [sec]"%(time_load,time_track,time_store)
+
+time_start = time.time()
+teapot.TPB.rotatexy(b_ref,0.5)
+teapot.TPB.drift(b_ref,1.1)
+teapot.TPB.multp(b_ref,2,0.8,0)
+teapot.TPB.multp(b_ref,3,0.7,1)
+teapot.TPB.kick(b_ref,1.0e-5,2.0e-5,2.0e-6)
+teapot.TPB.drift(b_ref,0.3)
+teapot.TPB.quad1(b_ref,0.5,1.2)
+teapot.TPB.quad2(b_ref,0.5)
+teapot.TPB.quad1(b_ref,0.5,-1.2)
+teapot.TPB.quad2(b_ref,0.5)
+teapot.TPB.bend1(b_ref,2.0,0.1)
+teapot.TPB.RingRF(b_ref,248.0,1,1.0e-5,0.)
+print "TPB time [sec] = %8.3f "%(time.time() - time_start)
+
+coords_ref = getCoordinates(b_ref)
+diff = np.abs(getCoordinates(b) - coords_ref).max(axis = 0)
+tolerance = 1.0e-12*np.maximum(np.abs(coords_ref).max(axis = 0),1.0)
+time_diff = math.fabs(b.getSyncParticle().time() - b_ref.getSyncParticle().time())
+print "max diff x,xp,y,yp,z,dE =",diff
+print "sync. part. time =",b.getSyncParticle().time()," TPB =",b_ref.getSyncParticle().time()
+
+tracker.pool.close()
+if((diff > tolerance).any() or time_diff > 1.0e-12*b_ref.getSyncParticle().time()):
+	print "The threaded kernels differ from teapot.TPB! tolerance =",tolerance
+	sys.exit(1)
+print "Stop."
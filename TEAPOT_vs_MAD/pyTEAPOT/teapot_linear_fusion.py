@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The fusion of the consecutive linear TEAPOT elements
+# (drifts, quads, bends, solenoids) into the transport
+# matrices. The fuseLinearSpans(...) function creates the
+# new TEAPOT lattice where each maximal span of the linear
+# elements without child nodes (space charge, apertures,
+# diagnostics) is replaced by one FusedMatrixTEAPOT node
+# with the 7x7 matrix (the linear part and the offsets)
+# from the MatrixGenerator. The other nodes are the same
+# objects as in the original lattice.
+# The elements with the multipole components ("kls" of the
+# quads and bends) are not fused, because the matrix keeps
+# only the linear part of the multipole kicks.
+# The FusedMatrixTEAPOT node advances the sync. particle
+# time by the span length/(beta*c) as the TEAPOT elements.
+# The matrix is the linearization of the TEAPOT kernels, so
+# the fused lattice should be checked by validateFusion(...)
+# for the amplitudes of the bunch before the use.
+#--------------------------------------------------------
+
+import math
+import sys
+
+from orbit.teapot import teapot
+from orbit.teapot import TEAPOT_Lattice
+from orbit.teapot import BaseTEAPOT
+from orbit.teapot_base import MatrixGenerator
+from orbit.lattice import AccNode
+from orbit_utils import Matrix
+from bunch import Bunch
+
+#---- the speed of light in m/sec
+SPEED_OF_LIGHT = 2.99792458e+8
+
+#---- the TEAPOT elements with the linear tracking
+LINEAR_TEAPOT_CLASSES = (teapot.DriftTEAPOT,teapot.QuadTEAPOT,teapot.BendTEAPOT,teapot.SolenoidTEAPOT)
+
+class FusedMatrixTEAPOT(BaseTEAPOT):
+	"""
+	The TEAPOT node that tracks the bunch by the transport matrix
+	of the fused linear elements.
+	"""
+	def __init__(self, name, matrix, fused_nodes):
+		BaseTEAPOT.__init__(self,name)
+		self.setType("fused matrix")
+		self.matrix = matrix
+		self.fused_nodes = fused_nodes
+		length = 0.
+		for node in fused_nodes:
+			length += node.getLength()
+		self.setLength(length)
+
+	def getMatrix(self):
+		return self.matrix
+
+	def getFusedNodes(self):
+		"""
+		Returns the list of the original nodes replaced by this node.
+		"""
+		return self.fused_nodes
+
+	def track(self, paramsDict):
+		bunch = paramsDict["bunch"]
+		self.matrix.track(bunch)
+		syncPart = bunch.getSyncParticle()
+		length = self.getLength()
+		if(length > 0.):
+			syncPart.time(syncPart.time() + length/(SPEED_OF_LIGHT*syncPart.beta()))
+
+def isFusable(node):
+	"""
+	Returns True if the node is the linear TEAPOT element without child nodes
+	and without the multipole components.
+	"""
+	if(not isinstance(node,LINEAR_TEAPOT_CLASSES)): return False
+	if(node.hasParam("kls")):
+		for kl in node.getParam("kls"):
+			if(kl != 0.): return False
+	if(len(node.getChildNodes(AccNode.ENTRANCE)) > 0): return False
+	if(len(node.getChildNodes(AccNode.EXIT)) > 0): return False
+	if(node.getNumberOfBodyChildren() > 0): return False
+	return True
+
+def getSpanMatrix(nodes, bunch):
+	"""
+	Returns the 7x7 transport matrix of the nodes for the synchronous
+	particle of the bunch.
+	"""
+	b = Bunch()
+	bunch.copyEmptyBunchTo(b)
+	matrixGenerator = MatrixGenerator()
+	matrixGenerator.initBunch(b)
+	for node in nodes:
+		node.trackBunch(b)
+	matrix = Matrix(7,7)
+	matrixGenerator.calculateMatrix(b,matrix)
+	return matrix
+
+def fuseLinearSpans(teapot_lattice, bunch, min_span = 2):
+	"""
+	Returns the new TEAPOT lattice with the spans of at least min_span
+	linear elements replaced by the FusedMatrixTEAPOT nodes. The bunch
+	defines the synchronous particle (mass, charge, energy).
+	"""
+	fused_lattice = TEAPOT_Lattice(teapot_lattice.getName()+"_fused")
+	span = []
+	nodes = teapot_lattice.getNodes() + [None,]
+	for node in nodes:
+		if(node != None and isFusable(node)):
+			span.append(node)
+			continue
+		if(len(span) >= min_span):
+			name = span[0].getName()+":"+span[len(span)-1].getName()
+			fused_lattice.addNode(FusedMatrixTEAPOT(name,getSpanMatrix(span,bunch),span))
+		else:
+			for span_node in span:
+				fused_lattice.addNode(span_node)
+		span = []
+		if(node != None):
+			fused_lattice.addNode(node)
+	fused_lattice.initialize()
+	return fused_lattice
+
+def validateFusion(teapot_lattice, fused_lattice, bunch, n_turns = 1):
+	"""
+	Tracks the copies of the bunch through the original and the fused
+	lattices and returns the list of the max absolute differences
+	of x,xp,y,yp,z,dE and the difference of the sync. particle time.
+	"""
+	b_orig = Bunch()
+	b_fused = Bunch()
+	bunch.copyBunchTo(b_orig)
+	bunch.copyBunchTo(b_fused)
+	for turn in xrange(n_turns):
+		teapot_lattice.trackBunch(b_orig)
+		fused_lattice.trackBunch(b_fused)
+	diff_arr = [0.]*6
+	for i in xrange(min(b_orig.getSize(),b_fused.getSize())):
+		vals_orig = (b_orig.x(i),b_orig.xp(i),b_orig.y(i),b_orig.yp(i),b_orig.z(i),b_orig.dE(i))
+		vals_fused = (b_fused.x(i),b_fused.xp(i),b_fused.y(i),b_fused.yp(i),b_fused.z(i),b_fused.dE(i))
+		for j in range(6):
+			diff_arr[j] = max(diff_arr[j],math.fabs(vals_orig[j] - vals_fused[j]))
+	diff_arr.append(math.fabs(b_orig.getSyncParticle().time() - b_fused.getSyncParticle().time()))
+	return diff_arr
@@ -0,0 +1,49 @@
+##############################################################
+# This script fuses the linear TEAPOT elements of the ring
+# into the transport matrices and compares the tracking
+# through the fused and original lattices.
+##############################################################
+
+import math
+import sys
+import random
+import time
+
+from orbit.teapot import teapot
+from bunch import Bunch
+
+from teapot_linear_fusion import fuseLinearSpans, validateFusion
+
+print "Start."
+
+teapot_latt = teapot.TEAPOT_Lattice()
+print "Read MAD."
+teapot_latt.readMAD("../MAD/LATTICE","RING")
+teapot_latt.initialize()
+
+b = Bunch()
+b.getSyncParticle().kinEnergy(1.0)
+random.seed(1)
+for i in xrange(1000):
+	b.addParticle(random.gauss(0.,0.001),random.gauss(0.,0.0001),random.gauss(0.,0.001),random.gauss(0.,0.0001),random.gauss(0.,1.0),random.gauss(0.,0.0001))
+b.compress()
+
+fused_latt = fuseLinearSpans(teapot_latt,b)
+print "nodes original=",len(teapot_latt.getNodes())," fused=",len(fused_latt.getNodes())
+print "length original=",teapot_latt.getLength()," fused=",fused_latt.getLength()
+
+#---- validation
+diff_arr = validateFusion(teapot_latt,fused_latt,b,10)
+print "max diff after 10 turns x,xp,y,yp,z,dE =",diff_arr[:6]
+print "sync. part. time diff after 10 turns [sec] =",diff_arr[6]
+
+#---- speed
+for (name,latt) in (("original",teapot_latt),("fused",fused_latt)):
+	b_tmp = Bunch()
+	b.copyBunchTo(b_tmp)
+	time_start = time.time()
+	for turn in xrange(10):
+		latt.trackBunch(b_tmp)
+	print "%10s time per turn [sec] = %8.5f "%(name,(time.time() - time_start)/10)
+
+print "Stop."
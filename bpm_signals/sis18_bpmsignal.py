@@ -3,6 +3,7 @@
 # creates the TEAPOT lattice and add bpm nodes, plus get the information 
 ##############################################################
 import sys
+import os
 import math
 import numpy as np
 from pylab import *
@@ -22,6 +23,9 @@ from orbit.diagnostics import addTeapotDiagnosticsNode, BPMSignal, TeapotBPMSign
 from orbit.bunch_generators import TwissContainer, TwissAnalysis
 from orbit.bunch_generators import KVDist2D
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../AccLattice_Tests"))
+from lattice_index import LatticeIndex
+
 
 #=====set up bunch stuff============
 
@@ -84,14 +88,14 @@ s = []
 
 
 #============Get the BPM signal===============
-nodes = lattice.getNodes()
+lattice_index = LatticeIndex(lattice)
+bpm_nodes = lattice_index.getNodesOfType("BPMSignal")
 for i in range(10):
 	lattice.trackBunch(bunch)
-	for node in nodes:
-			if node.getType()=="BPMSignal":
-				xAvg.append(node.getSignal()[0])
-				yAvg.append(node.getSignal()[1])
-				s.append(lattice.getNodePositionsDict()[node][0]+lattice.getLength()*(i))
+	for node in bpm_nodes:
+			xAvg.append(node.getSignal()[0])
+			yAvg.append(node.getSignal()[1])
+			s.append(lattice_index.getNodePositions(node)[0]+lattice.getLength()*(i))
 #============Get the BPM signal===============
 
 #======================plot====================